@@ -1,115 +1,215 @@
-#!/usr/bin/python
-
+#!/usr/bin/env python3
+"""Build HTML and PDF versions of the specifications.
+
+Usage: python3 bin/builder.py [--html] [--pdf] [-j N] [--force] [--dry-run] [name ...]
+
+Only spec documents are built: the Markdown files outside tests directories,
+and the reStructuredText files that have not been converted to Markdown. Each
+document is converted to build/<dir>/<name>.html, and to build/<dir>/<name>.tex
+from which build/<dir>/<name>.pdf is made. Names select documents by file name
+without extension, e.g. "crud"; with none, every document is built. With
+neither --html nor --pdf, both are built.
+
+Conversions run in parallel. A manifest in build/.builder-manifest.json records
+a content hash of each output's input and command, so unchanged documents are
+not converted again. pdflatex is rerun only until its .aux and .toc files stop
+changing.
+
+The commands can be overridden with the HTMLCMD, LATEXCMD and PDFCMD (for
+Markdown) and RST_HTMLCMD and RST_LATEXCMD (for reStructuredText) environment
+variables; the input file is appended to each.
+"""
+
+import argparse
+import hashlib
+import json
 import os
-
-input_dirs = ['source/']
-
-build_dir = 'build/'
-OUTPUT_FILE = build_dir + 'makefile.generated'
-
-JOB = "\n\t"
-TARGET = "\n"
-
-######################################################################
-
-def generate_file_tree(input_dir):
-    targets = []
-
-    for dirname, dirnames, filenames in os.walk(input_dir):
+import shlex
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SOURCE = ROOT / "source"
+BUILD = ROOT / "build"
+MANIFEST = BUILD / ".builder-manifest.json"
+
+COMMANDS = {
+    ("html", ".md"): os.environ.get("HTMLCMD", "pandoc --standalone --from gfm --to html"),
+    ("tex", ".md"): os.environ.get("LATEXCMD", "pandoc --standalone --from gfm --to latex"),
+    ("html", ".rst"): os.environ.get("RST_HTMLCMD", "rst2html.py"),
+    ("tex", ".rst"): os.environ.get("RST_LATEXCMD", "rst2latex.py"),
+}
+PDFCMD = os.environ.get("PDFCMD", "pdflatex -interaction=nonstopmode -halt-on-error")
+
+# pdflatex needs at most this many runs for references and the table of contents to settle.
+MAX_PDFLATEX_RUNS = 5
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _file_digest(path):
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def is_document(path):
+    """Return True if path is a spec document rather than a test, index or redirect stub."""
+    if path.name in ("index.md", "index.rst"):
+        return False
+    if path.suffix == ".md":
+        return True
+    if path.suffix == ".rst":
+        # Converted specs leave behind a short .rst file pointing at the Markdown.
+        with path.open() as f:
+            head = f.read(2048)
+        return not head.lstrip().startswith(".. note::") and "converted to Markdown" not in head
+    return False
+
+
+def find_documents(names=None):
+    documents = []
+    for dirname, dirnames, filenames in os.walk(SOURCE):
+        dirnames[:] = [d for d in dirnames if d != "tests" and d != "node_modules" and not d.startswith(".")]
         for filename in filenames:
-            source = os.path.join(dirname, filename)
-            target = os.path.join('build/', filename).rsplit('.',1)[0]
-            shortcut = filename.rsplit('.',1)[0]
-
-            if source.rsplit('.',1)[1] == "tmpl":
-                pass
-            else:
-                targets.append((source, target, shortcut))
-
-    return targets
-
-def generate_converters(input_dir, output_dir):
-    tex_converter = (JOB + "@$(LATEXCMD) $< >$@" +
-                     JOB + "@echo [rst2latex]: created '$@'")
-    html_converter = (JOB + "@$(HTMLCMD) $< >$@" +
-                      JOB + "@echo [rst2html]: created '$@'")
-
-    converters = (TARGET + output_dir + "%.tex" + ":" + input_dir + "%.rst" + tex_converter +
-                  TARGET + output_dir + "%.tex" + ":" + input_dir + "%.txt" + tex_converter +
-                  TARGET + output_dir + "%.html" + ":" + input_dir + "%.rst" + html_converter +
-                  TARGET + output_dir + "%.html" + ":" + input_dir + "%.txt" + html_converter)
-
-    return converters
-
-def generate_builders(output_dir):
-    pdf_builder = (TARGET + output_dir + "%.pdf" + ":" + output_dir + "%.tex" +
-                   JOB + "@$(PDFCMD) '$<' >|$@.log" +
-                   JOB + "@echo [pdflatex]: \(1/3\) built '$@'" +
-                   JOB + "@$(PDFCMD) '$<' >>$@.log" +
-                   JOB + "@echo [pdflatex]: \(2/3\) built '$@'" +
-                   JOB + "@$(PDFCMD) '$<' >>$@.log" +
-                   JOB + "@echo [pdflatex]: \(3/3\) built '$@'" +
-                   JOB + "@echo [PDF]: see '$@.log' for a full report of the pdf build process.")
-
-    builder = pdf_builder
-
-    return builder
-
-def build_latex_targets(source, target):
-    intermediate = target.rsplit('.',1)[0] + ".tex"
-
-    output = (TARGET + target + ".pdf" + ':' + source +
-              TARGET + intermediate + ":" + source)
-
-    return output
-
-def build_html_targets(source, target):
-    output = (target + ".html" + ':' + source)
-
-    return output
-
-def build_shortcut_targets(target, shortcut):
-    output = (shortcut + ':' + target + ".html" + " " + target + ".pdf")
-
-    return output
-
-######################################################################
-
-class GeneratedMakefile(object):
-    def __init__(self):
-
-        self.converters = []
-        self.targets = []
-
-        self.builder = generate_builders(build_dir)
-
-        for dir in input_dirs:
-            self.converters.append(generate_converters(dir, build_dir))
-
-        for dir in input_dirs:
-            for (src, trg, shc) in generate_file_tree(dir):
-                self.targets.append(build_latex_targets(src, trg))
-                self.targets.append(build_html_targets(src, trg))
-                self.targets.append(build_shortcut_targets(trg, shc))
-
-makefile = GeneratedMakefile()
-
-########################################################################
-
-def main():
-    output = open(OUTPUT_FILE, "w")
-
-    for line in makefile.converters:
-        output.write(line)
-
-    output.write(makefile.builder)
-    output.write('\n\n')
-
-    for line in makefile.targets:
-        output.write(line)
-        output.write('\n')
+            path = Path(dirname, filename)
+            if (not names or path.stem in names) and is_document(path):
+                documents.append(path)
+    return sorted(documents)
+
+
+class Manifest:
+    """The hash of the inputs each output was last built from."""
+
+    def __init__(self, path=MANIFEST):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            self.entries = json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+
+    def is_current(self, output, digest):
+        return output.exists() and self.entries.get(str(output.relative_to(BUILD))) == digest
+
+    def record(self, output, digest):
+        with self._lock:
+            self.entries[str(output.relative_to(BUILD))] = digest
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entries, indent=1, sort_keys=True) + "\n")
+        os.replace(tmp, self.path)
+
+
+class Builder:
+    def __init__(self, manifest, force=False, dry_run=False):
+        self.manifest = manifest
+        self.force = force
+        self.dry_run = dry_run
+
+    def _log(self, message):
+        print(message, flush=True)
+
+    def convert(self, source, output, command):
+        """Convert source to output with command unless it is up to date. Returns True if built."""
+        digest = _digest(command, source.read_bytes())
+        if not self.force and self.manifest.is_current(output, digest):
+            return False
+        self._log(f"[{command.split()[0]}]: {'would create' if self.dry_run else 'created'} '{output.relative_to(ROOT)}'")
+        if self.dry_run:
+            return True
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output.with_suffix(output.suffix + ".tmp"), "wb") as out:
+            subprocess.run(shlex.split(command) + [str(source)], stdout=out, check=True, cwd=source.parent)
+        os.replace(output.with_suffix(output.suffix + ".tmp"), output)
+        self.manifest.record(output, digest)
+        return True
+
+    def pdf(self, tex, output, stale=False):
+        """Build output from tex, running pdflatex until its .aux and .toc files settle.
+
+        stale means tex is about to change, which only matters for a dry run.
+        """
+        if self.dry_run:
+            current = tex.exists() and self.manifest.is_current(output, _digest(PDFCMD, tex.read_bytes()))
+            if stale or self.force or not current:
+                self._log(f"[pdflatex]: would build '{output.relative_to(ROOT)}'")
+                return True
+            return False
+        digest = _digest(PDFCMD, tex.read_bytes())
+        if not self.force and self.manifest.is_current(output, digest):
+            return False
+        log = output.with_suffix(".pdf.log")
+        aux_files = [tex.with_suffix(".aux"), tex.with_suffix(".toc")]
+        with open(log, "wb") as out:
+            for run in range(1, MAX_PDFLATEX_RUNS + 1):
+                before = [_file_digest(p) for p in aux_files]
+                subprocess.run(shlex.split(PDFCMD) + [tex.name], stdout=out, stderr=subprocess.STDOUT,
+                               stdin=subprocess.DEVNULL, check=True, cwd=tex.parent)
+                self._log(f"[pdflatex]: ({run}) built '{output.relative_to(ROOT)}'")
+                if [_file_digest(p) for p in aux_files] == before:
+                    break
+        self.manifest.record(output, digest)
+        return True
+
+    def build(self, document, html=True, pdf=True):
+        """Build the outputs of one document and return how many were (re)built."""
+        target = BUILD / document.parent.relative_to(SOURCE) / document.stem
+        built = 0
+        if html:
+            built += self.convert(document, target.with_suffix(".html"), COMMANDS[("html", document.suffix)])
+        if pdf:
+            tex = target.with_suffix(".tex")
+            tex_built = self.convert(document, tex, COMMANDS[("tex", document.suffix)])
+            built += tex_built + self.pdf(tex, target.with_suffix(".pdf"), stale=tex_built)
+        return built
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build HTML and PDF versions of the specifications.")
+    parser.add_argument("names", nargs="*", help="documents to build, by file name without extension")
+    parser.add_argument("--html", action="store_true", help="build HTML")
+    parser.add_argument("--pdf", action="store_true", help="build PDF")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="number of parallel jobs")
+    parser.add_argument("-B", "--force", action="store_true", help="rebuild even if up to date")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="only print what would be built")
+    args = parser.parse_args(argv)
+    html, pdf = (args.html, args.pdf) if args.html or args.pdf else (True, True)
+
+    documents = find_documents(set(args.names))
+    if args.names and not documents:
+        print(f"No documents named {', '.join(args.names)}", file=sys.stderr)
+        return 1
+    manifest = Manifest()
+    builder = Builder(manifest, args.force, args.dry_run)
+    failed = []
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(builder.build, d, html, pdf): d for d in documents}
+        built = 0
+        for future, document in futures.items():
+            try:
+                built += future.result()
+            except (OSError, subprocess.CalledProcessError) as e:
+                failed.append(document)
+                print(f"Error building {document.relative_to(ROOT)}: {e}", file=sys.stderr)
+    if not args.dry_run:
+        manifest.save()
+    print(f"{len(documents)} document(s), {built} output(s) {'to build' if args.dry_run else 'built'}"
+          + (f", {len(failed)} failed" if failed else ""))
+    return 1 if failed else 0
 
-    output.close()
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
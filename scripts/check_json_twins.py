@@ -0,0 +1,188 @@
+"""Check that every YAML test and its generated JSON twin hold the same data.
+
+Usage: python3 scripts/check_json_twins.py [--jobs N] [--no-cache] [path ...]
+
+Each path may be a ``.yml`` file or a directory, which is searched recursively.
+With no paths, all of ``source/`` is checked. Both sides are parsed and
+compared as data, so formatting differences are ignored; for each pair that
+drifted the first differing JSON pointer is reported.
+
+Verdicts are cached in ``source/.json-twins-cache.json`` by file size and
+modification time, falling back to content hashes, so unchanged pairs are not
+parsed again.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import yaml2json
+
+SOURCE = yaml2json.SOURCE
+CACHE_NAME = ".json-twins-cache.json"
+CACHE_VERSION = 1
+
+
+def _escape(token):
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def first_difference(a, b, pointer=""):
+    """Return the JSON pointer of the first place a and b differ, or None."""
+    if isinstance(a, dict) and isinstance(b, dict):
+        for key in list(a) + [k for k in b if k not in a]:
+            if key not in a or key not in b:
+                return f"{pointer}/{_escape(key)}"
+            found = first_difference(a[key], b[key], f"{pointer}/{_escape(key)}")
+            if found is not None:
+                return found
+        return None
+    if isinstance(a, list) and isinstance(b, list):
+        for i, (x, y) in enumerate(zip(a, b)):
+            found = first_difference(x, y, f"{pointer}/{i}")
+            if found is not None:
+                return found
+        if len(a) != len(b):
+            return f"{pointer}/{min(len(a), len(b))}"
+        return None
+    # bool is a subclass of int, but true and 1 are different JSON values.
+    if isinstance(a, bool) != isinstance(b, bool) or a != b:
+        return pointer or "/"
+    return None
+
+
+def _stat(path):
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def compare(yml_path):
+    """Compare one pair, returning (yml digest, json digest, difference).
+
+    difference is None if the pair matches, and otherwise a JSON pointer or a
+    description of the problem.
+    """
+    yml_bytes = yml_path.read_bytes()
+    json_path = yml_path.with_suffix(".json")
+    try:
+        json_bytes = json_path.read_bytes()
+    except FileNotFoundError:
+        return hashlib.sha256(yml_bytes).hexdigest(), None, "missing JSON file"
+    digests = hashlib.sha256(yml_bytes).hexdigest(), hashlib.sha256(json_bytes).hexdigest()
+    try:
+        expected = yaml2json.load(yml_bytes.decode("utf-8"))
+    except yaml2json.yaml.YAMLError as e:
+        return (*digests, f"cannot parse YAML: {e}")
+    try:
+        actual = json.loads(json_bytes)
+    except ValueError as e:
+        return (*digests, f"cannot parse JSON: {e}")
+    return (*digests, first_difference(expected, actual))
+
+
+def _compare_worker(yml_path):
+    return yml_path, compare(yml_path)
+
+
+class Cache:
+    """Verdicts for each pair, keyed by the pair's stat results and hashes."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        try:
+            data = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            return
+        if data.get("version") == CACHE_VERSION:
+            self.entries = data.get("pairs", {})
+
+    def _key(self, yml_path):
+        return os.path.relpath(yml_path, self.path.parent)
+
+    def lookup(self, yml_path):
+        """Return the cached difference (None for a match), or False if unknown."""
+        entry = self.entries.get(self._key(yml_path))
+        if entry is None:
+            return False
+        stats = [_stat(yml_path), _stat(yml_path.with_suffix(".json"))]
+        if stats == entry["stat"]:
+            return entry["difference"]
+        # Same content with new timestamps, e.g. after a checkout.
+        json_path = yml_path.with_suffix(".json")
+        if stats[1] is None:
+            return False
+        digests = [hashlib.sha256(yml_path.read_bytes()).hexdigest(),
+                   hashlib.sha256(json_path.read_bytes()).hexdigest()]
+        if digests != entry["digests"]:
+            return False
+        entry["stat"] = stats
+        return entry["difference"]
+
+    def record(self, yml_path, yml_digest, json_digest, difference):
+        self.entries[self._key(yml_path)] = {
+            "stat": [_stat(yml_path), _stat(yml_path.with_suffix(".json"))],
+            "digests": [yml_digest, json_digest],
+            "difference": difference,
+        }
+
+    def save(self):
+        data = {"version": CACHE_VERSION, "pairs": dict(sorted(self.entries.items()))}
+        yaml2json.write_if_changed(self.path, (json.dumps(data) + "\n").encode("utf-8"))
+
+
+def check(paths, jobs=None, use_cache=True, cache_path=None):
+    """Check every pair under paths and return {yml path: difference} for those that drifted."""
+    yml_files = yaml2json.find_yaml_files(paths)
+    cache = Cache(cache_path or SOURCE / CACHE_NAME)
+    drifted = {}
+    todo = []
+    for yml_path in yml_files:
+        verdict = cache.lookup(yml_path) if use_cache else False
+        if verdict is False:
+            todo.append(yml_path)
+        elif verdict is not None:
+            drifted[yml_path] = verdict
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_compare_worker, todo, chunksize=max(1, len(todo) // (jobs * 4))))
+    else:
+        results = [_compare_worker(p) for p in todo]
+
+    for yml_path, (yml_digest, json_digest, difference) in results:
+        if json_digest is not None:
+            cache.record(yml_path, yml_digest, json_digest, difference)
+        if difference is not None:
+            drifted[yml_path] = difference
+    if use_cache:
+        cache.save()
+    return dict(sorted(drifted.items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that YAML tests and their JSON twins match.")
+    parser.add_argument("paths", nargs="*", default=[SOURCE], help=".yml files or directories (default: source/)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--no-cache", action="store_true", help="ignore and do not update the verdict cache")
+    args = parser.parse_args(argv)
+
+    drifted = check(args.paths, args.jobs, use_cache=not args.no_cache)
+    for yml_path, difference in drifted.items():
+        print(f"{os.path.relpath(yml_path)}: {difference}")
+    if drifted:
+        print(f"{len(drifted)} YAML/JSON pair(s) differ; run make in source/ to regenerate the JSON")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,13 @@
-import sys, re
+"""Check Markdown files for links that got improperly line wrapped.
 
-fname = sys.argv[-1]
+Usage: python3 scripts/check_links.py [path ...]
 
-# Roughly detect fenced code even inside block quotes
-fenced_code = re.compile(r"^\s*(>\s+)*```")
+See md_lint.py.
+"""
 
-# Check for markdown links that got improperly line wrapped.
-in_code_block = False
-with open(fname) as fid:
-    for line in fid:
-        # Ignore code blocks.
-        if fenced_code.match(line):
-            in_code_block = not in_code_block
-        if in_code_block:
-            continue
-        id0 = line.index("[") if "[" in line else -1
-        id1 = line.index("]") if "]" in line else -1
-        id2 = line.index("(") if "(" in line else -1
-        id3 = line.index(")") if ")" in line else -1
-        if id1 == -1 or id2 == -1 or id3 == -1:
-            continue
-        if id2 < id1 or id3 < id2:
-            continue
-        if id0 == -1:
-            print("*** Malformed link in line:", line, fname)
-            sys.exit(1)
+import sys
 
-assert not in_code_block
+import md_lint
+
+if __name__ == "__main__":
+    sys.exit(md_lint.main(checks=["links"]))
@@ -0,0 +1,161 @@
+"""Check relative links and #fragment links in Markdown files, without network access.
+
+Usage: python3 scripts/check_md_anchors.py [--jobs N] [path ...]
+
+Each path may be a Markdown file or a directory, which is searched recursively.
+With no paths, every Markdown file under ``source/`` is checked. Every file is
+parsed once into an index of the anchors it defines: GitHub-style heading
+slugs and explicit ``<span id=...>``, ``<div id=...>`` and ``<a name=...>``
+anchors. Each link is then checked against the index and the file system.
+Links with a scheme (``https:``, ``mailto:``, ...) are not checked. Every
+broken link is reported as ``file:line``, and the exit status is 1 if there
+were any.
+"""
+
+import argparse
+import os
+import re
+import sys
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import unquote
+
+import md_lint
+
+ROOT = md_lint.ROOT
+SOURCE = ROOT / "source"
+
+_heading = re.compile(r"^ {0,3}(#{1,6})\s+(.*?)(?:\s+#+)?\s*$")
+_setext_underline = re.compile(r"^ {0,3}(=+|-+)\s*$")
+_html_anchor = re.compile(r"""<(?:a|div|span)\b[^>]*?\b(?:id|name)\s*=\s*["']([^"']+)["']""", re.IGNORECASE)
+_inline_link = re.compile(r"!?\[(?:[^\[\]]|\[[^\[\]]*\])*\]\(\s*<?([^)\s>]*)>?(?:\s+[\"'(][^)]*)?\)")
+_reference_definition = re.compile(r"^ {0,3}\[(?!\^)[^\]]+\]:\s*<?(\S+?)>?(?:\s.*)?$")
+_code_span = re.compile(r"(`+)(.+?)\1")
+_scheme = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*:")
+
+
+def _heading_text(text):
+    """Return the text GitHub renders for a heading's Markdown source."""
+    text = _code_span.sub(lambda m: m.group(2), text)
+    text = re.sub(r"!?\[([^\]]*)\]\([^)]*\)", r"\1", text)
+    text = re.sub(r"<[^>]+>", "", text)
+    return text.replace("*", "")
+
+
+def slug(text):
+    """Return the anchor GitHub generates for a heading, before deduplication."""
+    text = _heading_text(text).strip().lower()
+    kept = []
+    for c in text:
+        if c in "-_ " or unicodedata.category(c)[0] in "LNM":
+            kept.append("-" if c == " " else c)
+    return "".join(kept)
+
+
+def parse(path):
+    """Return (anchors, links) for one Markdown file.
+
+    links is a list of (line number, target) pairs.
+    """
+    anchors = set()
+    counts = {}
+    links = []
+    previous = None
+    with open(path, encoding="utf-8") as fid:
+        for lineno, line in md_lint.prose_lines(fid):
+            if line is None:
+                break
+            heading = _heading.match(line)
+            setext = _setext_underline.match(line) if previous and previous.strip() else None
+            if heading or (setext and not _heading.match(previous)):
+                base = slug(heading.group(2) if heading else previous)
+                n = counts.get(base, 0)
+                counts[base] = n + 1
+                anchors.add(base if n == 0 else f"{base}-{n}")
+            anchors.update(_html_anchor.findall(line))
+            prose = _code_span.sub(lambda m: " " * len(m.group(0)), line)
+            links.extend((lineno, target) for target in _inline_link.findall(prose))
+            definition = _reference_definition.match(prose)
+            if definition:
+                links.append((lineno, definition.group(1)))
+            previous = line
+    return anchors, links
+
+
+def _parse_many(paths):
+    return [(path, parse(path)) for path in paths]
+
+
+class Index:
+    """Anchors of Markdown files, parsed once each."""
+
+    def __init__(self):
+        self.anchors = {}
+        self.links = {}
+
+    def add(self, parsed):
+        for path, (anchors, links) in parsed:
+            self.anchors[path] = anchors
+            self.links[path] = links
+
+    def build(self, paths, jobs=None):
+        paths = [p for p in paths if p not in self.anchors]
+        jobs = min(jobs or os.cpu_count() or 1, len(paths) // md_lint.MIN_FILES_PER_JOB) or 1
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                for parsed in executor.map(_parse_many, [paths[i::jobs] for i in range(jobs)]):
+                    self.add(parsed)
+        else:
+            self.add(_parse_many(paths))
+
+    def anchors_of(self, path):
+        if path not in self.anchors:
+            self.add(_parse_many([path]))
+        return self.anchors[path]
+
+
+def check_link(index, path, target):
+    """Return a description of the problem with one link, or None if it resolves."""
+    if not target or _scheme.match(target) or target.startswith("//"):
+        return None
+    target_path, _, fragment = target.partition("#")
+    resolved = (path.parent / unquote(target_path)).resolve() if target_path else path
+    if not resolved.exists():
+        return f"{target}: no such file"
+    if not fragment or resolved.suffix != ".md" or resolved.is_dir():
+        return None
+    anchors = index.anchors_of(resolved)
+    fragment = unquote(fragment)
+    if fragment in anchors or fragment.lower() in anchors:
+        return None
+    return f"{target}: no anchor #{fragment}"
+
+
+def check(paths, jobs=None):
+    """Check the links in the Markdown files under paths and return (path, line, problem) tuples."""
+    files = [p.resolve() for p in md_lint.find_markdown(paths)]
+    index = Index()
+    index.build(files, jobs)
+    problems = []
+    for path in files:
+        for lineno, target in index.links[path]:
+            problem = check_link(index, path, target)
+            if problem is not None:
+                problems.append((path, lineno, problem))
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check relative and #fragment links in Markdown files.")
+    parser.add_argument("paths", nargs="*", default=[SOURCE], help="Markdown files or directories (default: source/)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes")
+    args = parser.parse_args(argv)
+
+    problems = check(args.paths, args.jobs)
+    for path, lineno, problem in problems:
+        print(f"{os.path.relpath(path)}:{lineno}: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
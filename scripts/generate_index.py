@@ -1,30 +1,134 @@
+"""Generate source/index.md, the list of specifications.
+
+Usage: python3 scripts/generate_index.py [--subindexes]
+
+The title of each document is its first "# " heading. Titles are cached in
+source/.generate-index-cache.json by path, modification time and size, so only
+new and changed documents are read. index.md is only written if its content
+changes. With --subindexes, an index.md listing the documents of each
+directory is written as well, and subindexes this script wrote for
+directories that no longer have documents are removed.
+"""
+
+import argparse
+import json
 import os
 from pathlib import Path
 
 source = Path(__file__).resolve().parent.parent / "source"
 source = source.resolve()
-info = {}
-for p in Path(source).rglob("*.md"):
-    relpath = os.path.relpath(p.parent, start=source)
-    if "tests" in relpath:
-        continue
-    if "node_modules" in relpath:
-        continue
-    if p.name in ["index.md"]:
-        continue
-    fpath = relpath + "/" + p.name
-    name = None
-    with p.open() as fid:
+CACHE_FILE = source / ".generate-index-cache.json"
+
+
+def find_documents():
+    """Yield the paths, relative to source/, of the documents to index."""
+    for dirname, dirnames, filenames in os.walk(source):
+        relpath = os.path.relpath(dirname, start=source)
+        dirnames[:] = [
+            d for d in dirnames if not d.startswith(".") and "tests" not in d and d != "node_modules"
+        ]
+        if "tests" in relpath or "node_modules" in relpath:
+            continue
+        for name in filenames:
+            if name.endswith(".md") and name not in ["index.md"]:
+                yield relpath + "/" + name
+
+
+def read_title(fpath):
+    with (source / fpath).open() as fid:
         for line in fid:
             if line.startswith("# "):
-                name = line.replace("# ", "").strip()
-                break
-    if name is None:
-        raise ValueError(f"Could not find name for {fpath}")
-    info[name] = fpath
-
-index_file = source / "index.md"
-with index_file.open("w") as fid:
-    fid.write("# MongoDB Specifications\n\n")
+                return line.replace("# ", "").strip()
+    raise ValueError(f"Could not find name for {fpath}")
+
+
+def load_cache():
+    try:
+        with CACHE_FILE.open() as fid:
+            return json.load(fid)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def titles(cache):
+    """Return {path: title}, reading only documents that changed since they were cached."""
+    result = {}
+    for fpath in find_documents():
+        st = (source / fpath).stat()
+        cached = cache.get(fpath)
+        if cached is not None and cached[:2] == [st.st_mtime_ns, st.st_size]:
+            title = cached[2]
+        else:
+            title = read_title(fpath)
+            cache[fpath] = [st.st_mtime_ns, st.st_size, title]
+        result[fpath] = title
+    for fpath in list(cache):
+        if fpath not in result:
+            del cache[fpath]
+    return result
+
+
+def write_if_changed(path, content):
+    """Write content to path unless it already has it. Returns True if written."""
+    try:
+        if path.read_text() == content:
+            return False
+    except FileNotFoundError:
+        pass
+    path.write_text(content)
+    return True
+
+
+def render(heading, info):
+    lines = [f"# {heading}\n\n"]
     for name in sorted(info):
-        fid.write(f"- [{name}]({info[name]})\n")
+        lines.append(f"- [{name}]({info[name]})\n")
+    return "".join(lines)
+
+
+def is_subindex(directory, content):
+    """Return True if content is a subindex rendered for directory."""
+    heading, _, rest = content.partition("\n\n")
+    return heading == f"# {directory} Specifications" and all(
+        line.startswith("- [") for line in rest.splitlines()
+    )
+
+
+def stale_subindexes(directories):
+    """Yield the generated subindexes of directories not in directories."""
+    for dirname, dirnames, filenames in os.walk(source):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".") and d != "node_modules"]
+        directory = os.path.relpath(dirname, start=source)
+        if directory == "." or directory in directories or "index.md" not in filenames:
+            continue
+        path = Path(dirname) / "index.md"
+        if is_subindex(directory, path.read_text()):
+            yield path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate source/index.md.")
+    parser.add_argument("--subindexes", action="store_true", help="also write an index.md for each directory")
+    args = parser.parse_args(argv)
+
+    cache = load_cache()
+    documents = titles(cache)
+    write_if_changed(CACHE_FILE, json.dumps(cache, indent=0, sort_keys=True) + "\n")
+
+    info = {name: fpath for fpath, name in documents.items()}
+    write_if_changed(source / "index.md", render("MongoDB Specifications", info))
+
+    if args.subindexes:
+        directories = {}
+        for fpath, name in documents.items():
+            directory, filename = fpath.rsplit("/", 1)
+            if directory != ".":
+                directories.setdefault(directory, {})[name] = filename
+        for directory, dir_info in directories.items():
+            write_if_changed(source / directory / "index.md", render(f"{directory} Specifications", dir_info))
+        for path in stale_subindexes(directories):
+            path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Lint Markdown files for improperly wrapped links and unexpected HTML.
+
+Usage: python3 scripts/md_lint.py [--links] [--html] [--jobs N] [path ...]
+
+Each path may be a Markdown file or a directory, which is searched recursively.
+With no paths, every Markdown file in the repository is checked. With neither
+``--links`` nor ``--html``, both checks run. Every violation is reported as
+``file:line: message``, and the exit status is 1 if there were any.
+
+``check_links.py`` and ``check_md_html.py`` run one check each and are used by
+the pre-commit hooks.
+"""
+
+import argparse
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Check files in worker processes only when there are enough to pay for them.
+MIN_FILES_PER_JOB = 64
+
+# Roughly detect fenced code even inside block quotes
+fenced_code = re.compile(r"^\s*(>\s+)*```")
+
+# Check for allowed HTML elements in markdown.
+# Ignores inline and fenced code, but intentionally doesn't ignore backslash
+# escaping. (For compatibility, we want to avoid unintentional inline HTML
+# even on markdown implementations where "\<" escapes are not supported.)
+disallowed_re = re.compile(
+    r"""
+    [^`]*(`[^`]+`)*
+    <(?!
+        - |
+        /p> |
+        /span> |
+        /sub> |
+        /sup> |
+        /table> |
+        /td> |
+        /tr> |
+        \d |
+        \s |
+        \w+@(\w+\.)+\w+> | # Cover email addresses in license files
+        = |
+        br> |
+        https:// |         # Cover HTTPS links but not HTTP
+        p> |
+        span[\s>] |
+        sub> |
+        sup> |
+        table[\s>] |
+        td[\s>] |
+        tr> |
+        !-- )
+    """,
+    re.VERBOSE,
+)
+
+
+def prose_lines(lines):
+    """Yield (line number, line) for the lines outside fenced code blocks.
+
+    Yields (line number, None) after the last line if a code block is left open.
+    """
+    in_code_block = False
+    lineno = 0
+    for lineno, line in enumerate(lines, 1):
+        # Ignore code blocks.
+        if fenced_code.match(line):
+            in_code_block = not in_code_block
+        if in_code_block:
+            continue
+        yield lineno, line
+    if in_code_block:
+        yield lineno, None
+
+
+def check_link(line):
+    """Check for markdown links that got improperly line wrapped."""
+    id1 = line.find("]")
+    id2 = line.find("(")
+    id3 = line.find(")")
+    if id1 == -1 or id2 == -1 or id3 == -1:
+        return None
+    if id2 < id1 or id3 < id2:
+        return None
+    if "[" not in line:
+        return "malformed link"
+    return None
+
+
+def check_html(line):
+    if disallowed_re.match(line):
+        return "unexpected HTML"
+    return None
+
+
+CHECKS = {"links": check_link, "html": check_html}
+
+
+def lint_file(path, checks=tuple(CHECKS)):
+    """Return the violations in one file as (path, line number, message, line) tuples."""
+    functions = [CHECKS[name] for name in checks]
+    violations = []
+    with open(path, encoding="utf-8") as fid:
+        for lineno, line in prose_lines(fid):
+            if line is None:
+                violations.append((path, lineno, "unclosed fenced code block", ""))
+                continue
+            for check in functions:
+                message = check(line)
+                if message is not None:
+                    violations.append((path, lineno, message, line.rstrip("\n")))
+    return violations
+
+
+def _lint_many(args):
+    paths, checks = args
+    return [v for path in paths for v in lint_file(path, checks)]
+
+
+def find_markdown(paths):
+    found = set()
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            for dirname, dirnames, filenames in os.walk(path):
+                dirnames[:] = [d for d in dirnames if d != "node_modules" and not d.startswith(".")]
+                found.update(Path(dirname, f) for f in filenames if f.endswith(".md"))
+        else:
+            found.add(path)
+    return sorted(found)
+
+
+def lint(paths, checks=tuple(CHECKS), jobs=None):
+    """Lint the Markdown files under paths and return all violations, sorted by file and line."""
+    files = find_markdown(paths)
+    jobs = min(jobs or os.cpu_count() or 1, len(files) // MIN_FILES_PER_JOB) or 1
+    if jobs > 1:
+        chunks = [(files[i::jobs], checks) for i in range(jobs)]
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            violations = [v for chunk in executor.map(_lint_many, chunks) for v in chunk]
+    else:
+        violations = _lint_many((files, checks))
+    return sorted(violations, key=lambda v: (str(v[0]), v[1]))
+
+
+def main(argv=None, checks=None):
+    parser = argparse.ArgumentParser(description="Lint Markdown files.")
+    parser.add_argument("paths", nargs="*", default=[ROOT], help="Markdown files or directories (default: the repository)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes")
+    if checks is None:
+        parser.add_argument("--links", action="store_true", help="check for improperly wrapped links")
+        parser.add_argument("--html", action="store_true", help="check for unexpected HTML")
+    args = parser.parse_args(argv)
+    if checks is None:
+        checks = [name for name in CHECKS if getattr(args, name)] or list(CHECKS)
+
+    violations = lint(args.paths, tuple(checks), args.jobs)
+    for path, lineno, message, line in violations:
+        print(f"{os.path.relpath(path)}:{lineno}: {message}: {line}" if line else
+              f"{os.path.relpath(path)}:{lineno}: {message}")
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
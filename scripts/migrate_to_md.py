@@ -1,30 +1,21 @@
-import subprocess
+"""Migrate reStructuredText specs to Markdown.
+
+Usage: python3 scripts/migrate_to_md.py [-j N] FILE.rst [FILE.rst ...]
+
+Run from the repository root. The files are renamed in one git commit to keep
+their history, converted by a pool of pandoc processes, and every link to them
+from other files in source/ is rewritten in a single pass over the files that
+contain such links.
+"""
+
+import argparse
+import datetime
 import os
 import re
+import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import datetime
-import subprocess
-
-if len(sys.argv) < 2:
-    print("Must provide a path to an RST file")
-    sys.exit(1)
-
-path = Path(sys.argv[1])
-
-# Ensure git history for the md file.
-md_file = str(path).replace(".rst", ".md")
-subprocess.check_call(["git", "mv", path, md_file])
-subprocess.check_call(["git", "add", md_file])
-subprocess.check_call(
-    ["git", "commit", "--no-verify", "-m", f"Rename {path} to {md_file}"]
-)
-subprocess.check_call(["git", "checkout", "HEAD~1", path])
-subprocess.check_call(["git", "add", path])
-
-# Get the contents of the file.
-with path.open() as fid:
-    lines = fid.readlines()
 
 TEMPLATE = """
 .. note::
@@ -32,113 +23,168 @@ TEMPLATE = """
   `{0} <{0}>`_.  
 """
 
-# Update the RST file with a stub pointer to the MD file.
-if not path.name == "README.rst":
-    new_body = TEMPLATE.format(os.path.basename(md_file))
-    with path.open("w") as fid:
-        fid.write("".join(new_body))
-
-# Pre-process the file.
-for i, line in enumerate(lines):
-    # Replace curly quotes with regular quotes.
-    line = line.replace("”", '"')
-    line = line.replace("“", '"')
-    line = line.replace("’", "'")
-    line = line.replace("‘", "'")
-    lines[i] = line
-
-    # Replace the colon fence blocks with bullets,
-    # e.g. :Status:, :deprecated:, :changed:.
-    # This also includes the changelog entries.
-    match = re.match(r":(\S+):(.*)", line)
-    if match:
-        name, value = match.groups()
-        lines[i] = f"- {name.capitalize()}:{value}\n"
-
-    # Handle "":Minimum Server Version:"" as a block quote.
-    if line.strip().startswith(":Minimum Server Version:"):
-        lines[i] = "- " + line.strip()[1:] + ""
-
-    # Remove the "".. contents::" block - handled by GitHub UI.
-    if line.strip() == ".. contents::":
-        lines[i] = ""
-
-# Run pandoc and capture output.
-proc = subprocess.Popen(
-    ["pandoc", "-f", "rst", "-t", "gfm"], stdin=subprocess.PIPE, stdout=subprocess.PIPE
-)
-data = "".join(lines).encode("utf8")
-outs, _ = proc.communicate(data)
-data = outs.decode("utf8")
-
-# Fix the strings that were missing backticks.
-data = re.sub(r'<span\W+class="title-ref">', "`", data, flags=re.MULTILINE)
-data = data.replace("</span>", "`")
-
-# Handle div blocks that were created.
-# These are admonition blocks, convert to new GFM format.
-# Also add a changelog entry.
-in_block_outer = False
-in_block_inner = False
-in_changelog_first = False
-lines = data.splitlines()
-new_lines = []
-for i, line in enumerate(lines):
-    match = re.match(r'<div class="(\S+)">', line)
-    if not in_block_outer and match:
-        in_block_outer = True
-        new_lines.append(f"> [!{match.groups()[0].upper()}]")
-        continue
-    if line.strip() == "</div>":
-        if in_block_outer:
-            in_block_outer = False
-            in_block_inner = True
-        elif in_block_inner:
-            in_block_inner = False
-        continue
-    if in_block_inner:
-        line = "> " + line.strip()
-
-    if in_changelog_first:
-        today = datetime.date.today().strftime("%Y-%m-%d")
-        line = f"\n- {today}: Migrated from reStructuredText to Markdown."
-        in_changelog_first = False
-
-    if line.strip() == "## Changelog":
-        in_changelog_first = True
-
-    if not in_block_outer:
-        new_lines.append(line)
-
-
-# Write the new content to the markdown file.
-with open(md_file, "w") as fid:
-    fid.write("\n".join(new_lines))
-
-# Handle links in other files.
-# We accept relative path links or links to master
-# (https://github.com/mongodb/specifications/blob/master/source/...)
-# and rewrite them to use appropriate md links.
-# If the link is malformed we ignore and print an error.
-target = path.name
-curr = path
-while curr.parent.name != "source":
-    target = f"{curr.parent.name}/{target}"
-    curr = curr.parent
-suffix = rf"\S*/{target}"
-rel_pattern = re.compile(rf"(\.\.{suffix})")
-md_pattern = re.compile(rf"(\(http{suffix})")
-html_pattern = re.compile(f"(http{suffix})")
-abs_pattern = re.compile(f"(/source{suffix})")
-for p in Path("source").rglob("*"):
-    if p.suffix not in [".rst", ".md"]:
-        continue
-    with p.open() as fid:
-        lines = fid.readlines()
+
+def md_name(path):
+    return str(path).replace(".rst", ".md")
+
+
+def rename(paths):
+    """Rename the files to .md in one commit and restore the .rst files, to keep git history for the md files."""
+    for path in paths:
+        subprocess.check_call(["git", "mv", path, md_name(path)])
+        subprocess.check_call(["git", "add", md_name(path)])
+    if len(paths) == 1:
+        message = f"Rename {paths[0]} to {md_name(paths[0])}"
+    else:
+        message = f"Rename {len(paths)} reStructuredText files to Markdown"
+    subprocess.check_call(["git", "commit", "--no-verify", "-m", message])
+    subprocess.check_call(["git", "checkout", "HEAD~1", *paths])
+    subprocess.check_call(["git", "add", *paths])
+
+
+def preprocess(lines):
+    for i, line in enumerate(lines):
+        # Replace curly quotes with regular quotes.
+        line = line.replace("”", '"')
+        line = line.replace("“", '"')
+        line = line.replace("’", "'")
+        line = line.replace("‘", "'")
+        lines[i] = line
+
+        # Replace the colon fence blocks with bullets,
+        # e.g. :Status:, :deprecated:, :changed:.
+        # This also includes the changelog entries.
+        match = re.match(r":(\S+):(.*)", line)
+        if match:
+            name, value = match.groups()
+            lines[i] = f"- {name.capitalize()}:{value}\n"
+
+        # Handle "":Minimum Server Version:"" as a block quote.
+        if line.strip().startswith(":Minimum Server Version:"):
+            lines[i] = "- " + line.strip()[1:] + ""
+
+        # Remove the "".. contents::" block - handled by GitHub UI.
+        if line.strip() == ".. contents::":
+            lines[i] = ""
+    return lines
+
+
+def postprocess(data):
+    # Fix the strings that were missing backticks.
+    data = re.sub(r'<span\W+class="title-ref">', "`", data, flags=re.MULTILINE)
+    data = data.replace("</span>", "`")
+
+    # Handle div blocks that were created.
+    # These are admonition blocks, convert to new GFM format.
+    # Also add a changelog entry.
+    in_block_outer = False
+    in_block_inner = False
+    in_changelog_first = False
+    lines = data.splitlines()
     new_lines = []
-    changed_lines = []
-    relpath = os.path.relpath(md_file, start=p.parent)
-    for line in lines:
+    for i, line in enumerate(lines):
+        match = re.match(r'<div class="(\S+)">', line)
+        if not in_block_outer and match:
+            in_block_outer = True
+            new_lines.append(f"> [!{match.groups()[0].upper()}]")
+            continue
+        if line.strip() == "</div>":
+            if in_block_outer:
+                in_block_outer = False
+                in_block_inner = True
+            elif in_block_inner:
+                in_block_inner = False
+            continue
+        if in_block_inner:
+            line = "> " + line.strip()
+
+        if in_changelog_first:
+            today = datetime.date.today().strftime("%Y-%m-%d")
+            line = f"\n- {today}: Migrated from reStructuredText to Markdown."
+            in_changelog_first = False
+
+        if line.strip() == "## Changelog":
+            in_changelog_first = True
+
+        if not in_block_outer:
+            new_lines.append(line)
+    return "\n".join(new_lines)
+
+
+def convert(path):
+    """Convert one renamed file to Markdown and replace the rst file with a stub."""
+    md_file = md_name(path)
+
+    # Get the contents of the file.
+    with path.open() as fid:
+        lines = fid.readlines()
+
+    # Update the RST file with a stub pointer to the MD file.
+    if not path.name == "README.rst":
+        new_body = TEMPLATE.format(os.path.basename(md_file))
+        with path.open("w") as fid:
+            fid.write("".join(new_body))
+
+    # Run pandoc and capture output.
+    proc = subprocess.run(
+        ["pandoc", "-f", "rst", "-t", "gfm"], input="".join(preprocess(lines)).encode("utf8"),
+        stdout=subprocess.PIPE, check=True,
+    )
+
+    # Write the new content to the markdown file.
+    with open(md_file, "w") as fid:
+        fid.write(postprocess(proc.stdout.decode("utf8")))
+    return md_file
+
+
+class LinkRewriter:
+    """Rewrite links to migrated files throughout source/.
+
+    We accept relative path links or links to master
+    (https://github.com/mongodb/specifications/blob/master/source/...)
+    and rewrite them to use appropriate md links.
+    If the link is malformed we ignore and print an error.
+    """
+
+    def __init__(self, paths):
+        self.targets = {}
+        for path in paths:
+            target = path.name
+            curr = path
+            while curr.parent.name != "source":
+                target = f"{curr.parent.name}/{target}"
+                curr = curr.parent
+            suffix = rf"\S*/{re.escape(target)}"
+            self.targets[target] = (
+                md_name(path),
+                re.compile(rf"(\.\.{suffix})"),
+                re.compile(rf"(\(http{suffix})"),
+                re.compile(f"(http{suffix})"),
+                re.compile(f"(/source{suffix})"),
+            )
+        # Any mention of a target's file name, to find the files that may link to it.
+        names = sorted({Path(t).name for t in self.targets}, key=len, reverse=True)
+        self._mention = re.compile("|".join(re.escape(n) for n in names))
+
+    def index(self, root="source"):
+        """Return {file: set of targets} for the files that mention a migrated file, in one pass."""
+        by_name = {}
+        for target in self.targets:
+            by_name.setdefault(Path(target).name, []).append(target)
+        linking = {}
+        for p in Path(root).rglob("*"):
+            if p.suffix not in [".rst", ".md"]:
+                continue
+            with p.open() as fid:
+                text = fid.read()
+            found = {t for name in set(self._mention.findall(text)) for t in by_name[name] if t in text}
+            if found:
+                linking[p] = found
+        return linking
+
+    def _rewrite_line(self, line, p, target):
+        md_file, rel_pattern, md_pattern, html_pattern, abs_pattern = self.targets[target]
+        relpath = os.path.relpath(md_file, start=p.parent)
         new_line = line
         if re.search(rel_pattern, line):
             matchstr = re.search(rel_pattern, line).groups()[0]
@@ -162,17 +208,52 @@ for p in Path("source").rglob("*"):
         elif re.search(abs_pattern, line):
             matchstr = re.search(abs_pattern, line).groups()[0]
             new_line = line.replace(matchstr, relpath)
+        return new_line
+
+    def rewrite(self, linking):
+        """Rewrite the links in each linking file, reading and writing it once."""
+        for p, targets in sorted(linking.items()):
+            with p.open() as fid:
+                lines = fid.readlines()
+            new_lines = []
+            changed_lines = []
+            for line in lines:
+                new_line = line
+                for target in sorted(targets):
+                    if target in new_line:
+                        new_line = self._rewrite_line(new_line, p, target)
+                if new_line != line:
+                    changed_lines.append(new_line)
+                new_lines.append(new_line)
+
+            if changed_lines:
+                with p.open("w") as fid:
+                    fid.writelines(new_lines)
+                print("-" * 80)
+                print(f"Updated link(s) in {p}...")
+                print("    " + "\n   ".join(changed_lines))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate reStructuredText specs to Markdown.")
+    parser.add_argument("paths", nargs="+", type=Path, metavar="FILE.rst", help="RST files to migrate")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="number of pandoc processes")
+    args = parser.parse_args(argv)
+    paths = args.paths
+
+    rename(paths)
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        md_files = list(executor.map(convert, paths))
+
+    # Handle links in other files.
+    rewriter = LinkRewriter(paths)
+    rewriter.rewrite(rewriter.index())
 
-        if new_line != line:
-            changed_lines.append(new_line)
-        new_lines.append(new_line)
+    print("Created markdown file(s):")
+    for md_file in md_files:
+        print(md_file)
+    return 0
 
-    if changed_lines:
-        with p.open("w") as fid:
-            fid.writelines(new_lines)
-        print("-" * 80)
-        print(f"Updated link(s) in {p}...")
-        print("    " + "\n   ".join(changed_lines))
 
-print("Created markdown file:")
-print(md_file)
+if __name__ == "__main__":
+    sys.exit(main())
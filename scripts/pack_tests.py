@@ -0,0 +1,109 @@
+"""Pack the JSON spec tests into a single bundle for driver test runners.
+
+Usage: python3 scripts/pack_tests.py [--output FILE] [--extended-json] [--verify]
+
+Every ``.json`` file in a ``tests`` directory under ``source/`` is encoded as
+BSON and written to one file with an offset table keyed by path relative to
+``source/`` and a SHA-256 digest per entry. See spec_bundle.py for the format
+and for the reader.
+
+By default documents are stored exactly as the JSON describes them. With
+``--extended-json`` they are parsed as MongoDB Extended JSON first, so that,
+for example, ``{"$numberLong": "1"}`` is stored as an Int64.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import bson
+from bson import json_util
+
+import spec_bundle
+import yaml2json
+
+SOURCE = yaml2json.SOURCE
+DEFAULT_OUTPUT = SOURCE / "spec-tests.bundle"
+
+
+def find_json_tests(root=SOURCE):
+    """Return the sorted paths, relative to root, of the JSON files in tests directories."""
+    found = []
+    for dirname, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d != "node_modules" and not d.startswith(".")]
+        relative = Path(dirname).relative_to(root)
+        if "tests" not in relative.parts:
+            continue
+        found += [(relative / f).as_posix() for f in filenames if f.endswith(".json")]
+    return sorted(found)
+
+
+def encode(path, extended_json=False):
+    """Return the BSON encoding of one JSON test file."""
+    with open(path) as f:
+        if extended_json:
+            document = json_util.loads(f.read(), json_options=json_util.CANONICAL_JSON_OPTIONS)
+        else:
+            document = json.load(f)
+    return bson.encode(document)
+
+
+def pack(output=DEFAULT_OUTPUT, root=SOURCE, extended_json=False):
+    """Write a bundle of the tests under root and return the number of entries.
+
+    Files that cannot be represented as BSON are reported on stderr and left out.
+    """
+    entries = []
+    for relpath in find_json_tests(root):
+        try:
+            entries.append((relpath, encode(Path(root, relpath), extended_json)))
+        except (ValueError, TypeError, OverflowError, bson.errors.BSONError) as e:
+            print(f"Skipping {relpath}: {e}", file=sys.stderr)
+
+    flags = spec_bundle.FLAG_EXTENDED_JSON if extended_json else 0
+    table = bytearray(spec_bundle.HEADER.pack(spec_bundle.MAGIC, spec_bundle.VERSION, flags, len(entries)))
+    table_size = len(table) + sum(
+        spec_bundle.PATH_LENGTH.size + len(p.encode("utf-8")) + spec_bundle.ENTRY.size for p, _ in entries
+    )
+    offset = table_size
+    for relpath, data in entries:
+        name = relpath.encode("utf-8")
+        table += spec_bundle.PATH_LENGTH.pack(len(name)) + name
+        table += spec_bundle.ENTRY.pack(offset, len(data), hashlib.sha256(data).digest())
+        offset += len(data)
+    yaml2json.write_if_changed(Path(output), bytes(table) + b"".join(data for _, data in entries))
+    return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack the JSON spec tests into a single BSON bundle.")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT,
+                        help=f"bundle to write (default: {os.path.relpath(DEFAULT_OUTPUT)})")
+    parser.add_argument("--extended-json", action="store_true", help="parse the tests as MongoDB Extended JSON")
+    parser.add_argument("--verify", action="store_true", help="read the bundle back and check every digest")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    count = pack(args.output, extended_json=args.extended_json)
+    size = os.path.getsize(args.output)
+    print(f"Packed {count} file(s) into {args.output} ({size / 1024:.0f} KiB) "
+          f"in {time.perf_counter() - start:.1f} s")
+    if args.verify:
+        with spec_bundle.SpecBundle(args.output) as bundle:
+            bundle.verify()
+            for relpath in bundle:
+                with open(SOURCE / relpath) as f:
+                    expected = json_util.loads(f.read()) if bundle.extended_json else json.load(f)
+                if bundle[relpath] != expected:
+                    print(f"{relpath}: decoded document differs from the JSON file", file=sys.stderr)
+                    return 1
+        print("Verified")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""Split the unified test files into shards of roughly equal running time.
+
+Usage: python3 scripts/plan_shards.py -n SHARDS [--junit REPORT ...] [--topology TOPOLOGY]
+                                      [--shard INDEX | --json] [path ...]
+
+Each path may be a test file or a directory, which is searched recursively.
+With no paths, every unified test under ``source/`` is planned.
+
+The cost of a file is estimated from its contents: the number of tests and
+operations, the time failpoints block for (``blockTimeMS``), explicit ``wait``
+operations, the size of ``initialData`` and whether the file runs at all on
+``--topology``. Durations measured in JUnit XML reports replace the estimate
+for the files they cover, and calibrate the estimate for the files they do not.
+Files are then assigned to shards longest first, each to the shard with the
+least work so far.
+
+With ``--shard``, only the files of that shard (counting from 0) are printed,
+one per line, for use in a CI job.
+"""
+
+import argparse
+import heapq
+import json
+import os
+import re
+import sys
+import xml.etree.ElementTree as ElementTree
+from pathlib import Path
+
+import spec_index
+import yaml2json
+
+SOURCE = yaml2json.SOURCE
+
+# Estimated costs, in seconds.
+FILE_COST = 0.5  # creating clients and dropping collections
+TEST_COST = 0.1
+OPERATION_COST = 0.02
+FAILPOINT_COST = 0.05
+EVENT_WAIT_COST = 0.25  # waitForEvent and friends poll until the event arrives
+COLLECTION_COST = 0.05
+DOCUMENT_COST = 0.001
+SKIPPED_FILE_COST = 0.02
+# Operations are slower through mongos than against a replica set member.
+TOPOLOGY_FACTOR = {"sharded": 1.5, "sharded-replicaset": 1.5, "load-balanced": 1.5}
+
+
+def _operations(node):
+    """Yield every operation in a test, including those nested in loops and callbacks."""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in ("operations", "callback") and isinstance(value, list):
+                for op in value:
+                    if isinstance(op, dict) and "name" in op:
+                        yield op
+            yield from _operations(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _operations(item)
+
+
+def _runs_on(document, topology, test=None):
+    """Return True if document, or just one of its tests, runs on topology."""
+    if test is not None:
+        document = {**document, "tests": [test]}
+    return any(topology in req["topologies"] for req in spec_index.requirements(document))
+
+
+def estimate(document, topology=None):
+    """Return the estimated running time in seconds of a unified test document."""
+    if topology is not None and not _runs_on(document, topology):
+        return SKIPPED_FILE_COST
+    cost = FILE_COST
+    tests = document.get("tests") or []
+    for test in tests:
+        if topology is not None and not _runs_on(document, topology, test):
+            continue
+        cost += TEST_COST
+        for op in _operations(test):
+            cost += OPERATION_COST
+            name = op.get("name")
+            arguments = op.get("arguments") if isinstance(op.get("arguments"), dict) else {}
+            if name == "wait":
+                cost += arguments.get("ms", 0) / 1000
+            elif name in ("waitForEvent", "waitForPrimaryChange", "waitForThread", "assertEventCount"):
+                cost += EVENT_WAIT_COST
+            failpoint = arguments.get("failPoint")
+            if isinstance(failpoint, dict):
+                cost += FAILPOINT_COST
+                data = failpoint.get("data") if isinstance(failpoint.get("data"), dict) else {}
+                if data.get("blockConnection"):
+                    mode = failpoint.get("mode")
+                    times = mode.get("times", 1) if isinstance(mode, dict) else 1
+                    cost += data.get("blockTimeMS", 0) / 1000 * min(times, 10)
+    for collection in document.get("initialData") or []:
+        cost += COLLECTION_COST * len(tests)
+        cost += DOCUMENT_COST * len(collection.get("documents") or []) * len(tests)
+    return cost * TOPOLOGY_FACTOR.get(topology, 1.0)
+
+
+def find_unified_tests(paths):
+    """Return {path: document} for the unified test files under paths."""
+    files = []
+    for path in paths:
+        path = Path(path).resolve()
+        if path.is_dir():
+            files += spec_index.find_tests(path).values()
+        else:
+            files.append(path)
+    found = {}
+    for path in sorted(set(files)):
+        with open(path) as f:
+            document = json.load(f) if path.suffix == ".json" else yaml2json.load(f.read())
+        if isinstance(document, dict) and "schemaVersion" in document:
+            found[path] = document
+    return found
+
+
+def _normalize(name):
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def _spec(path):
+    """The normalized name of the spec directory of a test file."""
+    try:
+        return _normalize(path.relative_to(SOURCE).parts[0])
+    except ValueError:
+        return _normalize(path.parent.name)
+
+
+def _words(name):
+    """The words of a JUnit class name or test name, without "test" prefixes."""
+    return [w for w in re.split(r"[^A-Za-z0-9]+", re.sub(r"^test_?|_?test$", "", name)) if w and w != "test"]
+
+
+def read_junit(reports, files):
+    """Return ({path: seconds} measured in JUnit XML reports, [ambiguous test cases]).
+
+    A test case is credited to the file whose spec directory is part of its
+    class name and whose name starts its name, longest name first.
+    """
+    index = {}
+    for path in files:
+        index.setdefault((_spec(path), _normalize(path.name.split(".")[0])), []).append(path)
+    specs = {spec for spec, _ in index}
+    durations = {}
+    ambiguous = []
+    for report in reports:
+        for case in ElementTree.parse(report).iter("testcase"):
+            classname, name = case.get("classname", ""), case.get("name", "")
+            parts = [_normalize("".join(_words(part))) for part in classname.split(".")]
+            words = _words(name)
+            stems = [_normalize("".join(words[:k])) for k in range(len(words), 0, -1)] + parts[::-1]
+            matches = []
+            for spec in specs.intersection(parts):
+                matches += next((index[spec, stem] for stem in stems if (spec, stem) in index), [])
+            if len(matches) == 1:
+                durations[matches[0]] = durations.get(matches[0], 0.0) + float(case.get("time") or 0)
+            elif matches:
+                ambiguous.append(f"{classname}.{name}")
+    return durations, ambiguous
+
+
+def costs(files, durations=None, topology=None):
+    """Return {path: seconds}, using measured durations where available."""
+    estimates = {path: estimate(document, topology) for path, document in files.items()}
+    durations = {p: d for p, d in (durations or {}).items() if p in estimates}
+    if not durations:
+        return estimates
+    # Scale the estimates of unmeasured files to the measured ones.
+    scale = sum(durations.values()) / sum(estimates[p] for p in durations)
+    return {path: durations.get(path, cost * scale) for path, cost in estimates.items()}
+
+
+def plan(costs, shards):
+    """Assign files to shards by longest processing time first.
+
+    Returns a list of (total cost, [paths]) with one entry per shard.
+    """
+    result = [(0.0, i, []) for i in range(shards)]
+    heap = list(result)
+    heapq.heapify(heap)
+    totals = [0.0] * shards
+    for path, cost in sorted(costs.items(), key=lambda item: (-item[1], item[0])):
+        total, i, paths = heapq.heappop(heap)
+        paths.append(path)
+        totals[i] = total + cost
+        heapq.heappush(heap, (totals[i], i, paths))
+    return [(totals[i], sorted(paths)) for _, i, paths in result]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Split the unified test files into balanced shards.")
+    parser.add_argument("paths", nargs="*", default=[SOURCE], help="test files or directories (default: source/)")
+    parser.add_argument("-n", "--shards", type=int, required=True, help="number of shards")
+    parser.add_argument("--junit", action="append", default=[], metavar="REPORT",
+                        help="JUnit XML report with measured durations (may be repeated)")
+    parser.add_argument("--topology", choices=spec_index.TOPOLOGIES, help="topology the tests will run against")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument("--shard", type=int, help="print only the files of this shard")
+    output.add_argument("--json", action="store_true", help="print the plan as JSON")
+    args = parser.parse_args(argv)
+    if args.shards < 1 or (args.shard is not None and not 0 <= args.shard < args.shards):
+        parser.error("need 1 or more shards and 0 <= --shard < --shards")
+
+    files = find_unified_tests(args.paths)
+    durations = None
+    if args.junit:
+        durations, ambiguous = read_junit(args.junit, files)
+        if ambiguous:
+            print(f"Not counted: {len(ambiguous)} test case(s) that match more than one file, e.g. {ambiguous[0]}",
+                  file=sys.stderr)
+    shards = plan(costs(files, durations, args.topology), args.shards)
+
+    def relpath(path):
+        return os.path.relpath(path)
+
+    if args.shard is not None:
+        for path in shards[args.shard][1]:
+            print(relpath(path))
+    elif args.json:
+        print(json.dumps([{"cost": round(cost, 3), "files": [relpath(p) for p in paths]}
+                          for cost, paths in shards], indent=2))
+    else:
+        for i, (cost, paths) in enumerate(shards):
+            print(f"shard {i}: {len(paths)} file(s), {cost:.1f} s")
+        totals = [cost for cost, _ in shards]
+        measured = f", {len(durations)} measured" if durations else ""
+        print(f"{len(files)} file(s){measured}; slowest shard {max(totals):.1f} s, "
+              f"mean {sum(totals) / len(totals):.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
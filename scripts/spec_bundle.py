@@ -0,0 +1,159 @@
+"""Read a bundle of spec test files written by pack_tests.py.
+
+A bundle holds every JSON test file under ``source/*/tests`` as a BSON
+document. It starts with a header and an offset table sorted by path, followed
+by the documents::
+
+    header   magic b"SPECTEST", version (u32), flags (u32), entry count (u32)
+    entry    path length (u16), path (UTF-8, relative to source/),
+             offset (u64), length (u32), SHA-256 of the document (32 bytes)
+    data     the BSON documents
+
+All integers are little endian. The bundle is memory-mapped, so opening it
+reads only the offset table, and each document is decoded the first time it is
+asked for. This module only needs the ``bson`` package that comes with
+PyMongo and can be copied into a driver's test suite as is.
+
+Example::
+
+    with SpecBundle("spec-tests.bundle") as bundle:
+        for path in bundle.paths("crud/tests/unified/"):
+            run(bundle[path])
+"""
+
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+
+import bson
+
+MAGIC = b"SPECTEST"
+VERSION = 1
+# The documents were parsed as MongoDB Extended JSON, so {"$numberLong": "1"}
+# is stored as an Int64 rather than as a subdocument.
+FLAG_EXTENDED_JSON = 0x1
+
+HEADER = struct.Struct("<8sIII")
+ENTRY = struct.Struct("<QI32s")
+PATH_LENGTH = struct.Struct("<H")
+
+
+class BundleError(Exception):
+    """Raised when a bundle is malformed or an entry fails verification."""
+
+
+class SpecBundle:
+    """A memory-mapped, read-only test bundle."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            # mmap cannot map an empty file.
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise BundleError(f"{path} is truncated")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, self.flags, count = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise BundleError(f"{path} is not a test bundle")
+            if version != VERSION:
+                raise BundleError(f"Unsupported bundle version {version}")
+            self._paths = []
+            self._entries = []
+            offset = HEADER.size
+            for _ in range(count):
+                (length,) = PATH_LENGTH.unpack_from(self._map, offset)
+                offset += PATH_LENGTH.size
+                self._paths.append(self._map[offset:offset + length].decode("utf-8"))
+                offset += length
+                self._entries.append(ENTRY.unpack_from(self._map, offset))
+                offset += ENTRY.size
+        except struct.error:
+            self.close()
+            raise BundleError(f"{path} is truncated") from None
+        except BundleError:
+            self.close()
+            raise
+        self._decoded = {}
+
+    def close(self):
+        """Unmap the bundle. Raises BufferError if a view returned by raw() is still alive."""
+        self._decoded = {}
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def extended_json(self):
+        return bool(self.flags & FLAG_EXTENDED_JSON)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __contains__(self, path):
+        return self._find(path) is not None
+
+    def _find(self, path):
+        i = bisect.bisect_left(self._paths, path)
+        if i < len(self._paths) and self._paths[i] == path:
+            return i
+        return None
+
+    def paths(self, prefix=""):
+        """Return the sorted paths that start with prefix, e.g. "crud/tests/unified/"."""
+        start = bisect.bisect_left(self._paths, prefix)
+        end = start
+        while end < len(self._paths) and self._paths[end].startswith(prefix):
+            end += 1
+        return self._paths[start:end]
+
+    def raw(self, path):
+        """Return the BSON bytes of an entry as a memoryview into the bundle, without copying.
+
+        The view must be released, e.g. by using it as a context manager,
+        before the bundle is closed.
+        """
+        i = self._find(path)
+        if i is None:
+            raise KeyError(path)
+        offset, length, _ = self._entries[i]
+        return memoryview(self._map)[offset:offset + length]
+
+    def digest(self, path):
+        """Return the SHA-256 digest stored for an entry."""
+        i = self._find(path)
+        if i is None:
+            raise KeyError(path)
+        return self._entries[i][2]
+
+    def verify(self, path=None):
+        """Check the stored digest of one entry, or of every entry if path is None."""
+        for p in [path] if path is not None else self._paths:
+            with self.raw(p) as data:
+                if hashlib.sha256(data).digest() != self.digest(p):
+                    raise BundleError(f"Digest mismatch for {p}")
+
+    def __getitem__(self, path):
+        """Return the decoded test document at path, decoding it on first access."""
+        try:
+            return self._decoded[path]
+        except KeyError:
+            pass
+        with self.raw(path) as data:
+            document = bson.decode(data)
+        self._decoded[path] = document
+        return document
+
+    def get(self, path, default=None):
+        try:
+            return self[path]
+        except KeyError:
+            return default
@@ -0,0 +1,384 @@
+"""Build and query an index of the spec test corpus.
+
+Usage:
+    python3 scripts/spec_index.py update
+    python3 scripts/spec_index.py query [--operation NAME] [--failpoint NAME] ... [--count]
+    python3 scripts/spec_index.py sql "SELECT ..."
+
+Every test file under ``source/*/tests`` (the JSON twin where one exists) is
+read once, and the operations, entity types, failpoints, run requirements and
+expected events it uses are stored in ``source/.test-index.sqlite``, one table
+per attribute. Only files whose content hash changed since the last update are
+read again. ``query`` updates the index first unless ``--no-update`` is given,
+and prints the files matching every given option, for example::
+
+    python3 scripts/spec_index.py query --failpoint failCommand \\
+        --failpoint-option closeConnection --topology sharded --server-version 4.4
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+import yaml2json
+
+SOURCE = yaml2json.SOURCE
+INVALID_DIR = SOURCE / "unified-test-format" / "tests" / "invalid"
+INDEX_NAME = ".test-index.sqlite"
+INDEX_VERSION = 1
+
+TOPOLOGIES = ("single", "replicaset", "sharded", "sharded-replicaset", "load-balanced")
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    digest TEXT NOT NULL,
+    mtime INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    schema_version TEXT,
+    tests INTEGER NOT NULL
+);
+CREATE TABLE operations (file_id INTEGER NOT NULL REFERENCES files ON DELETE CASCADE, name TEXT NOT NULL);
+CREATE TABLE entities (file_id INTEGER NOT NULL REFERENCES files ON DELETE CASCADE, type TEXT NOT NULL);
+CREATE TABLE failpoints (file_id INTEGER NOT NULL REFERENCES files ON DELETE CASCADE, name TEXT NOT NULL);
+CREATE TABLE failpoint_options (file_id INTEGER NOT NULL REFERENCES files ON DELETE CASCADE, option TEXT NOT NULL);
+CREATE TABLE fail_commands (file_id INTEGER NOT NULL REFERENCES files ON DELETE CASCADE, command TEXT NOT NULL);
+CREATE TABLE requirements (
+    file_id INTEGER NOT NULL REFERENCES files ON DELETE CASCADE,
+    topology TEXT NOT NULL,
+    min_server_version INTEGER,
+    max_server_version INTEGER,
+    serverless TEXT,
+    auth INTEGER,
+    csfle INTEGER
+);
+CREATE TABLE event_types (file_id INTEGER NOT NULL REFERENCES files ON DELETE CASCADE, type TEXT NOT NULL);
+CREATE TABLE events (file_id INTEGER NOT NULL REFERENCES files ON DELETE CASCADE, name TEXT NOT NULL);
+CREATE INDEX operations_name ON operations (name, file_id);
+CREATE INDEX entities_type ON entities (type, file_id);
+CREATE INDEX failpoints_name ON failpoints (name, file_id);
+CREATE INDEX failpoint_options_option ON failpoint_options (option, file_id);
+CREATE INDEX fail_commands_command ON fail_commands (command, file_id);
+CREATE INDEX requirements_topology ON requirements (topology, file_id);
+CREATE INDEX event_types_type ON event_types (type, file_id);
+CREATE INDEX events_name ON events (name, file_id);
+"""
+
+# The attribute tables and the column holding each table's value.
+ATTRIBUTES = {
+    "operations": "name",
+    "entities": "type",
+    "failpoints": "name",
+    "failpoint_options": "option",
+    "fail_commands": "command",
+    "event_types": "type",
+    "events": "name",
+}
+
+
+def version_number(version):
+    """Encode a server version like "4.4" or "4.2.99" as a sortable integer."""
+    if version is None:
+        return None
+    parts = []
+    for part in str(version).split(".")[:3]:
+        digits = "".join(c for c in part if c.isdigit())
+        parts.append(int(digits or 0))
+    parts += [0] * (3 - len(parts))
+    return parts[0] * 1000000 + parts[1] * 1000 + parts[2]
+
+
+def find_tests(root=SOURCE):
+    """Return {path relative to source/: path} for the test files under root.
+
+    A YAML file is skipped if it has a JSON twin. Tests that are meant to fail
+    schema validation are not runnable and are skipped as well.
+    """
+    found = {}
+    for dirname, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d != "node_modules" and not d.startswith(".")]
+        dirpath = Path(dirname)
+        if dirpath == INVALID_DIR or "tests" not in dirpath.relative_to(SOURCE).parts:
+            continue
+        for filename in filenames:
+            if filename.endswith(".json") or (filename.endswith(".yml") and filename[:-4] + ".json" not in filenames):
+                path = dirpath / filename
+                found[path.relative_to(SOURCE).as_posix()] = path
+    return found
+
+
+def _walk(node):
+    """Yield (key, value) for every mapping entry in a document, depth first."""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield key, value
+            yield from _walk(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _walk(item)
+
+
+def _requirement(req):
+    topologies = req.get("topologies") or req.get("topology") or TOPOLOGIES
+    if isinstance(topologies, str):
+        topologies = [topologies]
+    return {
+        "topologies": set(topologies),
+        "min": version_number(req.get("minServerVersion")),
+        "max": version_number(req.get("maxServerVersion")),
+        "serverless": req.get("serverless") if isinstance(req.get("serverless"), str) else None,
+        "auth": req.get("auth") if isinstance(req.get("auth"), bool) else None,
+        "csfle": bool(req["csfle"]) if "csfle" in req else None,
+    }
+
+
+def _combine(outer, inner):
+    """Narrow a file-level requirement by a test-level one."""
+    mins = [v for v in (outer["min"], inner["min"]) if v is not None]
+    maxes = [v for v in (outer["max"], inner["max"]) if v is not None]
+    combined = {"topologies": outer["topologies"] & inner["topologies"],
+                "min": max(mins) if mins else None,
+                "max": min(maxes) if maxes else None}
+    for key in ("serverless", "auth", "csfle"):
+        combined[key] = inner[key] if inner[key] is not None else outer[key]
+    return combined
+
+
+def requirements(document):
+    """Return the requirement sets under which any test in document runs."""
+    top = document.get("runOnRequirements", document.get("runOn"))
+    if top is None and any(k in document for k in ("minServerVersion", "maxServerVersion", "topology")):
+        top = [document]
+    outer = [_requirement(r) for r in top if isinstance(r, dict)] if isinstance(top, list) else []
+    outer = outer or [_requirement({})]
+    tests = document.get("tests")
+    if not isinstance(tests, list):
+        return outer
+    result = []
+    for test in tests:
+        inner = test.get("runOnRequirements", test.get("runOn")) if isinstance(test, dict) else None
+        if not isinstance(inner, list) or not inner:
+            result.extend(outer)
+            continue
+        for o in outer:
+            result.extend(_combine(o, _requirement(i)) for i in inner if isinstance(i, dict))
+    unique = {}
+    for req in result:
+        key = (tuple(sorted(req["topologies"])), req["min"], req["max"], req["serverless"], req["auth"], req["csfle"])
+        unique[key] = req
+    return list(unique.values())
+
+
+def extract(document):
+    """Return the indexed attributes of one test document as {table: set of values}."""
+    attrs = {table: set() for table in ATTRIBUTES}
+    for key, value in _walk(document):
+        if key in ("operations", "callback") and isinstance(value, list):
+            for op in value:
+                if isinstance(op, dict) and isinstance(op.get("name"), str):
+                    attrs["operations"].add(op["name"])
+        elif key == "operation" and isinstance(value, dict) and isinstance(value.get("name"), str):
+            attrs["operations"].add(value["name"])
+        elif key == "createEntities" and isinstance(value, list):
+            for entity in value:
+                if isinstance(entity, dict):
+                    attrs["entities"].update(entity)
+        elif key == "configureFailPoint" and isinstance(value, str):
+            attrs["failpoints"].add(value)
+        elif key == "failCommands" and isinstance(value, list):
+            attrs["fail_commands"].update(c for c in value if isinstance(c, str))
+        elif key == "expectEvents" and isinstance(value, list):
+            for expected in value:
+                if not isinstance(expected, dict):
+                    continue
+                event_type = expected.get("eventType", "command")
+                if isinstance(event_type, str):
+                    attrs["event_types"].add(event_type)
+                events = expected.get("events")
+                for event in events if isinstance(events, list) else []:
+                    if isinstance(event, dict):
+                        attrs["events"].update(event)
+        elif key == "expectations" and isinstance(value, list):
+            for event in value:
+                if isinstance(event, dict):
+                    attrs["events"].update(event)
+    # Failpoint options are the keys of the data document next to configureFailPoint.
+    for key, value in _walk(document):
+        if isinstance(value, dict) and "configureFailPoint" in value and isinstance(value.get("data"), dict):
+            attrs["failpoint_options"].update(value["data"])
+    return attrs
+
+
+class Index:
+    """The SQLite test index."""
+
+    def __init__(self, path=None):
+        self.path = Path(path or SOURCE / INDEX_NAME)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        row = None
+        try:
+            row = self.db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        except sqlite3.OperationalError:
+            pass
+        if row is None or row[0] != str(INDEX_VERSION):
+            self._create()
+
+    def _create(self):
+        tables = [r[0] for r in self.db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        self.db.execute("PRAGMA foreign_keys = OFF")
+        for table in tables:
+            self.db.execute(f"DROP TABLE {table}")
+        self.db.executescript(_SCHEMA)
+        self.db.execute("INSERT INTO meta VALUES ('version', ?)", (str(INDEX_VERSION),))
+        self.db.commit()
+        self.db.execute("PRAGMA foreign_keys = ON")
+
+    def close(self):
+        self.db.close()
+
+    def update(self):
+        """Index new and changed test files and drop removed ones.
+
+        Returns (number of files read, number of files removed).
+        """
+        files = find_tests()
+        known = {row[0]: row[1:] for row in self.db.execute("SELECT path, digest, mtime, size FROM files")}
+        read = 0
+        with self.db:
+            for relpath, path in files.items():
+                st = path.stat()
+                previous = known.get(relpath)
+                if previous is not None and previous[1:] == (st.st_mtime_ns, st.st_size):
+                    continue
+                contents = path.read_bytes()
+                digest = hashlib.sha256(contents).hexdigest()
+                if previous is not None and previous[0] == digest:
+                    self.db.execute("UPDATE files SET mtime = ?, size = ? WHERE path = ?",
+                                    (st.st_mtime_ns, st.st_size, relpath))
+                    continue
+                self.db.execute("DELETE FROM files WHERE path = ?", (relpath,))
+                self._add(relpath, path, contents, digest, st)
+                read += 1
+            removed = [p for p in known if p not in files]
+            self.db.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in removed])
+        return read, len(removed)
+
+    def _add(self, relpath, path, contents, digest, st):
+        try:
+            if path.suffix == ".json":
+                document = json.loads(contents)
+            else:
+                document = yaml2json.load(contents.decode("utf-8"))
+        except (ValueError, yaml2json.yaml.YAMLError):
+            document = None
+        if not isinstance(document, dict):
+            document = {}
+        tests = document.get("tests")
+        schema_version = document.get("schemaVersion")
+        file_id = self.db.execute(
+            "INSERT INTO files (path, digest, mtime, size, schema_version, tests) VALUES (?, ?, ?, ?, ?, ?)",
+            (relpath, digest, st.st_mtime_ns, st.st_size, None if schema_version is None else str(schema_version),
+             len(tests) if isinstance(tests, list) else 0),
+        ).lastrowid
+        for table, values in extract(document).items():
+            self.db.executemany(f"INSERT INTO {table} VALUES (?, ?)", [(file_id, v) for v in sorted(values)])
+        rows = []
+        for req in requirements(document):
+            for topology in sorted(req["topologies"]):
+                rows.append((file_id, topology, req["min"], req["max"], req["serverless"],
+                             None if req["auth"] is None else int(req["auth"]),
+                             None if req["csfle"] is None else int(req["csfle"])))
+        self.db.executemany("INSERT INTO requirements VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def query(self, attributes=(), topology=None, server_version=None, path=None):
+        """Return the paths of files matching every condition.
+
+        attributes is a list of (table, value) pairs. topology and
+        server_version must be satisfied by the same requirement set.
+        """
+        clauses, params = [], []
+        for table, value in attributes:
+            clauses.append(f"id IN (SELECT file_id FROM {table} WHERE {ATTRIBUTES[table]} = ?)")
+            params.append(value)
+        if topology is not None or server_version is not None:
+            conditions = []
+            if topology is not None:
+                conditions.append("topology = ?")
+                params.append(topology)
+            if server_version is not None:
+                version = version_number(server_version)
+                conditions.append("(min_server_version IS NULL OR min_server_version <= ?)"
+                                  " AND (max_server_version IS NULL OR max_server_version >= ?)")
+                params += [version, version]
+            clauses.append(f"id IN (SELECT file_id FROM requirements WHERE {' AND '.join(conditions)})")
+        if path is not None:
+            clauses.append("path LIKE ? ESCAPE '\\'")
+            params.append(path.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        where = " AND ".join(clauses) or "1"
+        return [row[0] for row in self.db.execute(f"SELECT path FROM files WHERE {where} ORDER BY path", params)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and query an index of the spec test corpus.")
+    parser.add_argument("--index", default=None, help=f"index file (default: source/{INDEX_NAME})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("update", help="index new and changed test files")
+
+    query = subparsers.add_parser("query", help="list test files matching all of the given options")
+    options = {
+        "operation": "operations",
+        "entity": "entities",
+        "failpoint": "failpoints",
+        "failpoint_option": "failpoint_options",
+        "fail_command": "fail_commands",
+        "event_type": "event_types",
+        "event": "events",
+    }
+    for option in options:
+        query.add_argument("--" + option.replace("_", "-"), action="append", default=[], metavar="NAME")
+    query.add_argument("--topology", choices=TOPOLOGIES, help="runs on this topology")
+    query.add_argument("--server-version", metavar="VERSION", help="runs against this server version")
+    query.add_argument("--path", help="path prefix relative to source/, e.g. crud/tests/unified")
+    query.add_argument("--count", action="store_true", help="print only the number of matching files")
+    query.add_argument("--no-update", action="store_true", help="query the index without updating it first")
+
+    sql = subparsers.add_parser("sql", help="run an SQL query against the index")
+    sql.add_argument("statement")
+    args = parser.parse_args(argv)
+
+    index = Index(args.index)
+    try:
+        if args.command == "update":
+            read, removed = index.update()
+            print(f"Indexed {read} file(s), removed {removed}")
+        elif args.command == "query":
+            if not args.no_update:
+                index.update()
+            attributes = [(table, value) for option, table in options.items() for value in getattr(args, option)]
+            paths = index.query(attributes, args.topology, args.server_version, args.path)
+            if args.count:
+                print(len(paths))
+            else:
+                for path in paths:
+                    print(os.path.join("source", path))
+        else:
+            for row in index.db.execute(args.statement):
+                print("\t".join("" if v is None else str(v) for v in row))
+    except sqlite3.Error as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
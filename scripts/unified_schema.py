@@ -0,0 +1,96 @@
+"""Validate unified test documents against the schema their schemaVersion names.
+
+Each ``source/unified-test-format/schema-1.x.json`` is compiled into a
+validator the first time it is needed and reused afterwards. Documents in
+another format, such as the legacy CSFLE tests, can be validated against a
+schema file of their own in the same way. Validation
+requires the `jsonschema <https://pypi.org/project/jsonschema/>`_ package;
+without it, ``available()`` is False and ``validate`` raises RuntimeError.
+"""
+
+import functools
+import json
+import re
+from pathlib import Path
+
+try:
+    import jsonschema
+except ImportError:
+    jsonschema = None
+
+SCHEMA_DIR = Path(__file__).resolve().parent.parent / "source" / "unified-test-format"
+
+_VERSION = re.compile(r"^(\d+)\.(\d+)(?:\.\d+)?$")
+
+
+def available():
+    """Return True if schema validation can be performed."""
+    return jsonschema is not None
+
+
+@functools.lru_cache(maxsize=None)
+def schema_versions():
+    """Return the available schema versions as sorted (major, minor) tuples."""
+    versions = []
+    for path in SCHEMA_DIR.glob("schema-*.json"):
+        match = _VERSION.match(path.stem[len("schema-"):])
+        if match:
+            versions.append((int(match.group(1)), int(match.group(2))))
+    return tuple(sorted(versions))
+
+
+def parse_version(schema_version):
+    """Parse a schemaVersion string like "1.4" into a (major, minor) tuple."""
+    match = _VERSION.match(str(schema_version))
+    if match is None:
+        raise ValueError(f"Invalid schemaVersion {schema_version!r}")
+    return int(match.group(1)), int(match.group(2))
+
+
+@functools.lru_cache(maxsize=None)
+def schema_validator(path):
+    """Return the compiled validator for the schema file at path."""
+    if jsonschema is None:
+        raise RuntimeError('schema validation requires "pip install jsonschema"')
+    schema = json.loads(Path(path).read_text())
+    cls = jsonschema.validators.validator_for(schema)
+    return cls(schema)
+
+
+def validator(version):
+    """Return the compiled validator for a (major, minor) schema version."""
+    try:
+        return schema_validator(SCHEMA_DIR / "schema-{}.{}.json".format(*version))
+    except FileNotFoundError:
+        raise ValueError("No schema for schemaVersion {}.{}".format(*version)) from None
+
+
+def _pointer(path):
+    return "".join(f"/{p}" for p in path) or "/"
+
+
+def validate(document, version=None, schema=None):
+    """Return a list of error messages for a unified test document.
+
+    The schema is the file at ``schema`` if given, else the one chosen by
+    ``version`` if given, and by the document's own ``schemaVersion`` otherwise.
+    """
+    if schema is not None:
+        return _errors(schema_validator(schema), document)
+    if version is None:
+        if not isinstance(document, dict) or "schemaVersion" not in document:
+            return ["missing schemaVersion"]
+        try:
+            version = parse_version(document["schemaVersion"])
+        except ValueError as e:
+            return [str(e)]
+    try:
+        compiled = validator(version)
+    except ValueError as e:
+        return [str(e)]
+    return _errors(compiled, document)
+
+
+def _errors(compiled, document):
+    errors = sorted(compiled.iter_errors(document), key=lambda e: list(e.absolute_path))
+    return [f"{_pointer(e.absolute_path)}: {e.message}" for e in errors]
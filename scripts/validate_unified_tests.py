@@ -0,0 +1,146 @@
+"""Validate every unified test against the schema its schemaVersion declares.
+
+Usage: python3 scripts/validate_unified_tests.py [--jobs N] [--min-version] [path ...]
+
+Each path may be a test file or a directory, which is searched recursively.
+With no paths, all of ``source/`` is checked. A file is a unified test if it
+has a top-level ``schemaVersion``. Tests under
+``unified-test-format/tests/invalid`` are expected to fail validation.
+
+With ``--min-version``, the lowest schema version each file validates against
+is also reported for files that declare a higher one. This is a lower bound
+from the schemas alone: a test may rely on behaviour that a later version of
+the format added without changing the schema, such as a new operator.
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import unified_schema
+import yaml2json
+
+SOURCE = yaml2json.SOURCE
+INVALID_DIR = SOURCE / "unified-test-format" / "tests" / "invalid"
+
+
+def find_tests(paths):
+    """Expand paths into test files, preferring the JSON twin of each YAML file."""
+    found = set()
+    for path in paths:
+        path = Path(path).resolve()
+        if path.is_dir():
+            for dirname, dirnames, filenames in os.walk(path):
+                dirnames[:] = [d for d in dirnames if d != "node_modules" and not d.startswith(".")]
+                for filename in filenames:
+                    if filename.endswith(".json") and not filename.startswith("schema-"):
+                        found.add(Path(dirname, filename))
+                    elif filename.endswith(".yml") and filename[:-4] + ".json" not in filenames:
+                        found.add(Path(dirname, filename))
+        else:
+            found.add(path)
+    return sorted(found)
+
+
+def load(path):
+    with open(path) as f:
+        if path.suffix == ".json":
+            return json.load(f)
+        return yaml2json.load(f.read())
+
+
+def lowest_version(document, declared):
+    """Return the lowest schema version, up to declared, that document validates against.
+
+    The versions are tried in order, since a later schema may also reject
+    something an earlier one allowed.
+    """
+    for version in unified_schema.schema_versions():
+        if version >= declared or not unified_schema.validate(document, version):
+            return version
+    return declared
+
+
+def check(path, min_version=False):
+    """Validate one file, returning (path, declared, errors, lowest) or None if it is not a unified test."""
+    try:
+        document = load(path)
+    except (ValueError, yaml2json.yaml.YAMLError) as e:
+        return path, None, [f"cannot parse: {e}"], None
+    if not isinstance(document, dict) or "schemaVersion" not in document:
+        return None
+    try:
+        declared = unified_schema.parse_version(document["schemaVersion"])
+    except ValueError as e:
+        declared, errors = None, [str(e)]
+    else:
+        # Tests of unsupported schema versions (e.g. valid-fail) are checked
+        # against the latest schema, as the unified-test-format Makefile does.
+        version = declared if declared in unified_schema.schema_versions() else unified_schema.schema_versions()[-1]
+        errors = unified_schema.validate(document, version)
+    if INVALID_DIR in path.parents:
+        errors = [] if errors else ["expected validation to fail, but it passed"]
+        return path, declared, errors, None
+    lowest = None
+    if min_version and not errors and declared in unified_schema.schema_versions():
+        lowest = lowest_version(document, declared)
+    return path, declared, errors, lowest
+
+
+def _check_many(args):
+    paths, min_version = args
+    return [result for result in (check(p, min_version) for p in paths) if result is not None]
+
+
+def validate(paths, jobs=None, min_version=False):
+    """Validate the tests under paths in a process pool and return the results."""
+    files = find_tests(paths)
+    jobs = jobs or os.cpu_count() or 1
+    # Each worker compiles a schema version the first time it sees it, so hand
+    # out large chunks to keep the number of compilations down.
+    chunks = [(files[i::jobs], min_version) for i in range(jobs)]
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = [r for chunk in executor.map(_check_many, chunks) for r in chunk]
+    else:
+        results = _check_many((files, min_version))
+    return sorted(results, key=lambda r: r[0])
+
+
+def _version(version):
+    return "{}.{}".format(*version)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate unified tests against their declared schema version.")
+    parser.add_argument("paths", nargs="*", default=[SOURCE], help="test files or directories (default: source/)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--min-version", action="store_true",
+                        help="report the lowest schema version each file validates against")
+    args = parser.parse_args(argv)
+
+    if not unified_schema.available():
+        print('Error: need "pip install jsonschema"', file=sys.stderr)
+        return 2
+
+    results = validate(args.paths, args.jobs, args.min_version)
+    failed = 0
+    for path, declared, errors, lowest in results:
+        relpath = os.path.relpath(path)
+        if errors:
+            failed += 1
+            version = f" (schemaVersion {_version(declared)})" if declared else ""
+            print(f"FAIL {relpath}{version}")
+            for error in errors:
+                print(f"  {error}")
+        elif lowest is not None and lowest < declared:
+            print(f"{relpath}: declares {_version(declared)}, schema-only lower bound {_version(lowest)}")
+    print(f"{len(results) - failed} of {len(results)} unified test(s) passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
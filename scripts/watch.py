@@ -0,0 +1,247 @@
+"""Regenerate test files as their sources change.
+
+Usage: python3 scripts/watch.py [--poll] [--interval SECONDS]
+
+Watches ``source/`` and, for each changed file, runs only the generator
+targets and JSON conversions that depend on it:
+
+- a ``.yml`` file is converted to JSON;
+- a template rendered by ``source/etc/generate_tests.py`` re-renders that target;
+- a CSFLE ``test-templates/*.yml.template`` re-renders that template;
+- a CSFLE ``etc/data`` file re-renders the CSFLE templates that read it;
+- an SDAM error template reruns ``generate-error-tests.py``.
+
+Compiled templates and parsed fixtures stay loaded between changes. On Linux
+the watcher uses inotify; elsewhere, or with ``--poll``, it polls file
+modification times.
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import importlib.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+import yaml2json
+
+SOURCE = yaml2json.SOURCE
+CSFLE_ETC = SOURCE / "client-side-encryption" / "etc"
+CSFLE_TEMPLATES = CSFLE_ETC / "test-templates"
+CSFLE_DATA = CSFLE_ETC / "data"
+CSFLE_TESTS = SOURCE / "client-side-encryption" / "tests" / "legacy"
+SDAM_ERRORS = SOURCE / "server-discovery-and-monitoring" / "tests" / "errors"
+
+# Wait this long after the last event before regenerating, so that an editor
+# saving several files at once triggers a single rebuild.
+DEBOUNCE = 0.05
+
+
+def _load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def is_relevant(path):
+    """Return True if a change to path may require regenerating something."""
+    path = Path(path)
+    if any(part.startswith(".") or part == "node_modules" for part in path.relative_to(SOURCE).parts):
+        return False
+    return path.suffix in (".yml", ".template") or CSFLE_DATA in path.parents
+
+
+class Generators:
+    """The generator targets, kept loaded so repeated runs stay fast."""
+
+    def __init__(self):
+        sys.path.insert(0, str(SOURCE / "etc"))
+        sys.path.insert(0, str(CSFLE_ETC))
+        import generate_tests
+
+        self.generate_tests = generate_tests
+        self.templates = {SOURCE / t.template: t for t in generate_tests.TARGETS}
+        self.csfle = _load_module("csfle_generate_test", CSFLE_ETC / "generate-test.py")
+        self.registry = self.csfle.FixtureRegistry()
+        self.csfle_manifest = self.csfle.BuildManifest()
+        self.sdam = _load_module("sdam_generate_error_tests", SDAM_ERRORS / "generate-error-tests.py")
+
+    def actions(self, path):
+        """Map a changed file to the set of actions that regenerate its outputs."""
+        path = Path(path)
+        if path in self.templates:
+            return {("target", path)}
+        if path.parent == CSFLE_TEMPLATES and path.name.endswith(".yml.template"):
+            return {("csfle", path)}
+        if CSFLE_DATA in path.parents:
+            # The build manifest narrows this down to the templates that read
+            # the changed file or fixture entries.
+            return {("csfle", p) for p in sorted(CSFLE_TEMPLATES.glob("*.yml.template"))}
+        if path.parent == SDAM_ERRORS and path.name.endswith(".yml.template"):
+            return {("sdam", SDAM_ERRORS)}
+        if path.suffix == ".yml":
+            return {("yaml", path)}
+        return set()
+
+    def run(self, actions):
+        """Run actions, returning the paths of files that changed."""
+        written = []
+        to_convert = [path for kind, path in actions if kind == "yaml" and path.exists()]
+        targets = [self.templates[path] for kind, path in actions if kind == "target"]
+        if targets:
+            rendered = self.generate_tests.generate(targets, jobs=1)
+            written += rendered
+            to_convert += rendered
+        templates = [str(path) for kind, path in sorted(actions) if kind == "csfle"]
+        if templates:
+            # CSFLE templates write their JSON directly.
+            _, csfle_written = self.csfle.build(templates, str(CSFLE_TESTS), self.registry, self.csfle_manifest)
+            written += csfle_written
+        if any(kind == "sdam" for kind, _ in actions):
+            # This writes and converts all the SDAM error tests.
+            sdam_written, errors = self.sdam.generate(verbose=False)
+            written += sdam_written
+            for error in errors:
+                print(error, file=sys.stderr)
+        if to_convert:
+            converted, errors = yaml2json.convert(to_convert, jobs=1)
+            written += converted
+            for error in errors:
+                print(error, file=sys.stderr)
+        return written
+
+
+class InotifyWatcher:
+    """Recursively watch a directory with Linux inotify."""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_ISDIR = 0x40000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, root):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}
+        self._add_tree(Path(root))
+
+    def _add_tree(self, root):
+        for dirname, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d != "node_modules" and not d.startswith(".")]
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dirname), self.MASK)
+            if wd >= 0:
+                self.dirs[wd] = Path(dirname)
+
+    def _read(self):
+        changed = set()
+        data = os.read(self.fd, 65536)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if wd not in self.dirs or not name:
+                continue
+            path = self.dirs[wd] / os.fsdecode(name)
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO) and not path.name.startswith("."):
+                    self._add_tree(path)
+            elif mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO):
+                changed.add(path)
+        return changed
+
+    def wait(self):
+        """Block until files change and return their paths."""
+        changed = set()
+        timeout = None
+        while True:
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+            if not ready:
+                return changed
+            changed |= self._read()
+            timeout = DEBOUNCE if changed else None
+
+
+class PollingWatcher:
+    """Watch a directory by comparing modification times."""
+
+    def __init__(self, root, interval):
+        self.root = Path(root)
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        mtimes = {}
+        for dirname, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if d != "node_modules" and not d.startswith(".")]
+            for filename in filenames:
+                path = Path(dirname, filename)
+                if is_relevant(path):
+                    try:
+                        mtimes[path] = path.stat().st_mtime_ns
+                    except FileNotFoundError:
+                        pass
+        return mtimes
+
+    def wait(self):
+        while True:
+            time.sleep(self.interval)
+            snapshot = self._scan()
+            changed = {p for p, mtime in snapshot.items() if self.snapshot.get(p) != mtime}
+            self.snapshot = snapshot
+            if changed:
+                return changed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regenerate test files as their sources change.")
+    parser.add_argument("--poll", action="store_true", help="poll modification times instead of using inotify")
+    parser.add_argument("--interval", type=float, default=0.5, help="polling interval in seconds")
+    args = parser.parse_args(argv)
+
+    generators = Generators()
+    if args.poll or not sys.platform.startswith("linux"):
+        watcher = PollingWatcher(SOURCE, args.interval)
+    else:
+        watcher = InotifyWatcher(SOURCE)
+    print(f"Watching {SOURCE}")
+
+    # Files this process just wrote; their change events are not rebuilt again.
+    own_writes = set()
+    while True:
+        changed = {p for p in watcher.wait() if is_relevant(p)}
+        changed, skipped = changed - own_writes, changed & own_writes
+        own_writes -= skipped
+        actions = set()
+        for path in changed:
+            actions |= generators.actions(path)
+        if not actions:
+            continue
+        start = time.perf_counter()
+        try:
+            written = generators.run(actions)
+        except (Exception, SystemExit) as e:  # Keep watching after a broken template.
+            print(f"Error: {e}", file=sys.stderr)
+            continue
+        own_writes |= {Path(p) for p in written}
+        elapsed = (time.perf_counter() - start) * 1000
+        for path in written:
+            print(f"Generated {path}")
+        print(f"Updated {len(written)} file(s) in {elapsed:.0f} ms")
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        pass
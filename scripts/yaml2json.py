@@ -0,0 +1,447 @@
+"""Convert YAML test files to JSON.
+
+Usage: python3 yaml2json.py [--force] [--jobs N] [--stdout] [path ...]
+
+Each path may be a ``.yml`` file or a directory, which is searched recursively.
+Every ``foo.yml`` is written to a sibling ``foo.json``. With no paths, the
+``source`` directory is converted.
+
+The output matches what ``js-yaml`` (``CORE_SCHEMA`` plus the YAML 1.1 merge
+key) followed by ``JSON.stringify(data, null, 2)`` produces, so the generated
+JSON does not change when switching converters.
+
+A manifest of content hashes is kept next to the converted tree so that files
+whose YAML and JSON have not changed since the last run are skipped.
+"""
+
+import argparse
+import decimal
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import yaml
+
+SOURCE = Path(__file__).resolve().parent.parent / "source"
+MANIFEST_NAME = ".yaml2json-manifest.json"
+MANIFEST_VERSION = 1
+
+
+class PyCoreLoader(yaml.SafeLoader):
+    """A YAML 1.2 core schema loader with support for the ``<<`` merge key.
+
+    Unlike PyYAML, and like js-yaml, anchors may be redefined and may contain
+    any character other than whitespace and flow indicators.
+    """
+
+    yaml_implicit_resolvers = {}
+
+    def compose_node(self, parent, index):
+        if self.check_event(yaml.AliasEvent):
+            event = self.get_event()
+            if event.anchor not in self.anchors:
+                raise yaml.composer.ComposerError(
+                    None, None, f"found undefined alias {event.anchor!r}", event.start_mark
+                )
+            return self.anchors[event.anchor]
+        anchor = self.peek_event().anchor
+        self.descend_resolver(parent, index)
+        if self.check_event(yaml.ScalarEvent):
+            node = self.compose_scalar_node(anchor)
+        elif self.check_event(yaml.SequenceStartEvent):
+            node = self.compose_sequence_node(anchor)
+        elif self.check_event(yaml.MappingStartEvent):
+            node = self.compose_mapping_node(anchor)
+        self.ascend_resolver()
+        return node
+
+    def scan_anchor(self, TokenClass):
+        start_mark = self.get_mark()
+        name = "alias" if self.peek() == "*" else "anchor"
+        self.forward()
+        length = 0
+        while self.peek(length) not in "\0 \t\r\n\x85\u2028\u2029,[]{}":
+            length += 1
+        if not length:
+            raise yaml.scanner.ScannerError(
+                f"while scanning an {name}", start_mark, "expected an anchor name", self.get_mark()
+            )
+        value = self.prefix(length)
+        self.forward(length)
+        return TokenClass(value, start_mark, self.get_mark())
+
+
+if hasattr(yaml, "CSafeLoader"):
+
+    class CoreLoader(yaml.CSafeLoader):
+        """The libyaml-backed variant of PyCoreLoader.
+
+        libyaml rejects redefined anchors and some flow-context plain scalars
+        that js-yaml accepts, so ``load`` falls back to PyCoreLoader for those.
+        """
+
+        yaml_implicit_resolvers = {}
+
+else:
+    CoreLoader = PyCoreLoader
+
+
+# Implicit resolvers for the YAML 1.2 core schema, as implemented by js-yaml.
+# Unlike the YAML 1.1 resolvers used by yaml.SafeLoader, these do not treat
+# "yes"/"no"/"on"/"off" as booleans, nor dates as timestamps.
+_CORE_RESOLVERS = [
+    ("tag:yaml.org,2002:bool", r"^(?:true|True|TRUE|false|False|FALSE)$", "tTfF"),
+    (
+        "tag:yaml.org,2002:int",
+        r"^(?:[-+]?0b[0-1_]+|[-+]?0o[0-7_]+|[-+]?0x[0-9a-fA-F_]+|[-+]?(?:0|[1-9][0-9_]*))$",
+        "-+0123456789",
+    ),
+    (
+        "tag:yaml.org,2002:float",
+        r"^(?:[-+]?(?:[0-9][0-9_]*)(?:\.[0-9_]*)?(?:[eE][-+]?[0-9]+)?"
+        r"|\.[0-9_]+(?:[eE][-+]?[0-9]+)?|[-+]?\.(?:inf|Inf|INF)|\.(?:nan|NaN|NAN))$",
+        "-+0123456789.",
+    ),
+    ("tag:yaml.org,2002:null", r"^(?:~|null|Null|NULL|)$", ["~", "n", "N", ""]),
+    ("tag:yaml.org,2002:merge", r"^(?:<<)$", "<"),
+]
+
+for _loader in {PyCoreLoader, CoreLoader}:
+    for _tag, _regexp, _first in _CORE_RESOLVERS:
+        _loader.add_implicit_resolver(_tag, re.compile(_regexp), list(_first))
+
+
+def _construct_int(loader, node):
+    value = loader.construct_scalar(node).replace("_", "")
+    sign = -1 if value.startswith("-") else 1
+    value = value.lstrip("+-")
+    for prefix, base in (("0b", 2), ("0o", 8), ("0x", 16)):
+        if value.startswith(prefix):
+            return sign * int(value[2:], base)
+    return sign * int(value)
+
+
+def _construct_float(loader, node):
+    value = loader.construct_scalar(node).replace("_", "").lower()
+    if value.endswith(".inf"):
+        return -math.inf if value.startswith("-") else math.inf
+    if value == ".nan":
+        return math.nan
+    return float(value)
+
+
+def _construct_mapping(loader, node):
+    """Construct a mapping the way js-yaml does.
+
+    Keys pulled in through ``<<`` keep the position of the merge key and may be
+    overridden by explicit keys that follow, but explicit keys may not repeat.
+    """
+    result = {}
+    overridable = set()
+
+    def merge(source):
+        if not isinstance(source, yaml.MappingNode):
+            raise yaml.constructor.ConstructorError(
+                "while constructing a mapping",
+                node.start_mark,
+                "cannot merge mappings; the provided source object is unacceptable",
+                source.start_mark,
+            )
+        for key, value in _construct_mapping(loader, source).items():
+            if key not in result:
+                result[key] = value
+                overridable.add(key)
+
+    for key_node, value_node in node.value:
+        if key_node.tag == "tag:yaml.org,2002:merge":
+            if isinstance(value_node, yaml.SequenceNode):
+                for subnode in value_node.value:
+                    merge(subnode)
+            else:
+                merge(value_node)
+            continue
+        key = _js_key(loader.construct_object(key_node, deep=True))
+        if key in result and key not in overridable:
+            raise yaml.constructor.ConstructorError(
+                "while constructing a mapping",
+                node.start_mark,
+                f"duplicated mapping key {key!r}",
+                key_node.start_mark,
+            )
+        overridable.discard(key)
+        result[key] = loader.construct_object(value_node, deep=True)
+    return result
+
+
+for _loader in {PyCoreLoader, CoreLoader}:
+    _loader.add_constructor("tag:yaml.org,2002:int", _construct_int)
+    _loader.add_constructor("tag:yaml.org,2002:float", _construct_float)
+    _loader.add_constructor("tag:yaml.org,2002:map", _construct_mapping)
+
+
+def load(text):
+    """Parse a YAML document the same way the JSON conversion does."""
+    try:
+        return yaml.load(text, Loader=CoreLoader)
+    except yaml.YAMLError:
+        if CoreLoader is PyCoreLoader:
+            raise
+    return yaml.load(text, Loader=PyCoreLoader)
+
+
+def _js_number(value):
+    """Format a number like JavaScript's Number.prototype.toString."""
+    if isinstance(value, int) and abs(value) <= 2**53:
+        return str(value)
+    value = float(value)
+    if math.isnan(value) or math.isinf(value):
+        return "null"
+    if value == 0:
+        return "0"
+    # repr() gives the shortest round-tripping digits, as JavaScript does.
+    _, digits, exponent = decimal.Decimal(repr(abs(value))).as_tuple()
+    digits = "".join(map(str, digits))
+    stripped = digits.rstrip("0")
+    exponent += len(digits) - len(stripped)
+    digits = stripped
+    # Position of the decimal point relative to the start of ``digits``.
+    point = len(digits) + exponent
+    sign = "-" if value < 0 else ""
+    if len(digits) <= point <= 21:
+        return sign + digits + "0" * (point - len(digits))
+    if 0 < point <= 21:
+        return sign + digits[:point] + "." + digits[point:]
+    if -6 < point <= 0:
+        return sign + "0." + "0" * -point + digits
+    exp = point - 1
+    exp = f"+{exp}" if exp >= 0 else str(exp)
+    if len(digits) == 1:
+        return f"{sign}{digits}e{exp}"
+    return f"{sign}{digits[0]}.{digits[1:]}e{exp}"
+
+
+def _js_key(key):
+    """Convert a YAML mapping key to the string JavaScript would use."""
+    if isinstance(key, str):
+        return key
+    if key is None:
+        return "null"
+    if isinstance(key, bool):
+        return "true" if key else "false"
+    if isinstance(key, (int, float)):
+        return "NaN" if key != key else _js_number(key)
+    raise TypeError(f"Unsupported mapping key {key!r}")
+
+
+_ARRAY_INDEX = re.compile(r"^(?:0|[1-9][0-9]*)$")
+
+
+def _is_array_index(key):
+    # JavaScript orders integer-like keys first, in ascending numeric order.
+    return _ARRAY_INDEX.match(key) is not None and int(key) < 2**32 - 1
+
+
+def _dump(value, indent, out):
+    if value is None:
+        out.append("null")
+    elif value is True:
+        out.append("true")
+    elif value is False:
+        out.append("false")
+    elif isinstance(value, str):
+        out.append(json.dumps(value, ensure_ascii=False))
+    elif isinstance(value, (int, float)):
+        out.append(_js_number(value))
+    elif isinstance(value, list):
+        if not value:
+            out.append("[]")
+            return
+        inner = indent + "  "
+        out.append("[")
+        for i, item in enumerate(value):
+            out.append(("," if i else "") + "\n" + inner)
+            _dump(item, inner, out)
+        out.append("\n" + indent + "]")
+    elif isinstance(value, dict):
+        if not value:
+            out.append("{}")
+            return
+        keys = sorted((k for k in value if _is_array_index(k)), key=int)
+        keys += [k for k in value if not _is_array_index(k)]
+        inner = indent + "  "
+        out.append("{")
+        for i, key in enumerate(keys):
+            out.append(("," if i else "") + "\n" + inner + json.dumps(key, ensure_ascii=False) + ": ")
+            _dump(value[key], inner, out)
+        out.append("\n" + indent + "}")
+    else:
+        raise TypeError(f"Unsupported value {value!r}")
+
+
+def dumps(data):
+    """Serialize data like ``JSON.stringify(data, null, 2) + "\\n"``."""
+    out = []
+    _dump(data, "", out)
+    out.append("\n")
+    return "".join(out)
+
+
+def convert_text(text):
+    """Convert YAML text to the JSON text written to disk."""
+    return dumps(load(text))
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _read_bytes(path):
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def write_if_changed(path, data):
+    """Write bytes to path unless it already has exactly that content."""
+    path = Path(path)
+    if _read_bytes(path) == data:
+        return False
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return True
+
+
+def convert_file(yml_path):
+    """Convert one file, returning (yml digest, json digest, written)."""
+    yml_path = Path(yml_path)
+    source = yml_path.read_bytes()
+    output = convert_text(source.decode("utf-8")).encode("utf-8")
+    written = write_if_changed(yml_path.with_suffix(".json"), output)
+    return _digest(source), _digest(output), written
+
+
+def _convert_worker(yml_path):
+    try:
+        return yml_path, convert_file(yml_path), None
+    except (yaml.YAMLError, TypeError, UnicodeDecodeError) as e:
+        return yml_path, None, f"{yml_path}: {e}"
+
+
+def find_yaml_files(paths):
+    """Expand files and directories into a sorted list of .yml files."""
+    found = set()
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            for dirname, dirnames, filenames in os.walk(path):
+                dirnames[:] = [d for d in dirnames if d != "node_modules" and not d.startswith(".")]
+                found.update(Path(dirname, f) for f in filenames if f.endswith(".yml"))
+        elif path.suffix == ".yml":
+            found.add(path)
+        else:
+            raise ValueError(f"Not a .yml file or directory: {path}")
+    return sorted(p.resolve() for p in found)
+
+
+class Manifest:
+    """Content hashes of each YAML file and the JSON generated from it."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.root = self.path.parent
+        self.entries = {}
+        try:
+            data = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            return
+        if data.get("version") == MANIFEST_VERSION:
+            self.entries = data.get("files", {})
+
+    def _key(self, yml_path):
+        return os.path.relpath(yml_path, self.root)
+
+    def is_current(self, yml_path):
+        """Return True if neither the YAML nor its JSON changed since last recorded."""
+        entry = self.entries.get(self._key(yml_path))
+        if entry is None:
+            return False
+        json_bytes = _read_bytes(yml_path.with_suffix(".json"))
+        if json_bytes is None or _digest(json_bytes) != entry[1]:
+            return False
+        return _digest(yml_path.read_bytes()) == entry[0]
+
+    def record(self, yml_path, yml_digest, json_digest):
+        self.entries[self._key(yml_path)] = [yml_digest, json_digest]
+
+    def save(self):
+        data = {"version": MANIFEST_VERSION, "files": dict(sorted(self.entries.items()))}
+        write_if_changed(self.path, (json.dumps(data, indent=1) + "\n").encode("utf-8"))
+
+
+def convert(paths, jobs=None, force=False, manifest_path=None, verbose=False):
+    """Convert all YAML files under paths, returning (written, errors).
+
+    ``written`` lists the JSON files whose content changed. Files recorded as
+    current in the manifest are skipped unless ``force`` is set.
+    """
+    yml_files = find_yaml_files(paths)
+    manifest = Manifest(manifest_path or SOURCE / MANIFEST_NAME)
+    todo = yml_files if force else [p for p in yml_files if not manifest.is_current(p)]
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs > 1 and len(todo) > 1:
+        chunksize = max(1, len(todo) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_convert_worker, todo, chunksize=chunksize))
+    else:
+        results = [_convert_worker(p) for p in todo]
+
+    written = []
+    errors = []
+    for yml_path, result, error in results:
+        if error is not None:
+            errors.append(error)
+            continue
+        yml_digest, json_digest, changed = result
+        manifest.record(yml_path, yml_digest, json_digest)
+        if changed:
+            written.append(yml_path.with_suffix(".json"))
+            if verbose:
+                print(f"Generated {yml_path.with_suffix('.json')}")
+    manifest.save()
+    return written, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert YAML test files to JSON.")
+    parser.add_argument("paths", nargs="*", default=[SOURCE], help=".yml files or directories (default: source/)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes")
+    parser.add_argument("-B", "--force", action="store_true", help="ignore the manifest and convert every file")
+    parser.add_argument("--manifest", default=None, help=f"manifest path (default: source/{MANIFEST_NAME})")
+    parser.add_argument("--stdout", action="store_true", help="print the JSON for a single file instead of writing it")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print each generated file")
+    args = parser.parse_args(argv)
+
+    if args.stdout:
+        if len(args.paths) != 1:
+            parser.error("--stdout requires exactly one file")
+        sys.stdout.write(convert_text(Path(args.paths[0]).read_text()))
+        return 0
+
+    written, errors = convert(args.paths, args.jobs, args.force, args.manifest, args.verbose)
+    for error in errors:
+        print(error, file=sys.stderr)
+    print(f"{len(written)} JSON file(s) updated")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Fixture registry for the client-side encryption test templates.
+
+Key documents, JSONSchemas and pre-generated ciphertexts live in
+data/fixtures/{keys,schemas,ciphertexts}.json. Each file is loaded on first
+access, and ciphertexts are indexed by (schema, field, plaintext) so a lookup
+does not scan the whole list. These and the data files requested through
+yamlfile() are parsed once and cached by path and modification time.
+
+While a render is being tracked, every data file and fixture entry a template
+reads is recorded as a dependency together with a fingerprint of its content,
+so that callers can tell which outputs a change affects.
+"""
+import contextlib
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import yaml
+
+# ./source/client-side-encryption/etc
+DIR = Path(__file__).resolve().parent
+DATA_DIR = DIR / "data"
+
+
+def dependency_id(kind, *args):
+    """Return the string used to identify a dependency in build manifests."""
+    return json.dumps([kind, *args])
+
+
+def parse_dependency_id(dep):
+    return json.loads(dep)
+
+
+class FixtureRegistry:
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = Path(data_dir)
+        self._files = {}
+        self._reads = None
+
+    @contextlib.contextmanager
+    def track(self):
+        """Record the dependencies read inside the block into the yielded dict.
+
+        Keys are dependency ids (see dependency_id) and values are fingerprints.
+        """
+        previous, self._reads = self._reads, {}
+        try:
+            yield self._reads
+        finally:
+            self._reads = previous
+
+    def _record(self, kind, *args):
+        if self._reads is not None:
+            dep = dependency_id(kind, *args)
+            if dep not in self._reads:
+                self._reads[dep] = self.fingerprint(kind, *args)
+
+    def fingerprint(self, kind, *args):
+        """Return a content hash for a dependency, or None if it no longer exists."""
+        try:
+            if kind == "file":
+                return hashlib.sha256((self.data_dir / args[0]).read_bytes()).hexdigest()
+            elif kind == "key":
+                value = self.keys[args[0]]
+            elif kind == "schema":
+                value = self.schemas[args[0]]
+            elif kind == "ciphertext":
+                value = self.ciphertexts[tuple(args)]
+            else:
+                raise ValueError(f"Unknown dependency kind {kind!r}")
+        except (KeyError, FileNotFoundError):
+            return None
+        return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+    def _load(self, filepath, parse):
+        """Parse a file, reusing the previous result if it has not been modified."""
+        mtime = os.stat(filepath).st_mtime_ns
+        cached = self._files.get(filepath)
+        if cached is None or cached[0] != mtime:
+            with open(filepath, "r") as file:
+                cached = (mtime, parse(file.read()))
+            self._files[filepath] = cached
+        return cached[1]
+
+    @property
+    def keys(self):
+        return self._load(self.data_dir / "fixtures" / "keys.json", json.loads)
+
+    @property
+    def schemas(self):
+        return self._load(self.data_dir / "fixtures" / "schemas.json", json.loads)
+
+    @property
+    def ciphertexts(self):
+        def index(contents):
+            ciphertexts = {}
+            for entry in json.loads(contents):
+                ciphertexts.setdefault((entry["schema"], entry["field"], entry["plaintext"]), entry["data"])
+            return ciphertexts
+        return self._load(self.data_dir / "fixtures" / "ciphertexts.json", index)
+
+    def key(self, name="basic"):
+        self._record("key", name)
+        return self.keys[name]
+
+    def schema(self, name="basic"):
+        self._record("schema", name)
+        return self.schemas[name]
+
+    def schema_w_type(self, type):
+        schema = {
+            "properties": {},
+            "bsonType": "object"
+        }
+        schema["properties"]["encrypted_" + type] = {"encrypt": {
+            "keyId": [self.key("basic")["_id"]],
+            "bsonType": type,
+            "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Deterministic"
+        }
+        }
+        return schema
+
+    def ciphertext(self, plaintext, field, schema="basic"):
+        self._record("ciphertext", schema, field, plaintext)
+        try:
+            return self.ciphertexts[(schema, field, plaintext)]
+        except KeyError:
+            raise Exception("Ciphertext needs to be pre-generated") from None
+
+    def local_provider(self, name=None):
+        if name is not None:
+            if name == "name2":
+                return {
+                    "key": {"$binary": {"base64": "local+name2+YUJCa1kxNkVyNUR1QURhZ2h2UzR2d2RrZzh0cFBwM3R6NmdWMDFBMUN3YkQ5aXRRMkhGRGdQV09wOGVNYUMxT2k3NjZKelhaQmRCZGJkTXVyZG9uSjFk", "subType": "00"}}
+                }
+            else:
+                raise Exception("Unexpected name '{}'".format(name))
+
+        return {
+            "key": {"$binary": {"base64": "Mng0NCt4ZHVUYUJCa1kxNkVyNUR1QURhZ2h2UzR2d2RrZzh0cFBwM3R6NmdWMDFBMUN3YkQ5aXRRMkhGRGdQV09wOGVNYUMxT2k3NjZKelhaQmRCZGJkTXVyZG9uSjFk", "subType": "00"}}
+        }
+
+    def yamlfile(self, relative_filepath):
+        self._record("file", Path(relative_filepath).as_posix())
+        return self._load(self.data_dir / relative_filepath, yaml.safe_load)
+
+    def injections(self):
+        """Return the functions made available to every template."""
+        return {
+            "schema": self.schema,
+            "ciphertext": self.ciphertext,
+            "key": self.key,
+            "local_provider": self.local_provider,
+            "schema_w_type": self.schema_w_type,
+            "yamlfile": self.yamlfile,
+        }
@@ -1,711 +1,193 @@
-import bson
+import argparse
+import hashlib
+import json
 import os
 import sys
-import yaml
 from jinja2 import Template
-from pathlib import Path
+from fixtures import FixtureRegistry, parse_dependency_id
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..", "..", "scripts"))
+import unified_schema  # noqa: E402
+import yaml2json  # noqa: E402
 description = """Generates YAML/JSON tests from a template file.
 
 This keeps key documents, JSONSchemas, and ciphertexts out of the
 handwritten test files to make them more readable and easier
-to change.
+to change. They live in data/fixtures/ and are loaded through
+FixtureRegistry (see fixtures.py).
+
+The data files, fixture entries and template each output was rendered from
+are recorded in .generate-test-manifest.json, with a digest of this script
+and fixtures.py, and outputs whose inputs have not changed are not rendered
+again (use --force to render them anyway).
 """
 
-keys = {
-    "basic": {
-        "status": 1,
-        "_id": {
-            "$binary": {
-                "base64": "AAAAAAAAAAAAAAAAAAAAAA==",
-                "subType": "04"
-            }
-        },
-        "masterKey": {
-            "provider": "aws",
-            "key": "arn:aws:kms:us-east-1:579766882180:key/89fcc2c4-08b0-4bd9-9f25-e30687b580d0",
-            "region": "us-east-1"
-        },
-        "updateDate": {
-            "$date": {
-                "$numberLong": "1552949630483"
-            }
-        },
-        "keyMaterial": {
-            "$binary": {
-                "base64": "AQICAHhQNmWG2CzOm1dq3kWLM+iDUZhEqnhJwH9wZVpuZ94A8gEqnsxXlR51T5EbEVezUqqKAAAAwjCBvwYJKoZIhvcNAQcGoIGxMIGuAgEAMIGoBgkqhkiG9w0BBwEwHgYJYIZIAWUDBAEuMBEEDHa4jo6yp0Z18KgbUgIBEIB74sKxWtV8/YHje5lv5THTl0HIbhSwM6EqRlmBiFFatmEWaeMk4tO4xBX65eq670I5TWPSLMzpp8ncGHMmvHqRajNBnmFtbYxN3E3/WjxmdbOOe+OXpnGJPcGsftc7cB2shRfA4lICPnE26+oVNXT6p0Lo20nY5XC7jyCO",
-                "subType": "00"
-            }
-        },
-        "creationDate": {
-            "$date": {
-                "$numberLong": "1552949630483"
-            }
-        },
-        "keyAltNames": ["altname", "another_altname"]
-    },
-    "local": {
-        "_id": {
-            "$binary": {
-                "base64": "AAAAAAAAAAAAAAAAAAAAAA==",
-                "subType": "04"
-            }
-        },
-        "keyMaterial": {
-            "$binary": {
-                "base64": r"Ce9HSz/HKKGkIt4uyy+jDuKGA+rLC2cycykMo6vc8jXxqa1UVDYHWq1r+vZKbnnSRBfB981akzRKZCFpC05CTyFqDhXv6OnMjpG97OZEREGIsHEYiJkBW0jJJvfLLgeLsEpBzsro9FztGGXASxyxFRZFhXvHxyiLOKrdWfs7X1O/iK3pEoHMx6uSNSfUOgbebLfIqW7TO++iQS5g1xovXA==",
-                "subType": "00"
-            }
-        },
-        "creationDate": {"$date": {"$numberLong": "1552949630483"}},
-        "updateDate": {"$date": {"$numberLong": "1552949630483"}},
-        "status": {"$numberInt": "0"},
-        "masterKey": {"provider": "local"}
-    },
-    "local:name2": {
-        "_id": {
-            "$binary": {
-                "base64": "local+name2+AAAAAAAAAA==",
-                "subType": "04"
-            }
-        },
-
-        "keyMaterial": {
-            "$binary": {
-                "base64": r"DX3iUuOlBsx6wBX9UZ3v/qXk1HNeBace2J+h/JwsDdF/vmSXLZ1l1VmZYIcpVFy6ODhdbzLjd4pNgg9wcm4etYig62KNkmtZ0/s1tAL5VsuW/s7/3PYnYGznZTFhLjIVcOH/RNoRj2eQb/sRTyivL85wePEpAU/JzuBj6qO9Y5txQgs1k0J3aNy10R9aQ8kC1NuSSpLAIXwE6DlNDDJXhw==",
-                "subType": "00"
-            }
-        },
-        "creationDate": {"$date": {"$numberLong": "1552949630483"}},
-        "updateDate": {"$date": {"$numberLong": "1552949630483"}},
-        "status": {"$numberInt": "0"},
-        "masterKey": {"provider": "local:name2"}
-    },
-    "azure": {
-        "_id": {
-            "$binary": {
-                "base64": "AZURE+AAAAAAAAAAAAAAAA==",
-                "subType": "04"
-            }
-        },
-        "keyMaterial": {
-            "$binary": {
-                "base64": "Vlza0NjSsxbiJbHUM++3EWyhd5/m4QHv0ZaH87LsljVDltHNZyR9YBFOTDFE1RKeY/uGSW35IdOLVxpHvo1/qBz7E6Iv14obBmniRetWZq0wxerm72LlF+VPTHHmNn1sIv3TY/HsHSx7S1U/ILaKukD7hBKZ5/4A2tPOXtdnTzC4Rpc8bRjaM8heQSNEWbTBPqcQ9xD4YLi+uQlzbLZjQA+Ljr540QJEwa7RGw8J22eo1sb3vSeDAhR24GH6RPJ5v72yElGcOZrKCjxnbd4mrCtSHssfOzCnK2Dw3mHikSLeBFGjnlXydBWiTn2AlhOs+YpXdAJ6Zm3xjkdJOXKytg==",
-                "subType": "00"
-            }
-        },
-        "creationDate": {
-            "$date": {
-                "$numberLong": "1601573901680"
-            }
-        },
-        "updateDate": {
-            "$date": {
-                "$numberLong": "1601573901680"
-            }
-        },
-        "status": {
-            "$numberInt": "0"
-        },
-        "masterKey": {
-            "provider": "azure",
-            "keyVaultEndpoint": "drivers-3392-key-vault.vault.azure.net",
-            "keyName": "drivers-3392-keyname"
-        },
-        "keyAltNames": ["altname", "azure_altname"]
-    },
-    "gcp": {
-        "_id": {
-            "$binary": {
-                "base64": "GCP+AAAAAAAAAAAAAAAAAA==",
-                "subType": "04"
-            }
-        },
-        "keyMaterial": {
-            "$binary": {
-                "base64": "CiQAIgLj0WyktnB4dfYHo5SLZ41K4ASQrjJUaSzl5vvVH0G12G0SiQEAjlV8XPlbnHDEDFbdTO4QIe8ER2/172U1ouLazG0ysDtFFIlSvWX5ZnZUrRMmp/R2aJkzLXEt/zf8Mn4Lfm+itnjgo5R9K4pmPNvvPKNZX5C16lrPT+aA+rd+zXFSmlMg3i5jnxvTdLHhg3G7Q/Uv1ZIJskKt95bzLoe0tUVzRWMYXLIEcohnQg==",
-                "subType": "00"
-            }
-        },
-        "creationDate": {
-            "$date": {
-                "$numberLong": "1601574333107"
-            }
-        },
-        "updateDate": {
-            "$date": {
-                "$numberLong": "1601574333107"
-            }
-        },
-        "status": {
-            "$numberInt": "0"
-        },
-        "masterKey": {
-            "provider": "gcp",
-            "projectId": "devprod-drivers",
-            "location": "global",
-            "keyRing": "key-ring-csfle",
-            "keyName": "key-name-csfle"
-        },
-        "keyAltNames": ["altname", "gcp_altname"]
-    },
-    "kmip": {
-        "_id": {
-            "$binary": {
-                "base64": "dBHpr8aITfeBQ15grpbLpQ==",
-                "subType": "04"
-            }
-        },
-        "keyMaterial": {
-            "$binary": {
-                "base64": "eUYDyB0HuWb+lQgUwO+6qJQyTTDTY2gp9FbemL7ZFo0pvr0x6rm6Ff9OVUTGH6HyMKipaeHdiIJU1dzsLwvqKvi7Beh+U4iaIWX/K0oEg1GOsJc0+Z/in8gNHbGUYLmycHViM3LES3kdt7FdFSUl5rEBHrM71yoNEXImz17QJWMGOuT4x6yoi2pvnaRJwfrI4DjpmnnTrDMac92jgZehbg==",
-                "subType": "00"
-            }
-        },
-        "creationDate": {
-            "$date": {
-                "$numberLong": "1634220190041"
-            }
-        },
-        "updateDate": {
-            "$date": {
-                "$numberLong": "1634220190041"
-            }
-        },
-        "status": {
-            "$numberInt": "0"
-        },
-        "masterKey": {
-            "provider": "kmip",
-            "keyId": "1"
-        },
-        "keyAltNames": ["altname", "kmip_altname"]
-    },
-    "kmip_delegated": {
-        "_id": {
-            "$uuid": "7411e9af-c688-4df7-8143-5e60ae96cba6"
-        },
-        "keyMaterial": {
-            "$binary": {
-                "base64": "5TLMFWlguBWe5GUESTvOVtkdBsCrynhnV72XRyZ66/nk+EP9/1oEp1t1sg0+vwCTqULHjBiUE6DRx2mYD/Eup1+u2Jgz9/+1sV1drXeOPALNPkSgiZiDbIb67zRi+wTABEcKcegJH+FhmSGxwUoQAiHCsCbcvia5P8tN1lt98YQ=", "subType": "00"
-            }
-        },
-        "creationDate": {
-            "$date": {
-                "$numberLong": "1634220190041"
-            }
-        },
-        "updateDate": {
-            "$date": {
-                "$numberLong": "1634220190041"
-            }
-        },
-        "status": {
-            "$numberInt": "0"
-        },
-        "masterKey": {
-            "provider": "kmip",
-            "delegated": True,
-            "keyId": "11"
-        },
-        "keyAltNames": ["delegated"]
-    }
-}
-
-schemas = {
-    "basic": {
-        "properties": {
-            "encrypted_w_altname": {
-                "encrypt": {
-                    "keyId": "/altname",
-                    "bsonType": "string",
-                    "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Random"
-                }
-            },
-            "encrypted_string": {
-                "encrypt": {
-                    "keyId": [keys["basic"]["_id"]],
-                    "bsonType": "string",
-                    "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Deterministic"
-                }
-            },
-            "random": {
-                "encrypt": {
-                    "keyId": [keys["basic"]["_id"]],
-                    "bsonType": "string",
-                    "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Random",
-                }
-            },
-            # Same exact as fields as "encrypted_string"
-            "encrypted_string_equivalent": {
-                "encrypt": {
-                    "keyId": [keys["basic"]["_id"]],
-                    "bsonType": "string",
-                    "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Deterministic"
-                }
-            }
-        },
-        "bsonType": "object"
-    },
-    "all": {
-        "properties": {
-            "encrypted_string_aws": {
-                "encrypt": {
-                    "keyId": [keys["basic"]["_id"]],
-                    "bsonType": "string",
-                    "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Deterministic"
-                }
-            },
-            "encrypted_string_azure": {
-                "encrypt": {
-                    "keyId": [keys["azure"]["_id"]],
-                    "bsonType": "string",
-                    "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Deterministic"
-                }
-            },
-            "encrypted_string_gcp": {
-                "encrypt": {
-                    "keyId": [keys["gcp"]["_id"]],
-                    "bsonType": "string",
-                    "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Deterministic"
-                }
-            },
-            "encrypted_string_local": {
-                "encrypt": {
-                    "keyId": [keys["local"]["_id"]],
-                    "bsonType": "string",
-                    "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Deterministic"
-                }
-            },
-            "encrypted_string_kmip": {
-                "encrypt": {
-                    "keyId": [keys["kmip"]["_id"]],
-                    "bsonType": "string",
-                    "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Deterministic"
-                }
-            },
-            "encrypted_string_kmip_delegated": {
-                "encrypt": {
-                    "keyId": [keys["kmip_delegated"]["_id"]], 
-                    "bsonType": "string",
-                    "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Deterministic"}},
-        },
-        "bsonType": "object"
-    },
-    "encrypted_id": {
-        "properties": {
-            "_id": {
-                "encrypt": {
-                    "keyId": [keys["basic"]["_id"]],
-                    "bsonType": "string",
-                    "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Deterministic"
-                }
-            }
-        }
-    },
-    "local": {
-        "properties": {
-            "encrypted_string": {
-                "encrypt": {
-                    "keyId": [keys["local"]["_id"]],
-                    "bsonType": "string",
-                    "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Deterministic"
-                }
-            },
-            "random": {
-                "encrypt": {
-                    "keyId": [keys["local"]["_id"]],
-                    "bsonType": "string",
-                    "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Random",
-                }
-            }
-        },
-        "bsonType": "object"
-    },
-    "invalid_array": {
-        "properties": {
-            "encrypted_string": {
-                "encrypt": {
-                    "keyId": [keys["basic"]["_id"]],
-                    "bsonType": "string",
-                    "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Random"
-                }
-            }
-        },
-        "bsonType": "array"
-    },
-    "invalid_omitted_type": {
-        "properties": {
-            "foo": {
-                "properties": {
-                    "bar": {
-                        "encrypt": {
-                            "keyId": [keys["basic"]["_id"]],
-                            "bsonType": "string",
-                            "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Random"
-                        }
-                    }
-                }
-            }
-        }
-    },
-    "invalid_siblings": {
-        "properties": {
-            "encrypted_string": {
-                "encrypt": {
-                    "keyId": [keys["basic"]["_id"]],
-                    "bsonType": "string",
-                    "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Random"
-                },
-                "bsonType": "object"
-            }
-        }
-    },
-    "logical_keywords": {
-        "anyOf": [
-            {
-                "properties": {
-                    "encrypted_string": {
-                        "encrypt": {
-                            "keyId": [keys["basic"]["_id"]],
-                            "bsonType": "string",
-                            "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Random"
-                        }
-                    }
-                }
-            }
-        ]
-    },
-    "noencryption": {
-        "properties": {
-            "test": {
-                "bsonType": "string"
-            }
-        },
-        "bsonType": "object",
-        "required": ["test"]
-    },
-    "local:name2": {
-        "properties": {
-            "encrypted_string": {
-                "encrypt": {
-                    "keyId": [keys["local:name2"]["_id"]],
-                    "bsonType": "string",
-                    "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Deterministic"
-                }
-            }
-        },
-        "bsonType": "object"
-    },
-}
-
-ciphertexts = [
-    {
-        "schema": "basic",
-        "field": "encrypted_string",
-        "plaintext": "string0",
-        "data": {
-            "$binary": {
-                "base64": "AQAAAAAAAAAAAAAAAAAAAAACwj+3zkv2VM+aTfk60RqhXq6a/77WlLwu/BxXFkL7EppGsju/m8f0x5kBDD3EZTtGALGXlym5jnpZAoSIkswHoA==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "basic",
-        "field": "encrypted_string",
-        "plaintext": "string1",
-        "data": {
-            "$binary": {
-                "base64": "AQAAAAAAAAAAAAAAAAAAAAACDdw4KFz3ZLquhsbt7RmDjD0N67n0uSXx7IGnQNCLeIKvot6s/ouI21Eo84IOtb6lhwUNPlSEBNY0/hbszWAKJg==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "basic",
-        "field": "encrypted_string",
-        "plaintext": "string2",
-        "data": {
-            "$binary": {
-                "base64": "AQAAAAAAAAAAAAAAAAAAAAACQ76HWOut3DZtQuV90hp1aaCpZn95vZIaWmn+wrBehcEtcFwyJlBdlyzDzZTWPZCPgiFq72Wvh6Y7VbpU9NAp3A==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "local",
-        "field": "encrypted_string",
-        "plaintext": "string0",
-        "data": {
-            "$binary": {
-                "base64": "AQAAAAAAAAAAAAAAAAAAAAACV/+zJmpqMU47yxS/xIVAviGi7wHDuFwaULAixEAoIh0xHz73UYOM3D8D44gcJn67EROjbz4ITpYzzlCJovDL0Q==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "basic",
-        "field": "encrypted_objectId",
-        "plaintext": "test",
-        "data": {
-            "$binary": {
-                "base64": "AQAAAAAAAAAAAAAAAAAAAAAHmkTPqvzfHMWpvS1mEsrjOxVQ2dyihEgIFWD5E0eNEsiMBQsC0GuvjdqYRL5DHLFI1vKuGek7EYYp0Qyii/tHqA==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "basic",
-        "field": "encrypted_symbol",
-        "plaintext": "test",
-        "data": {
-            "$binary": {
-                "base64": "AQAAAAAAAAAAAAAAAAAAAAAOOmvDmWjcuKsSCO7U/7t9HJ8eI73B6wduyMbdkvn7n7V4uTJes/j+BTtneSdyG2JHKHGkevWAJSIU2XoO66BSXw==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "basic",
-        "field": "encrypted_int32",
-        "plaintext": "test",
-        "data": {
-            "$binary": {
-                "base64": "AQAAAAAAAAAAAAAAAAAAAAAQPNXJVXMEjGZnftMuf2INKufXCtQIRHdw5wTgn6QYt3ejcoAXyiwI4XIUizkpsob494qpt2in4tWeiO7b9zkA8Q==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "basic",
-        "field": "encrypted_int64",
-        "plaintext": "test",
-        "data": {
-            "$binary": {
-                "base64": "AQAAAAAAAAAAAAAAAAAAAAACKWM29kOcLsfSLfJJ3SSmLr+wgrTtpu1lads1NzDz80AjMyrstw/GMdCuzX+AS+JS84Si2cT1WPMemTkBdVdGAw==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "basic",
-        "field": "encrypted_binData",
-        "plaintext": "test",
-        "data": {
-            "$binary": {
-                "base64": "AQAAAAAAAAAAAAAAAAAAAAAFB/KHZQHaHHo8fctcl7v6kR+sLkJoTRx2cPSSck9ya+nbGROSeFhdhDRHaCzhV78fDEqnMDSVPNi+ZkbaIh46GQ==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "basic",
-        "field": "encrypted_javascript",
-        "plaintext": "test",
-        "data": {
-            "$binary": {
-                "base64": "AQAAAAAAAAAAAAAAAAAAAAANrvMgJkTKWGMc9wt3E2RBR2Hu5gL9p+vIIdHe9FcOm99t1W480/oX1Gnd87ON3B399DuFaxi/aaIiQSo7gTX6Lw==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "basic",
-        "field": "encrypted_timestamp",
-        "plaintext": "test",
-        "data": {
-            "$binary": {
-                "base64": "AQAAAAAAAAAAAAAAAAAAAAARJHaM4Gq3MpDTdBasBsEolQaOmxJQU1wsZVaSFAOLpEh1QihDglXI95xemePFMKhg+KNpFg7lw1ChCs2Wn/c26Q==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "basic",
-        "field": "encrypted_regex",
-        "plaintext": "test",
-        "data": {
-            "$binary": {
-                "base64": "AQAAAAAAAAAAAAAAAAAAAAALVnxM4UqGhqf5eXw6nsS08am3YJrTf1EvjKitT8tyyMAbHsICIU3GUjuC7EBofCHbusvgo7pDyaClGostFz44nA==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "basic",
-        "field": "encrypted_dbPointer",
-        "plaintext": "test",
-        "data": {
-            "$binary": {
-                "base64": "AQAAAAAAAAAAAAAAAAAAAAACKWM29kOcLsfSLfJJ3SSmLr+wgrTtpu1lads1NzDz80AjMyrstw/GMdCuzX+AS+JS84Si2cT1WPMemTkBdVdGAw==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "basic",
-        "field": "encrypted_date",
-        "plaintext": "test",
-        "data": {
-            "$binary": {
-                "base64": "AQAAAAAAAAAAAAAAAAAAAAAJ5sN7u6l97+DswfKTqZAijSTSOo5htinGKQKUD7pHNJYlLXGOkB4glrCu7ibu0g3344RHQ5yUp4YxMEa8GD+Snw==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "basic",
-        "field": "random",
-        "plaintext": "abc",
-        "data": {
-            "$binary": {
-                "base64": "AgAAAAAAAAAAAAAAAAAAAAACyfp+lXvKOi7f5vh6ZsCijLEaXFKq1X06RmyS98ZvmMQGixTw8HM1f/bGxZjGwvYwjXOkIEb7Exgb8p2KCDI5TQ==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "all",
-        "field": "encrypted_string_azure",
-        "plaintext": "string0",
-        "data": {
-            "$binary": {
-                "base64": "AQGVERPgAAAAAAAAAAAAAAAC5DbBSwPwfSlBrDtRuglvNvCXD1KzDuCKY2P+4bRFtHDjpTOE2XuytPAUaAbXf1orsPq59PVZmsbTZbt2CB8qaQ==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "all",
-        "field": "encrypted_string_gcp",
-        "plaintext": "string0",
-        "data": {
-            "$binary": {
-                "base64": "ARgj/gAAAAAAAAAAAAAAAAACwFd+Y5Ojw45GUXNvbcIpN9YkRdoHDHkR4kssdn0tIMKlDQOLFkWFY9X07IRlXsxPD8DcTiKnl6XINK28vhcGlg==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "all",
-        "field": "encrypted_string_kmip",
-        "plaintext": "string0",
-        "data": {
-            "$binary": {
-                "base64": "AXQR6a/GiE33gUNeYK6Wy6UCKCwtKFIsL8eKObDVxvqGupJNUk7kXswHhB7G5j/C1D+6no+Asra0KgSU43bTL3ooIBLVyIzbV5CDJYqzAsa4WQ==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "all",
-        "field": "encrypted_string_kmip_delegated",
-        "plaintext": "string0",
-        "data": {
-            "$binary": {
-                "base64": "AXQR6a/GiE33gUNeYK6Wy6YCkB+8NVfAAjIbvLqyXIg6g1a8tXrym92DPoqmxpcdQyH0vQM3aFNMz7tZwQBimKs29ztZV/LWjM633HhO5ACl9A==",
-                "subType": "06"
-            }
-        }
-    },
-    {
-        "schema": "local:name2",
-        "field": "encrypted_string",
-        "plaintext": "string0",
-        "data": {
-            "$binary": {
-                "base64": "AZaHGpfp2pntvgAAAAAAAAAC07sFvTQ0I4O2U49hpr4HezaK44Ivluzv5ntQBTYHDlAJMLyRMyB6Dl+UGHBgqhHe/Xw+pcT9XdiUoOJYAx9g+w==",
-                "subType": "06"
-            }
-        }
-    },
-]
-
-
-def schema(name="basic"):
-    return schemas[name]
-
-
-def schema_w_type(type):
-    schema = {
-        "properties": {},
-        "bsonType": "object"
-    }
-    schema["properties"]["encrypted_" + type] = {"encrypt": {
-        "keyId": [keys["basic"]["_id"]],
-        "bsonType": type,
-        "algorithm": "AEAD_AES_256_CBC_HMAC_SHA_512-Deterministic"
-    }
-    }
-    return schema
-
-
-def key(name="basic"):
-    return keys[name]
-
-
-def ciphertext(plaintext, field, schema="basic"):
-    for ciphertext in ciphertexts:
-        if schema == ciphertext["schema"] and field == ciphertext["field"] and plaintext == ciphertext["plaintext"]:
-            return ciphertext["data"]
-    raise Exception("Ciphertext needs to be pre-generated")
-
-
-def local_provider(name=None):
-    if name is not None:
-        if name == "name2":
-            return {
-                "key": {"$binary": {"base64": "local+name2+YUJCa1kxNkVyNUR1QURhZ2h2UzR2d2RrZzh0cFBwM3R6NmdWMDFBMUN3YkQ5aXRRMkhGRGdQV09wOGVNYUMxT2k3NjZKelhaQmRCZGJkTXVyZG9uSjFk", "subType": "00"}}
-            }        
-        else:
-            raise Exception ("Unexpected name '{}'".format(name))
-    
-    return {
-        "key": {"$binary": {"base64": "Mng0NCt4ZHVUYUJCa1kxNkVyNUR1QURhZ2h2UzR2d2RrZzh0cFBwM3R6NmdWMDFBMUN3YkQ5aXRRMkhGRGdQV09wOGVNYUMxT2k3NjZKelhaQmRCZGJkTXVyZG9uSjFk", "subType": "00"}}
-    }
-
-def yamlfile (relative_filepath):
-    filepath = Path("./source/client-side-encryption/etc/data") / Path(relative_filepath)
-    with open(filepath, "r") as file:
-        contents = file.read()
-        return yaml.safe_load (contents)
-
-if sys.version_info < (3, 0):
-    print("Use Python 3")
-    sys.exit(1)
-
-if len(sys.argv) < 3:
-    print(description)
-    print("usage: python generate-test.py ./test-templates/<filename>.yml.template [...] <target directory>")
-    print("example: python ./generate-test.py ./test-templates/bulk.yml.template ./")
-    sys.exit(1)
-
-targetdir = sys.argv[-1]
-
-for filepath in sys.argv[1:-1]:
-    filedir = os.path.dirname(filepath)
+# ./source/client-side-encryption/etc
+DIR = os.path.dirname(os.path.realpath(__file__))
+MANIFEST = os.path.join(DIR, ".generate-test-manifest.json")
+# The templates render tests in the legacy format of ../tests/README.md.
+SCHEMA = os.path.join(DIR, "legacy-test-schema.json")
+# The code that renders each output; a change to it invalidates the manifest.
+GENERATOR = [os.path.realpath(__file__), os.path.join(DIR, "fixtures.py")]
+
+# Compiled templates, keyed by path and modification time.
+_templates = {}
+
+
+def load_template(filepath):
+    mtime = os.stat(filepath).st_mtime_ns
+    cached = _templates.get(filepath)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, Template(open(filepath, "r").read()))
+        _templates[filepath] = cached
+    return cached[1]
+
+
+def output_name(filepath):
+    """Return the test name for a template path, or None if it is not a .yml.template."""
     (filename, ext) = os.path.splitext(os.path.basename(filepath))
     if ext != ".template":
-        print("Input file must end with .yml.template")
-        sys.exit(1)
+        return None
     (filename, ext) = os.path.splitext(filename)
     if ext != ".yml":
-        print("Input file must end with .yml.template")
-        sys.exit(1)
-
-    template = Template(open(filepath, "r").read())
-    injections = {
-        "schema": schema,
-        "ciphertext": ciphertext,
-        "key": key,
-        "local_provider": local_provider,
-        "schema_w_type": schema_w_type,
-        "yamlfile": yamlfile,
-    }
-
-    rendered = template.render(**injections)
-    # check for valid YAML.
-    parsed = yaml.load(rendered, Loader=yaml.Loader)
-    open(f"{os.path.join(targetdir,filename + '.yml')}", "w").write(rendered)
-    print(f"Generated {os.path.join(targetdir,filename)}.yml")
-    print("""Run "make" from specifications/source directory to generate corresponding JSON file""")
+        return None
+    return filename
+
+
+def _digest(path):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def generator_digest():
+    """Return a digest of the code that renders the templates."""
+    return hashlib.sha256("".join(_digest(path) or "" for path in GENERATOR).encode()).hexdigest()
+
+
+class BuildManifest:
+    """The dependency graph of each rendered output and the hashes it was built from."""
+
+    def __init__(self, path=MANIFEST):
+        self.path = path
+        self.entries = {}
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("generator") == generator_digest():
+            self.entries = data.get("outputs", {})
+
+    def _key(self, filepath, targetdir):
+        return os.path.relpath(os.path.join(targetdir, output_name(filepath)), DIR)
+
+    def is_current(self, filepath, targetdir, registry):
+        """Return True if no input of the output rendered from filepath has changed."""
+        entry = self.entries.get(self._key(filepath, targetdir))
+        if entry is None or entry["template"] != _digest(filepath):
+            return False
+        for path, digest in entry["outputs"].items():
+            if _digest(os.path.join(DIR, path)) != digest:
+                return False
+        for dep, fingerprint in entry["deps"].items():
+            if registry.fingerprint(*parse_dependency_id(dep)) != fingerprint:
+                return False
+        return True
+
+    def record(self, filepath, targetdir, deps, outputs):
+        self.entries[self._key(filepath, targetdir)] = {
+            "template": _digest(filepath),
+            "deps": dict(sorted(deps.items())),
+            "outputs": {os.path.relpath(path, DIR): _digest(path) for path in outputs},
+        }
+
+    def dependents(self, dep):
+        """Return the outputs (relative to this directory) that read dep."""
+        return sorted(key for key, entry in self.entries.items() if dep in entry["deps"])
+
+    def save(self):
+        data = {"generator": generator_digest(), "outputs": self.entries}
+        yaml2json.write_if_changed(self.path, (json.dumps(data, indent=1, sort_keys=True) + "\n").encode())
+
+
+def generate(filepath, targetdir, registry, manifest=None):
+    """Render one template into targetdir as YAML and JSON.
+
+    Returns the paths of the files whose contents changed. Raises ValueError
+    if the rendered test is not valid YAML or does not match
+    legacy-test-schema.json. If a manifest is given, the inputs the template
+    read are recorded in it.
+    """
+    filename = output_name(filepath)
+    with registry.track() as deps:
+        rendered = load_template(filepath).render(**registry.injections())
+    # Parse once, using libyaml if available, to check for valid YAML and the
+    # schema, then write the JSON from the same parse.
+    try:
+        parsed = yaml2json.load(rendered)
+    except yaml2json.yaml.YAMLError as e:
+        raise ValueError(f"{filepath}: rendered template is not valid YAML: {e}")
+    if unified_schema.available():
+        errors = unified_schema.validate(parsed, schema=SCHEMA)
+        if errors:
+            raise ValueError(f"{filepath}: rendered test does not match {os.path.basename(SCHEMA)}:\n  "
+                             + "\n  ".join(errors))
+    else:
+        print(f"{filepath}: skipping schema validation; install jsonschema to enable it")
+    written = []
+    yml_path = os.path.join(targetdir, filename + ".yml")
+    json_path = os.path.join(targetdir, filename + ".json")
+    if yaml2json.write_if_changed(yml_path, rendered.encode("utf-8")):
+        written.append(yml_path)
+    if yaml2json.write_if_changed(json_path, yaml2json.dumps(parsed).encode("utf-8")):
+        written.append(json_path)
+    if manifest is not None:
+        manifest.record(filepath, targetdir, deps, [yml_path, json_path])
+    return written
+
+
+def build(filepaths, targetdir, registry, manifest, force=False):
+    """Render the templates whose inputs changed since the manifest was recorded.
+
+    Returns (rendered, written): the templates that were rendered and the
+    output files whose contents changed.
+    """
+    rendered = []
+    written = []
+    for filepath in filepaths:
+        if not force and manifest.is_current(filepath, targetdir, registry):
+            continue
+        written += generate(filepath, targetdir, registry, manifest)
+        rendered.append(filepath)
+    manifest.save()
+    return rendered, written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog="example: python ./generate-test.py ./test-templates/bulk.yml.template ./")
+    parser.add_argument("templates", nargs="+", metavar="template", help="./test-templates/<filename>.yml.template")
+    parser.add_argument("targetdir", help="target directory")
+    parser.add_argument("--force", action="store_true", help="render templates even if their inputs are unchanged")
+    args = parser.parse_args(argv)
+
+    for filepath in args.templates:
+        if output_name(filepath) is None:
+            parser.error("Input file must end with .yml.template")
+
+    try:
+        rendered, written = build(args.templates, args.targetdir, FixtureRegistry(), BuildManifest(), args.force)
+    except ValueError as e:
+        print(e)
+        return 1
+    for path in written:
+        print(f"Generated {path}")
+    print(f"Rendered {len(rendered)} of {len(args.templates)} template(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""Render the templated unified tests from a single shared operation catalog.
+
+Usage: python3 source/etc/generate_tests.py [--jobs N] [target ...]
+
+With no targets every generator target is rendered. A target is selected if
+its name (the output path relative to source/, without ".yml") contains any of
+the given strings. Templates are compiled once and cached as bytecode in
+source/etc/.jinja-cache, and only outputs whose bytes changed are written.
+The JSON for each selected output is then regenerated in-process; the
+yaml2json manifest skips outputs whose YAML and JSON are both unchanged.
+"""
+
+import argparse
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from operations import (RETRYABLE_READ_NAMES, RETRYABLE_WRITE_NAMES, Fixtures, operations, select)
+
+# ./source/etc
+DIR = os.path.dirname(os.path.realpath(__file__))
+SOURCE = os.path.dirname(DIR)
+CACHE_DIR = os.path.join(DIR, '.jinja-cache')
+
+sys.path.insert(0, os.path.join(os.path.dirname(SOURCE), 'scripts'))
+import yaml2json  # noqa: E402
+
+# Template path and output path are relative to ./source. Injections are
+# built lazily so that only the selected targets pay for them.
+Target = namedtuple('Target', ['template', 'output', 'injections'])
+
+OPERATIONS = operations()
+
+
+def backpressure_injections():
+    return {'operations': OPERATIONS}
+
+
+def handshake_error_injections(operation_type):
+    ops = operations(Fixtures(client_bulk_write_namespace='retryable-writes-handshake-tests.coll'))
+    names = RETRYABLE_READ_NAMES if operation_type == 'read' else RETRYABLE_WRITE_NAMES
+    return {'operations': select(ops, names, operation_type)}
+
+
+CSOT_FIXTURES = Fixtures(document='{ x: 1 }', bulk_write_document='{ _id: 1 }', value='1',
+                         index_keys='{ x: 1 }', index_name='"x_1"')
+
+
+def get_command_object(object):
+    if object == 'client' or object == 'database':
+        return 1
+    return '*collectionName'
+
+
+def max_time_supported(operation_name):
+    return operation_name in ['aggregate', 'count', 'estimatedDocumentCount', 'distinct', 'find', 'findOne',
+                              'findOneAndDelete', 'findOneAndReplace', 'findOneAndUpdate', 'createIndex',
+                              'dropIndex', 'dropIndexes']
+
+
+def csot_retryable_injections():
+    ops = operations(CSOT_FIXTURES, include_deprecated=True)
+    writes = [name for name in RETRYABLE_WRITE_NAMES if name != 'clientBulkWrite']
+    reads = [name for name in RETRYABLE_READ_NAMES if name != 'listIndexNames']
+    return {
+        'operations': select(ops, writes, 'write') + select(ops, reads, 'read'),
+        'get_command_object': get_command_object,
+        'max_time_supported': max_time_supported,
+    }
+
+
+TARGETS = [
+    Target('client-backpressure/tests/backpressure-retry-loop.yml.template',
+           'client-backpressure/tests/backpressure-retry-loop.yml', backpressure_injections),
+    Target('client-backpressure/tests/backpressure-retry-max-attempts.yml.template',
+           'client-backpressure/tests/backpressure-retry-max-attempts.yml', backpressure_injections),
+    Target('retryable-reads/tests/etc/templates/handshakeError.yml.template',
+           'retryable-reads/tests/unified/handshakeError.yml', lambda: handshake_error_injections('read')),
+    Target('retryable-writes/tests/etc/templates/handshakeError.yml.template',
+           'retryable-writes/tests/unified/handshakeError.yml', lambda: handshake_error_injections('write')),
+    # TODO(DRIVERS-3266): Investigate dropping generator script for index-related
+    # timeoutMS tests (global-timeoutMS, override-*-timeoutMS, deprecated-options).
+    Target('client-side-operations-timeout/etc/templates/retryability-timeoutMS.yml.template',
+           'client-side-operations-timeout/tests/retryability-timeoutMS.yml', csot_retryable_injections),
+    Target('client-side-operations-timeout/etc/templates/retryability-legacy-timeouts.yml.template',
+           'client-side-operations-timeout/tests/retryability-legacy-timeouts.yml', csot_retryable_injections),
+]
+
+
+def target_name(target):
+    return target.output[:-len('.yml')]
+
+
+_environment = None
+
+
+def environment():
+    """Return the process-wide Jinja environment, creating it on first use."""
+    global _environment
+    if _environment is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _environment = Environment(loader=FileSystemLoader(SOURCE),
+                                   bytecode_cache=FileSystemBytecodeCache(CACHE_DIR))
+    return _environment
+
+
+def render(target):
+    """Render a target, returning the output path and its contents."""
+    template = environment().get_template(target.template)
+    return os.path.join(SOURCE, target.output), template.render(**target.injections())
+
+
+def _render_index(index):
+    return render(TARGETS[index])
+
+
+def generate(targets=None, jobs=None):
+    """Render targets in parallel and return the paths of outputs that changed."""
+    targets = TARGETS if targets is None else targets
+    indexes = [TARGETS.index(t) for t in targets]
+    jobs = min(jobs or os.cpu_count() or 1, len(indexes))
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_render_index, indexes))
+    else:
+        results = [_render_index(i) for i in indexes]
+
+    written = []
+    for path, rendered in results:
+        if yaml2json.write_if_changed(path, rendered.encode('utf-8')):
+            written.append(path)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render the templated unified tests.')
+    parser.add_argument('targets', nargs='*', help='substrings of target names to render (default: all)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes')
+    parser.add_argument('-l', '--list', action='store_true', help='list target names and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for target in TARGETS:
+            print(target_name(target))
+        return 0
+
+    targets = [t for t in TARGETS if not args.targets or any(s in target_name(t) for s in args.targets)]
+    if not targets:
+        parser.error('no targets match ' + ', '.join(args.targets))
+    written = generate(targets, args.jobs)
+    for path in written:
+        print(f'Generated {path}')
+    # Convert every selected output, not only the ones written, so that a stale
+    # or deleted JSON file is regenerated even if its YAML was up to date.
+    outputs = [os.path.join(SOURCE, t.output) for t in targets]
+    _, errors = yaml2json.convert(outputs, jobs=args.jobs, verbose=True)
+    for error in errors:
+        print(error, file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
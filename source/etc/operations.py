@@ -0,0 +1,136 @@
+from collections import namedtuple
+
+# Catalog of driver operations shared by the templated test generators.
+#
+# Each Operation carries the YAML argument lines a template renders under
+# "arguments:". The documents, values and index names inside those arguments
+# differ between test suites, so they are supplied through Fixtures.
+
+Operation = namedtuple(
+    'Operation', ['operation_name', 'command_name', 'object', 'arguments', 'operation_type', 'deprecated'],
+    defaults=[False])
+
+Fixtures = namedtuple(
+    'Fixtures', ['document', 'bulk_write_document', 'value', 'index_keys', 'index_name',
+                 'client_bulk_write_namespace'],
+    defaults=['{ _id: 2, x: 22 }', '{ _id: 2, x: 22 }', '22', '{ x: 11 }', '"x_11"', '*client_bulk_write_ns'])
+
+DEFAULT_FIXTURES = Fixtures()
+
+RUN_COMMAND_ARGUMENTS = '''command: { ping: 1 }
+          commandName: ping'''
+
+RETRYABLE_READ_NAMES = [
+    'find',
+    'findOne',
+    'aggregate',
+    'distinct',
+    'count',
+    'estimatedDocumentCount',
+    'countDocuments',
+    'createChangeStream',
+    'listDatabases',
+    'listDatabaseNames',
+    'listCollections',
+    'listCollectionNames',
+    'listIndexes',
+    'listIndexNames',
+]
+
+RETRYABLE_WRITE_NAMES = [
+    'insertOne',
+    'updateOne',
+    'deleteOne',
+    'replaceOne',
+    'findOneAndDelete',
+    'findOneAndUpdate',
+    'findOneAndReplace',
+    'insertMany',
+    'bulkWrite',
+    'clientBulkWrite',
+]
+
+
+def client_operations(fixtures=DEFAULT_FIXTURES):
+    client_bulk_write_arguments = f'''models:
+          - insertOne:
+              namespace: {fixtures.client_bulk_write_namespace}
+              document: {{ _id: 8, x: 88 }}'''
+    return [
+        Operation('listDatabases', 'listDatabases', 'client', ['filter: {}'], 'read'),
+        Operation('listDatabaseNames', 'listDatabases', 'client', [], 'read'),
+        Operation('createChangeStream', 'aggregate', 'client', ['pipeline: []'], 'read'),
+        Operation('clientBulkWrite', 'bulkWrite', 'client', [client_bulk_write_arguments], 'write'),
+    ]
+
+
+def database_operations(fixtures=DEFAULT_FIXTURES):
+    return [
+        Operation('aggregate', 'aggregate', 'database',
+                  ['pipeline: [ { $listLocalSessions: {} }, { $limit: 1 } ]'], 'read'),
+        Operation('listCollections', 'listCollections', 'database', ['filter: {}'], 'read'),
+        Operation('listCollectionNames', 'listCollections', 'database', ['filter: {}'], 'read'),  # Optional.
+        Operation('runCommand', 'ping', 'database', [RUN_COMMAND_ARGUMENTS], 'read'),
+        Operation('createChangeStream', 'aggregate', 'database', ['pipeline: []'], 'read'),
+    ]
+
+
+def collection_read_operations(fixtures=DEFAULT_FIXTURES):
+    return [
+        Operation('aggregate', 'aggregate', 'collection', ['pipeline: []'], 'read'),
+        Operation('count', 'count', 'collection', ['filter: {}'], 'read', deprecated=True),
+        Operation('countDocuments', 'aggregate', 'collection', ['filter: {}'], 'read'),
+        Operation('estimatedDocumentCount', 'count', 'collection', [], 'read'),
+        Operation('distinct', 'distinct', 'collection', ['fieldName: x', 'filter: {}'], 'read'),
+        Operation('find', 'find', 'collection', ['filter: {}'], 'read'),
+        Operation('findOne', 'find', 'collection', ['filter: {}'], 'read'),  # Optional.
+        Operation('listIndexes', 'listIndexes', 'collection', [], 'read'),
+        Operation('listIndexNames', 'listIndexes', 'collection', [], 'read'),  # Optional.
+        Operation('createChangeStream', 'aggregate', 'collection', ['pipeline: []'], 'read'),
+    ]
+
+
+def collection_write_operations(fixtures=DEFAULT_FIXTURES):
+    insert_many_arguments = f'''documents:
+            - {fixtures.document}'''
+    bulk_write_arguments = f'''requests:
+            - insertOne:
+                document: {fixtures.bulk_write_document}'''
+    replacement = f'replacement: {{ x: {fixtures.value} }}'
+    update = f'update: {{ $set: {{ x: {fixtures.value} }} }}'
+    return [
+        Operation('insertOne', 'insert', 'collection', [f'document: {fixtures.document}'], 'write'),
+        Operation('insertMany', 'insert', 'collection', [insert_many_arguments], 'write'),
+        Operation('deleteOne', 'delete', 'collection', ['filter: {}'], 'write'),
+        Operation('deleteMany', 'delete', 'collection', ['filter: {}'], 'write'),
+        Operation('replaceOne', 'update', 'collection', ['filter: {}', replacement], 'write'),
+        Operation('updateOne', 'update', 'collection', ['filter: {}', update], 'write'),
+        Operation('updateMany', 'update', 'collection', ['filter: {}', update], 'write'),
+        Operation('findOneAndDelete', 'findAndModify', 'collection', ['filter: {}'], 'write'),
+        Operation('findOneAndReplace', 'findAndModify', 'collection', ['filter: {}', replacement], 'write'),
+        Operation('findOneAndUpdate', 'findAndModify', 'collection', ['filter: {}', update], 'write'),
+        Operation('bulkWrite', 'insert', 'collection', [bulk_write_arguments], 'write'),
+        Operation('createIndex', 'createIndexes', 'collection',
+                  [f'keys: {fixtures.index_keys}', f'name: {fixtures.index_name}'], 'write'),
+        Operation('dropIndex', 'dropIndexes', 'collection', [f'name: {fixtures.index_name}'], 'write'),
+        Operation('dropIndexes', 'dropIndexes', 'collection', [], 'write'),
+        Operation('aggregate', 'aggregate', 'collection', ['pipeline: [{$out: "output"}]'], 'write'),
+    ]
+
+
+def operations(fixtures=DEFAULT_FIXTURES, include_deprecated=False):
+    """Return every client, database and collection operation in catalog order.
+
+    Session and GridFS operations are generally tested in other files, so
+    they're not included. Deprecated operations (e.g. count) are only included
+    when asked for.
+    """
+    ops = (client_operations(fixtures) + database_operations(fixtures) +
+           collection_read_operations(fixtures) + collection_write_operations(fixtures))
+    return [op for op in ops if include_deprecated or not op.deprecated]
+
+
+def select(ops, names, operation_type=None):
+    """Filter ops down to the given operation names, keeping catalog order."""
+    return [op for op in ops
+            if op.operation_name in names and operation_type in (None, op.operation_type)]
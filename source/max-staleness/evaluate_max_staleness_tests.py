@@ -0,0 +1,350 @@
+"""Evaluate the max staleness tests with NumPy and compare with their expected results."""
+
+# Every JSON test under tests/ is loaded, in one pass, into arrays with a row
+# per test and a column per server. Read preference validation, staleness,
+# eligibility, tag sets and the latency window are then computed for every
+# server of every test at once, as the Server Selection spec describes, and
+# compared with each test's "error", "suitable_servers" and
+# "in_latency_window".
+#
+# With --fuzz N, N random replica set topologies are generated and evaluated
+# the same way, to time the evaluation and check its invariants. The staleness
+# of a sample of them is also recomputed one server at a time, as the Max
+# Staleness spec words it, so that a wrong vectorized formula is caught.
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+TESTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests')
+
+TOPOLOGY_TYPES = ['Unknown', 'Single', 'Sharded', 'ReplicaSetNoPrimary',
+                  'ReplicaSetWithPrimary', 'LoadBalanced']
+SERVER_TYPES = ['Unknown', 'Standalone', 'Mongos', 'PossiblePrimary', 'RSPrimary',
+                'RSSecondary', 'RSArbiter', 'RSOther', 'RSGhost', 'LoadBalancer']
+MODES = ['Primary', 'PrimaryPreferred', 'Secondary', 'SecondaryPreferred', 'Nearest']
+
+(UNKNOWN_TOPOLOGY, SINGLE, SHARDED, RS_NO_PRIMARY,
+ RS_WITH_PRIMARY, LOAD_BALANCED) = range(len(TOPOLOGY_TYPES))
+UNKNOWN_SERVER = SERVER_TYPES.index('Unknown')
+MONGOS = SERVER_TYPES.index('Mongos')
+RS_PRIMARY = SERVER_TYPES.index('RSPrimary')
+RS_SECONDARY = SERVER_TYPES.index('RSSecondary')
+LOAD_BALANCER = SERVER_TYPES.index('LoadBalancer')
+PRIMARY, PRIMARY_PREFERRED, SECONDARY, SECONDARY_PREFERRED, NEAREST = range(len(MODES))
+
+# Padding for the server columns of tests with fewer servers than the widest.
+NO_SERVER = -1
+
+# Random topologies whose staleness is recomputed by reference_staleness.
+REFERENCE_SAMPLE = 1000
+
+DEFAULT_HEARTBEAT_FREQUENCY_MS = 10000
+IDLE_WRITE_PERIOD_MS = 10000
+SMALLEST_MAX_STALENESS_SECONDS = 90
+LOCAL_THRESHOLD_MS = 15
+
+
+class Tests(object):
+    """Tests as arrays: one row per test, one column per server.
+
+    Per test: topology, heartbeat_ms, mode, max_staleness_sec (NaN if unset).
+    Per server: server_type (NO_SERVER for padding), last_update_time,
+    last_write_date, rtt. tag_match[i, j, k] is True if server j of test i
+    matches the test's k-th read preference tag set; tag_sets[i] is the
+    number of tag sets.
+    """
+
+    def __init__(self, n, servers, max_tag_sets):
+        self.topology = np.zeros(n, np.int8)
+        self.heartbeat_ms = np.full(n, DEFAULT_HEARTBEAT_FREQUENCY_MS, np.float64)
+        self.mode = np.full(n, PRIMARY, np.int8)
+        self.max_staleness_sec = np.full(n, np.nan)
+        self.server_type = np.full((n, servers), NO_SERVER, np.int8)
+        self.last_update_time = np.zeros((n, servers))
+        self.last_write_date = np.zeros((n, servers))
+        self.rtt = np.zeros((n, servers))
+        self.tag_sets = np.ones(n, np.int64)
+        self.tag_match = np.ones((n, servers, max_tag_sets), bool)
+
+    def __len__(self):
+        return len(self.topology)
+
+
+def _number(value):
+    if isinstance(value, dict):
+        return float(value['$numberLong'])
+    return float(value)
+
+
+def _matches(tag_set, tags):
+    return all(tags.get(key) == value for key, value in tag_set.items())
+
+
+def load(paths):
+    """Load the tests in paths. Returns the same as from_documents."""
+    documents = []
+    for path in paths:
+        with open(path) as f:
+            documents.append(json.load(f))
+    return from_documents(documents)
+
+
+def from_documents(documents):
+    """Convert tests in the JSON format to arrays.
+
+    Returns (tests, names, expected), where names[i] holds the addresses of
+    test i's servers and expected is a dict of "error" (bool per test) and
+    "suitable_servers" and "in_latency_window" (bool per server), with
+    "has_suitable_servers" and "has_in_latency_window" telling which tests
+    specify them.
+    """
+    servers = max([len(d['topology_description']['servers']) for d in documents] + [1])
+    max_tag_sets = max([len(d['read_preference'].get('tag_sets') or [{}]) for d in documents] + [1])
+    tests = Tests(len(documents), servers, max_tag_sets)
+    names = []
+    expected = {
+        'error': np.zeros(len(documents), bool),
+        'has_suitable_servers': np.zeros(len(documents), bool),
+        'has_in_latency_window': np.zeros(len(documents), bool),
+        'suitable_servers': np.zeros((len(documents), servers), bool),
+        'in_latency_window': np.zeros((len(documents), servers), bool),
+    }
+
+    for i, document in enumerate(documents):
+        topology = document['topology_description']
+        read_preference = document['read_preference']
+        tests.topology[i] = TOPOLOGY_TYPES.index(topology['type'])
+        tests.heartbeat_ms[i] = document.get('heartbeatFrequencyMS', DEFAULT_HEARTBEAT_FREQUENCY_MS)
+        tests.mode[i] = MODES.index(read_preference.get('mode', 'Primary'))
+        max_staleness = read_preference.get('maxStalenessSeconds')
+        if max_staleness is not None and max_staleness != -1:
+            tests.max_staleness_sec[i] = max_staleness
+        # The default tag_sets, [{}], matches every server.
+        tag_sets = read_preference.get('tag_sets') or [{}]
+        tests.tag_sets[i] = len(tag_sets)
+
+        addresses = []
+        for j, server in enumerate(topology['servers']):
+            addresses.append(server['address'])
+            tests.server_type[i, j] = SERVER_TYPES.index(server['type'])
+            tests.last_update_time[i, j] = server.get('lastUpdateTime', 0)
+            tests.last_write_date[i, j] = _number(
+                server.get('lastWrite', {}).get('lastWriteDate', 0))
+            tests.rtt[i, j] = server.get('avg_rtt_ms', 0)
+            for k, tag_set in enumerate(tag_sets):
+                tests.tag_match[i, j, k] = _matches(tag_set, server.get('tags', {}))
+        names.append(addresses)
+
+        expected['error'][i] = document.get('error', False)
+        for field in ('suitable_servers', 'in_latency_window'):
+            if field in document:
+                expected['has_' + field][i] = True
+                chosen = set(s['address'] for s in document[field])
+                expected[field][i, :len(addresses)] = [a in chosen for a in addresses]
+    return tests, names, expected
+
+
+def evaluate(tests):
+    """Select servers for a read in every test.
+
+    Returns a dict of "error" (per test) and "staleness" (ms, NaN for
+    non-secondaries), "suitable_servers" and "in_latency_window" (per server).
+    """
+    topology = tests.topology[:, None]
+    server_type = tests.server_type
+    mode = tests.mode[:, None]
+    heartbeat_ms = tests.heartbeat_ms
+    max_staleness_sec = tests.max_staleness_sec
+    replica_set = (topology == RS_NO_PRIMARY) | (topology == RS_WITH_PRIMARY)
+
+    # Invalid read preferences.
+    has_max_staleness = ~np.isnan(max_staleness_sec)
+    error = has_max_staleness & (
+        (tests.mode == PRIMARY) |
+        (replica_set[:, 0] &
+         ((max_staleness_sec * 1000 < heartbeat_ms + IDLE_WRITE_PERIOD_MS) |
+          (max_staleness_sec < SMALLEST_MAX_STALENESS_SECONDS))))
+
+    primary = server_type == RS_PRIMARY
+    secondary = server_type == RS_SECONDARY
+
+    # Staleness of each secondary, from the primary or else the freshest secondary.
+    has_primary = primary.any(axis=1)
+    p = primary.argmax(axis=1)[:, None]
+    primary_lag = (np.take_along_axis(tests.last_update_time, p, axis=1) -
+                   np.take_along_axis(tests.last_write_date, p, axis=1))
+    smax = np.where(secondary, tests.last_write_date, -np.inf).max(axis=1)[:, None]
+    staleness = np.where(
+        (topology == RS_WITH_PRIMARY) & has_primary[:, None],
+        (tests.last_update_time - tests.last_write_date) - primary_lag,
+        smax - tests.last_write_date) + heartbeat_ms[:, None]
+    staleness = np.where(secondary, staleness, np.nan)
+    fresh = ~has_max_staleness[:, None] | (staleness <= max_staleness_sec[:, None] * 1000)
+
+    # Candidates for mode 'secondary' or 'nearest', filtered by staleness.
+    candidates = (secondary & fresh) | (primary & (mode == NEAREST))
+
+    # The first tag set that matches a candidate decides which are eligible.
+    tag_sets = np.arange(tests.tag_match.shape[2]) < tests.tag_sets[:, None]
+    matched = (tests.tag_match & candidates[:, :, None]).any(axis=1) & tag_sets
+    first = matched.argmax(axis=1)[:, None, None]
+    eligible = (candidates & matched.any(axis=1)[:, None] &
+                np.take_along_axis(tests.tag_match, first, axis=2)[:, :, 0])
+
+    use_primary = ((mode == PRIMARY) | ((mode == PRIMARY_PREFERRED) & has_primary[:, None]) |
+                   ((mode == SECONDARY_PREFERRED) & ~eligible.any(axis=1)[:, None]))
+    replica_set_suitable = np.where(use_primary, primary, eligible)
+
+    suitable = np.select(
+        [replica_set, topology == SINGLE, topology == SHARDED, topology == LOAD_BALANCED],
+        [replica_set_suitable,
+         (server_type != UNKNOWN_SERVER) & (server_type != NO_SERVER),
+         server_type == MONGOS,
+         server_type == LOAD_BALANCER],
+        False)
+    suitable &= ~error[:, None]
+
+    # The latency window is LOCAL_THRESHOLD_MS wide, from the fastest suitable server.
+    fastest = np.where(suitable, tests.rtt, np.inf).min(axis=1)[:, None]
+    in_latency_window = suitable & (tests.rtt <= fastest + LOCAL_THRESHOLD_MS)
+
+    return {'error': error, 'staleness': staleness,
+            'suitable_servers': suitable, 'in_latency_window': in_latency_window}
+
+
+def diff(paths, names, expected, results):
+    """Return a description of each difference between expected and actual results."""
+    differences = []
+    for i, path in enumerate(paths):
+        name = os.path.relpath(path, TESTS)
+        if expected['error'][i] != results['error'][i]:
+            differences.append('%s: error %s, expected %s' % (
+                name, bool(results['error'][i]), bool(expected['error'][i])))
+            continue
+        for field in ('suitable_servers', 'in_latency_window'):
+            if not expected['has_' + field][i]:
+                continue
+            n = len(names[i])
+            actual = results[field][i, :n]
+            if (actual != expected[field][i, :n]).any():
+                differences.append('%s: %s %s, expected %s' % (
+                    name, field,
+                    [a for a, x in zip(names[i], actual) if x],
+                    [a for a, x in zip(names[i], expected[field][i, :n]) if x]))
+    return differences
+
+
+def generate(rng, n, servers, max_tag_sets=2):
+    """Return n random replica set tests with the given number of servers."""
+    tests = Tests(n, servers, max_tag_sets)
+    tests.topology[:] = rng.choice([RS_NO_PRIMARY, RS_WITH_PRIMARY], n)
+    tests.heartbeat_ms[:] = rng.integers(500, 120000, n)
+    tests.mode[:] = rng.integers(PRIMARY_PREFERRED, len(MODES), n)
+    tests.max_staleness_sec[:] = np.where(rng.random(n) < .2, np.nan, rng.integers(90, 300, n))
+
+    # At most one primary, and only in ReplicaSetWithPrimary.
+    types = rng.choice([RS_SECONDARY, RS_SECONDARY, RS_SECONDARY, UNKNOWN_SERVER,
+                        SERVER_TYPES.index('RSArbiter')], (n, servers))
+    with_primary = tests.topology == RS_WITH_PRIMARY
+    types[with_primary, rng.integers(0, servers, n)[with_primary]] = RS_PRIMARY
+    tests.server_type[:] = types
+
+    now = 10 ** 9
+    tests.last_update_time[:] = now - rng.random((n, servers)) * tests.heartbeat_ms[:, None]
+    tests.last_write_date[:] = tests.last_update_time - rng.exponential(30000, (n, servers))
+    tests.rtt[:] = rng.exponential(20, (n, servers))
+    tests.tag_sets[:] = rng.integers(1, max_tag_sets + 1, n)
+    tests.tag_match[:] = rng.random((n, servers, max_tag_sets)) < .5
+    return tests
+
+
+def check_invariants(tests, results):
+    """Raise AssertionError if results break a rule that holds for any topology."""
+    suitable = results['suitable_servers']
+    in_window = results['in_latency_window']
+    assert not (in_window & ~suitable).any(), "server in latency window but not suitable"
+    assert (in_window.any(axis=1) == suitable.any(axis=1)).all(), "empty latency window"
+    assert not suitable[results['error']].any(), "server suitable despite an error"
+    stale = results['staleness'] > tests.max_staleness_sec[:, None] * 1000
+    assert not (suitable & stale).any(), "stale secondary suitable"
+
+
+def reference_staleness(tests, i):
+    """Return the staleness in ms of each server of test i, None for non-secondaries."""
+    types = list(tests.server_type[i])
+    last_update_time = tests.last_update_time[i]
+    last_write_date = tests.last_write_date[i]
+    heartbeat_ms = tests.heartbeat_ms[i]
+    secondaries = [j for j, t in enumerate(types) if t == RS_SECONDARY]
+    staleness = [None] * len(types)
+    if tests.topology[i] == RS_WITH_PRIMARY and RS_PRIMARY in types:
+        # (S.lastUpdateTime - S.lastWriteDate) - (P.lastUpdateTime - P.lastWriteDate) + heartbeatFrequencyMS
+        p = types.index(RS_PRIMARY)
+        for j in secondaries:
+            staleness[j] = ((last_update_time[j] - last_write_date[j]) -
+                            (last_update_time[p] - last_write_date[p]) + heartbeat_ms)
+    elif secondaries:
+        # SMax.lastWriteDate - S.lastWriteDate + heartbeatFrequencyMS
+        smax = max(last_write_date[j] for j in secondaries)
+        for j in secondaries:
+            staleness[j] = smax - last_write_date[j] + heartbeat_ms
+    return staleness
+
+
+def check_staleness(tests, results, rows):
+    """Raise AssertionError if the staleness of a test in rows differs from reference_staleness."""
+    for i in rows:
+        actual = results['staleness'][i]
+        for j, expected in enumerate(reference_staleness(tests, i)):
+            if expected is None:
+                assert np.isnan(actual[j]), "staleness for a non-secondary in topology %d" % i
+            else:
+                assert abs(actual[j] - expected) <= 1e-6 * max(1, abs(expected)), (
+                    "topology %d server %d: staleness %.3f, expected %.3f" % (i, j, actual[j], expected))
+
+
+def main(args):
+    paths = sorted(glob.glob(os.path.join(TESTS, '*', '*.json')))
+    started = time.time()
+    tests, names, expected = load(paths)
+    loaded = time.time()
+    results = evaluate(tests)
+    evaluated = time.time()
+
+    differences = diff(paths, names, expected, results)
+    for difference in differences:
+        print(difference)
+    print("%d tests, %d differences (load %.1f ms, evaluate %.1f ms)" % (
+        len(paths), len(differences), (loaded - started) * 1000, (evaluated - loaded) * 1000))
+
+    if args.fuzz:
+        rng = np.random.default_rng(args.seed)
+        tests = generate(rng, args.fuzz, args.servers)
+        started = time.time()
+        results = evaluate(tests)
+        elapsed = time.time() - started
+        check_invariants(tests, results)
+        check_staleness(tests, results, rng.choice(len(tests), min(len(tests), REFERENCE_SAMPLE), replace=False))
+        print("%d random topologies of %d servers evaluated in %.2f s (%.0f topologies/s)" % (
+            args.fuzz, args.servers, elapsed, args.fuzz / elapsed))
+    return 1 if differences else 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fuzz", help="Also evaluate this many random topologies",
+                        type=int, metavar="N")
+    parser.add_argument("--servers", help="Servers per random topology",
+                        type=int, default=7)
+    parser.add_argument("--seed", help="Random seed", type=int)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))
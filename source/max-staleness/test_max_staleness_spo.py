@@ -1,5 +1,11 @@
 # Attempt to maximize staleness calculation "error" per SPEC description 
 
+import argparse
+import json
+import os
+import time as clock
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import numpy as np
 import scipy.optimize as spo
 ir = lambda n: int(round(n))
@@ -14,43 +20,113 @@ argmin = [0,-threshold,0,0,0,0,0]
 argmax = [threshold,threshold,c_freq,c_freq,1000,1000,s_freq]
 arglabels = ["True Lag", "Clock skew (Client to Prim)", "Last Primary ping (ms ago)", "Last Secondary ping (ms ago)", "Client Primary latency", "Client Secondary latency", "Last server write (ms ago)"]
 
+# The starting point the search has always used; chain 0 starts from it.
+x0 = (10,200000,5000 ,3000 ,250 ,250 ,250)
+
 res = 1 #simulation resolution in ms
 time = threshold * 10 #arbitrary time on the primary (to avoid dealing with negative indexes)
 
 def main():
+    parser = argparse.ArgumentParser(description="Search for the largest max staleness calculation error.")
+    parser.add_argument("--check", type=int, metavar="N",
+                        help="compare simulate_staleness with the array reference on N random points and exit")
+    parser.add_argument("--method", choices=["basinhopping", "de"], default="basinhopping",
+                        help="optimizer each chain runs (de: differential evolution)")
+    parser.add_argument("--starts", type=int, default=1, help="number of chains")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="seed the chain seeds are derived from")
+    parser.add_argument("--iterations", type=int, default=500, help="iterations per chain")
+    parser.add_argument("--budget", type=float, metavar="SECONDS", help="stop after this much wall-clock time")
+    parser.add_argument("--patience", type=int, metavar="N",
+                        help="stop once N chains in a row finish without improving the best result")
+    parser.add_argument("--checkpoint", metavar="FILE", help="save finished chains to FILE and resume from it")
+    args = parser.parse_args()
+    if args.check:
+        check_equivalence(args.check)
+        return
 
     #Attempt to find global minima using an optimizer
-    num_iterations = 500
     step=2000
     interval=10
 
-    print("SPO Params: Iter: {}, step: {}, interval:{}".format(num_iterations,step,interval))
+    print("SPO Params: Method: {}, starts: {}, seed: {}, iter: {}, step: {}, interval:{}".format(
+        args.method, args.starts, args.seed, args.iterations, step, interval))
 
-    result = spo.basinhopping(func=simulate_staleness
-                              ,x0= (10,200000,5000 ,3000 ,250 ,250 ,250)
-                              ,niter=num_iterations
-                              ,minimizer_kwargs = dict(
-                                method="L-BFGS-B"
-                                ,bounds = list(zip(argmin,argmax)))
-                              ,stepsize=step
-                              ,interval=interval
-                              ,disp= True)
+    search = MultiStart(args.method, args.starts, args.seed, args.iterations, step, interval, args.checkpoint)
+    best = search.run(args.jobs, args.budget, args.patience)
+    if best is None:
+        print("No chain finished")
+        return
 
-    print("Server update frequency:     {}\n"
+    print("Chains finished:             {} of {}\n"
+          "Best chain:                  {} (seed {})\n"
+          "Server update frequency:     {}\n"
           "Client update frequency:     {}\n"\
-          "Potential calculation error: {}".format(s_freq,c_freq,abs(round(result.fun))))
+          "Potential calculation error: {}".format(len(search.results), args.starts, best["chain"], best["seed"],
+                                                   s_freq,c_freq,abs(round(best["fun"]))))
 
     print("\nArguments: ")
     for i in range(len(arglabels)):
-        print("val: {} \t {}".format(round(result.x[i]),arglabels[i]))
+        print("val: {} \t {}".format(round(best["x"][i]),arglabels[i]))
 
 
 # Simulate staleness "error" given the absolute true lag, clock skew, and last time P/S were pinged, etc
 # This function is deterministic, given a set of inputs, there's only one output value. 
 
+# The primary's reported lastWrite as of k*res ms ago is its time then,
+# truncated to every s_freq ms. The functions below compute the entries of the
+# array that simulate_staleness_array builds directly from that.
+
+def primary_write(k):
+    t = time - k * res
+    return t - t % s_freq
+
 def simulate_staleness(inputs): #input clobbered into a tuple for optimizer to digest
     true_lag, c_clock_skew, last_P_ago, last_S_ago, cp_latency, cs_latency,p_offset = inputs
 
+    # Offset since last server write happened (anywhere 0-500ms)
+    p_start = ir(float(p_offset)/res)
+
+    #shift the primary writes to account for lag & latency on secondary
+    s_offset = ir(float(true_lag)/res)
+
+    #calculate last updated date from client's frame (ie: absolute time + skew)
+    s_last_ut = time - last_S_ago + c_clock_skew
+    p_last_ut = time - last_P_ago + c_clock_skew
+
+    #client connects to S and receiving a response last_s_ago
+    cs_offset = ir(float(last_S_ago+cs_latency)/res)
+    s_last_w = primary_write(p_start + s_offset + cs_offset)  # reported S writeTime at that time
+    cp_offset = ir(float(last_P_ago+cp_latency)/res)
+    p_last_w = primary_write(p_start + cp_offset)  #reported P last_write at that time
+
+    lag = (s_last_ut - s_last_w) - (p_last_ut- p_last_w) + c_freq
+    return -abs(lag-true_lag)
+
+def simulate_staleness_batch(inputs):
+    """simulate_staleness for each row of an (n, 7) array of inputs."""
+    inputs = np.asarray(inputs, dtype=float)
+    true_lag, c_clock_skew, last_P_ago, last_S_ago, cp_latency, cs_latency, p_offset = inputs.T
+
+    # np.rint rounds halves to even, like round().
+    p_start = np.rint(p_offset/res).astype(np.int64)
+    s_offset = np.rint(true_lag/res).astype(np.int64)
+    cs_offset = np.rint((last_S_ago+cs_latency)/res).astype(np.int64)
+    cp_offset = np.rint((last_P_ago+cp_latency)/res).astype(np.int64)
+
+    s_last_ut = time - last_S_ago + c_clock_skew
+    p_last_ut = time - last_P_ago + c_clock_skew
+    s_last_w = primary_write(p_start + s_offset + cs_offset)
+    p_last_w = primary_write(p_start + cp_offset)
+
+    lag = (s_last_ut - s_last_w) - (p_last_ut- p_last_w) + c_freq
+    return -np.abs(lag-true_lag)
+
+# The original simulation, which builds the primary's write history as an
+# array on every call. Kept as the reference for check_equivalence.
+def simulate_staleness_array(inputs):
+    true_lag, c_clock_skew, last_P_ago, last_S_ago, cp_latency, cs_latency,p_offset = inputs
+
     #Array of reported lastWrite times, reverse order
     #first element represents the currently reported lastWrite
     #second element represents lastwrite as of 'res' ms ago
@@ -77,4 +153,149 @@ def simulate_staleness(inputs): #input clobbered into a tuple for optimizer to d
     lag = (s_last_ut - s_last_w) - (p_last_ut- p_last_w) + c_freq
     return -abs(lag-true_lag)
 
-main()
+def check_equivalence(n, seed=0):
+    """Compare simulate_staleness and simulate_staleness_batch with the array reference on n random points."""
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(argmin, argmax, size=(n, len(argmin)))
+    # Also try integers and half-way points, where rounding matters.
+    points[::3] = np.round(points[::3])
+    points[1::3] = np.floor(points[1::3]) + 0.5
+    batch = simulate_staleness_batch(points)
+    for i, x in enumerate(points):
+        expected = simulate_staleness_array(x)
+        if simulate_staleness(x) != expected or batch[i] != expected:
+            raise AssertionError("Mismatch at {}: {} {} {}".format(
+                list(x), expected, simulate_staleness(x), batch[i]))
+    print("simulate_staleness matches the array reference on {} points".format(n))
+
+# Multi-start search. Chain 0 starts from x0, so its result is comparable with
+# the single search this script used to run; every other chain starts from a
+# point and seed derived from SeedSequence(seed).spawn(). A (seed, chain) pair
+# always gives the same result whichever process runs it and in whatever order.
+
+def chain_seed(seed, chain):
+    return int(np.random.SeedSequence(seed, spawn_key=(chain,)).generate_state(1)[0])
+
+def _deadline_callback(deadline):
+    # basinhopping and differential_evolution stop when the callback returns True.
+    if deadline is None:
+        return None
+    return lambda *args, **kwargs: clock.time() > deadline
+
+def _minus_batch(x):
+    # differential_evolution passes the population as columns.
+    return simulate_staleness_batch(np.transpose(x))
+
+def run_chain(method, seed, chain, iterations, step, interval, deadline=None, resume=None):
+    """Run one seeded chain and return its result as a dict.
+
+    If resume is the result of the chain cut short by a deadline, the chain
+    continues from its best point for the iterations it has left.
+    """
+    cseed = chain_seed(seed, chain)
+    rng = np.random.default_rng(cseed)
+    bounds = list(zip(argmin, argmax))
+    start = rng.uniform(argmin, argmax)
+    if chain == 0:
+        start = np.array(x0, dtype=float)
+    done = 0
+    if resume is not None:
+        start = np.array(resume["x"])
+        done = resume.get("nit", 0)
+    if method == "de":
+        result = spo.differential_evolution(_minus_batch, bounds, maxiter=max(iterations - done, 1), seed=cseed,
+                                            x0=start, vectorized=True, updating="deferred", polish=False,
+                                            callback=_deadline_callback(deadline))
+    else:
+        result = spo.basinhopping(func=simulate_staleness
+                                  ,x0=start
+                                  ,niter=max(iterations - done, 1)
+                                  ,minimizer_kwargs = dict(
+                                    method="L-BFGS-B"
+                                    ,bounds = bounds)
+                                  ,stepsize=step
+                                  ,interval=interval
+                                  ,callback=_deadline_callback(deadline)
+                                  ,seed=cseed)
+    found = {"chain": chain, "seed": cseed, "fun": float(result.fun), "x": [float(v) for v in result.x]}
+    if resume is not None and resume["fun"] < found["fun"]:
+        found.update(fun=resume["fun"], x=resume["x"])
+    found["nit"] = done + int(result.nit)
+    found["complete"] = deadline is None or clock.time() <= deadline
+    return found
+
+class MultiStart:
+    """Run seeded chains in a process pool, keeping the global best.
+
+    Chains are saved to the checkpoint file, if any, as they finish; a later
+    run with the same settings only runs the chains that are missing, and
+    continues those cut short by the time budget from their best point.
+    """
+
+    def __init__(self, method, starts, seed, iterations, step, interval, checkpoint=None):
+        self.settings = {"method": method, "seed": seed, "iterations": iterations,
+                         "step": step, "interval": interval}
+        self.starts = starts
+        self.checkpoint = checkpoint
+        self.results = {}
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                saved = json.load(f)
+            if saved["settings"] != self.settings:
+                raise SystemExit("{} was written with different settings: {}".format(checkpoint, saved["settings"]))
+            self.results = {r["chain"]: r for r in saved["results"]}
+            complete = sum(1 for r in self.results.values() if r["complete"])
+            print("Resuming from {}: {} chains finished, {} cut short".format(
+                checkpoint, complete, len(self.results) - complete))
+
+    @property
+    def best(self):
+        # Ties go to the lowest chain number, so the reported best doesn't depend on timing.
+        if not self.results:
+            return None
+        return min(self.results.values(), key=lambda r: (r["fun"], r["chain"]))
+
+    def save(self):
+        if not self.checkpoint:
+            return
+        tmp = self.checkpoint + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"settings": self.settings,
+                       "results": [self.results[c] for c in sorted(self.results)]}, f, indent=1)
+        os.replace(tmp, self.checkpoint)
+
+    def run(self, jobs, budget=None, patience=None):
+        """Run the missing chains and return the best result.
+
+        Stops early once budget seconds have passed (chains still running stop
+        and their results so far are kept, but not marked complete) or once patience chains in
+        a row have finished without improving the best result.
+        """
+        deadline = None if budget is None else clock.time() + budget
+        pending = [c for c in range(self.starts) if not self.results.get(c, {}).get("complete")]
+        jobs = max(1, min(jobs, len(pending)))
+        stale = 0
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            running = {}
+            while pending or running:
+                while pending and len(running) < jobs:
+                    chain = pending.pop(0)
+                    running[executor.submit(run_chain, chain=chain, deadline=deadline,
+                                            resume=self.results.get(chain), **self.settings)] = chain
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+                    result = future.result()
+                    previous = self.best
+                    self.results[result["chain"]] = result
+                    improved = previous is None or result["fun"] < previous["fun"]
+                    stale = 0 if improved else stale + 1
+                    print("chain {:4d}: error {:8.0f}{}".format(result["chain"], -result["fun"],
+                                                               "  (best)" if improved else ""), flush=True)
+                    self.save()
+                if (deadline is not None and clock.time() > deadline) or (patience and stale >= patience):
+                    pending = []
+        return self.best
+
+if __name__ == "__main__":
+    main()
@@ -13,8 +13,16 @@
 #
 # Compare actual and estimated staleness, see if the client would correctly
 # enforce maxStalenessSeconds for a secondary read, record the outcome.
+#
+# Unexpected outcomes are written to the CSV file in chunks as the trials run,
+# sorted within each chunk. Histograms of the estimate's error (estimated minus
+# actual staleness) for all trials are kept by heartbeat_sec and
+# max_staleness_sec bucket. With --checkpoint, the state of the run is saved
+# after every batch and an interrupted run resumes where it was saved.
 
 import argparse
+import json
+import os
 import sys
 from collections import OrderedDict
 
@@ -22,159 +30,346 @@ import numpy as np
 
 
 IDLE_FREQ = 10
+OPLOG_ENTRIES = 100
+
+# Trials are simulated in blocks of this many at once.
+BATCH_SIZE = 100000
+
+# Unexpected outcomes are written in chunks of this many rows.
+CHUNK_ROWS = 10000
+
+# Histogram buckets: heartbeat_sec and max_staleness_sec are both < 120 s.
+BUCKET_SEC = 10
+ERROR_EDGES = np.arange(-130, 131, 1.0)
+
+RESULT_RECORD = OrderedDict([('correct', '%d'),
+                             ('read_pref_valid', '%d'),
+                             ('secondary_eligible', '%d'),
+                             ('primary_last_write_date', '%.2f'),
+                             ('secondary_lag', '%.2f'),
+                             ('secondary_position', '%.2f'),
+                             ('secondary_last_write_date', '%.2f'),
+                             ('primary_desc_last_update_time', '%.2f'),
+                             ('primary_desc_last_write_date', '%.2f'),
+                             ('secondary_desc_last_update_time', '%.2f'),
+                             ('secondary_desc_last_write_date', '%.2f'),
+                             ('heartbeat_sec', '%.2f'),
+                             ('max_staleness_sec', '%.2f')])
+
 
 def parse_args():
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("TRIALS", help="Number of trials",
                         type=int)
-    parser.add_argument("OUT", help="CSV filename",
-                        type=argparse.FileType('w'))
+    parser.add_argument("OUT", help="CSV filename")
+    parser.add_argument("--seed", help="Random seed", type=int)
+    parser.add_argument("--batch-size", help="Trials simulated at once",
+                        type=int, default=BATCH_SIZE)
+    parser.add_argument("--chunk-rows", help="Rows written at once",
+                        type=int, default=CHUNK_ROWS)
+    parser.add_argument("--npz", metavar="DIR",
+                        help="Also write each chunk to DIR/chunk-NNNNN.npz")
+    parser.add_argument("--checkpoint", metavar="FILE",
+                        help="Save the run's state and histograms to FILE "
+                             "after every batch, and resume from it")
     return parser.parse_args()
 
 
-def make_primary_oplog():
+def make_primary_oplogs(rng, n):
+    """Return an (n, OPLOG_ENTRIES) array with one primary oplog per row."""
+    # Primary wrote at random intervals up to 10 sec apart.
+    # Time began at 0, oplog[0] is the first entry, oplog[-1] the latest.
+    oplogs = np.cumsum(rng.random((n, OPLOG_ENTRIES)) * IDLE_FREQ, axis=1)
     while True:
-        # Primary wrote at random intervals up to 10 sec apart.
-        # Time began at 0, oplog[0] is the first entry, oplog[-1] the latest.
-        oplog = np.cumsum(np.random.rand(100) * IDLE_FREQ)
-
-        # If we generated at least 2 minutes of oplog, return, else try again.
-        if oplog[-1] >= 120:
-            return oplog
-
+        # If we generated at least 2 minutes of oplog, keep it, else try again.
+        short = oplogs[:, -1] < 120
+        if not short.any():
+            return oplogs
+        oplogs[short] = np.cumsum(
+            rng.random((short.sum(), OPLOG_ENTRIES)) * IDLE_FREQ, axis=1)
+
+
+def search(oplogs, values):
+    """Index of the last entry <= value in each row, or 0 if there is none."""
+    # Rows are sorted, so this is searchsorted(side='right') - 1 per row.
+    return np.clip((oplogs <= values[:, None]).sum(axis=1) - 1, 0, None)
+
+
+def describe(rng, server_type, now, oplogs, lag, heartbeat_sec):
+    """Return the client's (last_update_time, last_write_date) for a server."""
+    # Last checked up to heartbeat seconds ago.
+    ago = rng.random(len(now)) * heartbeat_sec
+    last_update_time = now - ago
+    if server_type == 'primary':
+        position = search(oplogs, last_update_time)
+    else:
+        position = search(oplogs, oplogs[:, -1] - lag - ago)
+
+    last_write_date = oplogs[np.arange(len(now)), position]
+    assert (last_update_time > last_write_date).all()
+    return last_update_time, last_write_date
+
+
+def simulate(rng, n):
+    """Simulate n trials.
+
+    Returns (columns, incorrectly_eligible_case, trials), where columns maps
+    each RESULT_RECORD name to an array holding the unexpected outcomes, and
+    trials holds heartbeat_sec, max_staleness_sec, the estimate's error and
+    whether the outcome was unexpected for every trial.
+    """
+    # Heartbeat frequency from 500ms to 2 minutes.
+    heartbeat_sec = .5 + (rng.random(n) * (120 - .5))
+    oplogs = make_primary_oplogs(rng, n)
+    primary_last_write_date = oplogs[:, -1]
+
+    # Latest write was up to 10 seconds ago.
+    now = primary_last_write_date + rng.random(n) * IDLE_FREQ
+
+    # Lag could be as old as the beginning of time (0), but favor small lags
+    # to improve test coverage.
+    secondary_lag = rng.power(a=.1, size=n) * now
+
+    # Which oplog entry has the secondary replicated to?
+    secondary_position = search(oplogs, primary_last_write_date - secondary_lag)
+    secondary_last_write_date = oplogs[np.arange(n), secondary_position]
+
+    replicated = secondary_position > 0
+    assert (primary_last_write_date - secondary_last_write_date
+            >= secondary_lag - 0.01)[replicated].all()
+
+    primary_update, primary_write = describe(
+        rng, 'primary', now, oplogs, secondary_lag, heartbeat_sec)
+    secondary_update, secondary_write = describe(
+        rng, 'secondary', now, oplogs, secondary_lag, heartbeat_sec)
+
+    # maxStalenessSeconds is between 0 (in violation of spec) and 2 minutes.
+    max_staleness_sec = rng.random(n) * 120
+    read_pref_valid = max_staleness_sec >= (heartbeat_sec + IDLE_FREQ)
+
+    # Estimate secondary_lag, using formula from spec.
+    staleness = ((primary_write - primary_update) -
+                 (secondary_write - secondary_update) +
+                 heartbeat_sec)
+
+    secondary_eligible = staleness <= max_staleness_sec
+
+    # Is the secondary's lag actually less than maxStalenessSeconds?
+    actual = primary_last_write_date - secondary_last_write_date
+    fresh = actual <= max_staleness_sec
+    correct = np.where(fresh, secondary_eligible, ~secondary_eligible)
+
+    # Uh-oh. We selected a secondary that was actually too stale.
+    incorrectly_eligible_case = bool(
+        (~fresh & secondary_eligible & read_pref_valid).any())
+
+    # Don't record expected outcomes.
+    keep = ~correct & read_pref_valid
+    columns = OrderedDict([
+        ('correct', correct[keep]),
+        ('read_pref_valid', read_pref_valid[keep]),
+        ('secondary_eligible', secondary_eligible[keep]),
+        ('primary_last_write_date', primary_last_write_date[keep]),
+        ('secondary_lag', secondary_lag[keep]),
+        ('secondary_position', secondary_position[keep]),
+        ('secondary_last_write_date', secondary_last_write_date[keep]),
+        ('primary_desc_last_update_time', primary_update[keep]),
+        ('primary_desc_last_write_date', primary_write[keep]),
+        ('secondary_desc_last_update_time', secondary_update[keep]),
+        ('secondary_desc_last_write_date', secondary_write[keep]),
+        ('heartbeat_sec', heartbeat_sec[keep]),
+        ('max_staleness_sec', max_staleness_sec[keep])])
+    trials = OrderedDict([
+        ('heartbeat_sec', heartbeat_sec),
+        ('max_staleness_sec', max_staleness_sec),
+        ('error', staleness - actual),
+        ('unexpected', keep)])
+    return columns, incorrectly_eligible_case, trials
+
+
+def records(columns):
+    """Yield each outcome in columns as a tuple of Python values plus "repro"."""
+    names = ', '.join(RESULT_RECORD)
+    for row in zip(*(column.tolist() for column in columns.values())):
+        repro = '%s=%s\0' % (names, ', '.join(str(value) for value in row))
+        yield row + (repro,)
+
+
+class Histograms(object):
+    """Running counts of trials by heartbeat_sec and max_staleness_sec bucket.
+
+    error[i, j, k] counts the trials in heartbeat bucket i and max staleness
+    bucket j whose estimate error fell in ERROR_EDGES bin k; errors outside
+    the edges are counted in the first or last bin.
+    """
+
+    def __init__(self, bucket_sec=BUCKET_SEC):
+        self.bucket_edges = np.arange(0, 120 + bucket_sec, bucket_sec, dtype=float)
+        shape = (len(self.bucket_edges) - 1,) * 2
+        self.trials = np.zeros(shape, np.int64)
+        self.unexpected = np.zeros(shape, np.int64)
+        self.error = np.zeros(shape + (len(ERROR_EDGES) - 1,), np.int64)
+
+    def _bucket(self, values):
+        return np.clip(np.searchsorted(self.bucket_edges, values, side='right') - 1,
+                       0, len(self.bucket_edges) - 2)
+
+    def add(self, trials):
+        hb = self._bucket(trials['heartbeat_sec'])
+        ms = self._bucket(trials['max_staleness_sec'])
+        err = np.clip(np.searchsorted(ERROR_EDGES, trials['error'], side='right') - 1,
+                      0, len(ERROR_EDGES) - 2)
+        np.add.at(self.trials, (hb, ms), 1)
+        np.add.at(self.unexpected, (hb, ms), trials['unexpected'])
+        np.add.at(self.error, (hb, ms, err), 1)
+
+    def arrays(self):
+        return {'bucket_edges': self.bucket_edges, 'error_edges': ERROR_EDGES,
+                'trials': self.trials, 'unexpected': self.unexpected,
+                'error': self.error}
+
+    def load(self, arrays):
+        self.bucket_edges = arrays['bucket_edges']
+        self.trials = arrays['trials']
+        self.unexpected = arrays['unexpected']
+        self.error = arrays['error']
+
+    def report(self, out=sys.stdout):
+        """Print the error range and unexpected outcomes by heartbeat bucket."""
+        out.write('heartbeat_sec      trials  unexpected  min_error  max_error\n')
+        for i in range(len(self.bucket_edges) - 1):
+            counts = self.error[i].sum(axis=0)
+            seen = np.flatnonzero(counts)
+            if not len(seen):
+                continue
+            out.write('%5.0f-%-5.0f %12d %11d %10.0f %10.0f\n' % (
+                self.bucket_edges[i], self.bucket_edges[i + 1],
+                self.trials[i].sum(), self.unexpected[i].sum(),
+                ERROR_EDGES[seen[0]], ERROR_EDGES[seen[-1] + 1]))
+
+
+class ResultSink(object):
+    """Write unexpected outcomes to CSV, and optionally .npz, in fixed-size chunks.
+
+    Rows are buffered until chunk_rows of them are ready; each chunk is sorted
+    like the whole file used to be, eligible secondaries first. Only the
+    buffer, never more than chunk_rows rows plus one batch, is held in memory.
+    """
+
+    def __init__(self, path, chunk_rows=CHUNK_ROWS, npz_dir=None):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.npz_dir = npz_dir
+        self.chunks = 0
+        self.rows = 0
+        self.buffer = OrderedDict((name, []) for name in RESULT_RECORD)
+        self.buffered = 0
+        self.out = None
+        # One more format specifier for "repro".
+        self.result_fmt = ','.join(RESULT_RECORD.values()) + ',"%s"'
+
+    def open(self, resume_offset=None):
+        """Start the CSV file, or truncate it to resume_offset to resume writing it."""
+        if resume_offset is None:
+            self.out = open(self.path, 'w')
+            self.out.write(','.join(RESULT_RECORD))
+            self.out.write(',repro')
+            self.out.write('\n')
+            self.out.flush()
+        else:
+            self.out = open(self.path, 'r+')
+            self.out.truncate(resume_offset)
+            self.out.seek(resume_offset)
+        if self.npz_dir and not os.path.isdir(self.npz_dir):
+            os.makedirs(self.npz_dir)
+
+    def add(self, columns):
+        for name, column in columns.items():
+            self.buffer[name].append(column)
+        self.buffered += len(column)
+        while self.buffered >= self.chunk_rows:
+            self._write_chunk(self.chunk_rows)
+
+    def _take(self, n):
+        joined = OrderedDict((name, np.concatenate(parts)) for name, parts in self.buffer.items())
+        self.buffer = OrderedDict((name, [column[n:]]) for name, column in joined.items())
+        self.buffered -= n
+        return OrderedDict((name, column[:n]) for name, column in joined.items())
+
+    def _write_chunk(self, n):
+        chunk = self._take(n)
+        order = np.lexsort([chunk[name] for name in reversed(list(RESULT_RECORD)[:3])], axis=0)
+        chunk = OrderedDict((name, column[order]) for name, column in chunk.items())
+        if self.npz_dir:
+            np.savez_compressed(os.path.join(self.npz_dir, 'chunk-%05d.npz' % self.chunks), **chunk)
+        # Reversed.
+        self.out.writelines(self.result_fmt % r + '\n' for r in list(records(chunk))[::-1])
+        self.out.flush()
+        self.chunks += 1
+        self.rows += n
 
-def search(ar, value):
-    return np.clip(np.searchsorted(ar, value, side='right') - 1, 0, sys.maxsize)
+    def buffered_columns(self):
+        return OrderedDict((name, np.concatenate(parts)) for name, parts in self.buffer.items())
 
+    def close(self):
+        if self.buffered:
+            self._write_chunk(self.buffered)
+        self.out.close()
 
-class ServerDescription:
-    def __init__(self, server_type, now, oplog, lag, heartbeat_sec):
-        # Last checked up to heartbeat seconds ago.
-        ago = np.random.rand() * heartbeat_sec
-        self.last_update_time = now - ago
-        if server_type == 'primary':
-            position = search(oplog, self.last_update_time)
-        else:
-            position = search(oplog, oplog[-1] - lag - ago)
 
-        self.last_write_date = oplog[position]
-        assert self.last_update_time > self.last_write_date
+def save_checkpoint(path, state, sink, histograms):
+    """Save state, the sink's unwritten rows and the histograms to path atomically."""
+    state = dict(state, csv_offset=sink.out.tell(), chunks=sink.chunks, rows=sink.rows)
+    arrays = histograms.arrays()
+    arrays.update(('buffer_' + name, column)
+                  for name, column in sink.buffered_columns().items())
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, state=np.array(json.dumps(state)), **arrays)
+    os.replace(tmp, path)
 
 
 def main(args):
-    incorrectly_eligible_case = False
-    result_record = OrderedDict([('correct', '%d'),
-                                 ('read_pref_valid', '%d'),
-                                 ('secondary_eligible', '%d'),
-                                 ('primary_last_write_date', '%.2f'),
-                                 ('secondary_lag', '%.2f'),
-                                 ('secondary_position', '%.2f'),
-                                 ('secondary_last_write_date', '%.2f'),
-                                 ('primary_desc_last_update_time', '%.2f'),
-                                 ('primary_desc_last_write_date', '%.2f'),
-                                 ('secondary_desc_last_update_time', '%.2f'),
-                                 ('secondary_desc_last_write_date', '%.2f'),
-                                 ('heartbeat_sec', '%.2f'),
-                                 ('max_staleness_sec', '%.2f')])
-
-    # One more format specifier for "repro".
-    result_fmt = ','.join(result_record.values()) + ',"%s"'
-    results = []
-
-    for i in range(args.TRIALS):
-        # Heartbeat frequency from 500ms to 2 minutes.
-        heartbeat_sec = .5 + (np.random.rand() * (120 - .5))
-        oplog = make_primary_oplog()
-        oplog_len = oplog[-1]
-
-        # Latest write was up to 10 seconds ago.
-        now = oplog_len + np.random.rand() * IDLE_FREQ
-
-        # Lag could be as old as the beginning of time (0), but favor small lags
-        # to improve test coverage.
-        secondary_lag = np.random.power(a=.1) * now
-
-        # Which oplog entry has the secondary replicated to?
-        secondary_position = search(oplog, oplog[-1] - secondary_lag)
-        secondary_last_write_date = oplog[secondary_position]
-
-        if secondary_position > 0:
-            assert oplog[-1] - secondary_last_write_date >= secondary_lag - 0.01
-
-        primary = ServerDescription('primary', now, oplog, secondary_lag,
-                                    heartbeat_sec)
-
-        secondary = ServerDescription('secondary', now, oplog, secondary_lag,
-                                      heartbeat_sec)
-
-        # maxStalenessSeconds is between 0 (in violation of spec) and 2 minutes.
-        max_staleness_sec = np.random.rand() * 120
-        read_pref_valid = max_staleness_sec >= (heartbeat_sec + IDLE_FREQ)
-
-        # Estimate secondary_lag, using formula from spec.
-        staleness = ((primary.last_write_date - primary.last_update_time) -
-                     (secondary.last_write_date - secondary.last_update_time) +
-                     heartbeat_sec)
-
-        secondary_eligible = staleness <= max_staleness_sec
-
-        # Is the secondary's lag actually less than maxStalenessSeconds?
-        if (oplog[-1] - secondary_last_write_date) <= max_staleness_sec:
-            correct = secondary_eligible
-        elif secondary_eligible:
-            correct = False
-            if read_pref_valid:
-                # Uh-oh. We selected a secondary that was actually too stale.
-                incorrectly_eligible_case = True
-        else:
-            correct = True
-
-        if correct or not read_pref_valid:
-            # Don't record expected outcomes.
-            continue
-
-        # Record the outcome.
-        r = OrderedDict([
-            ('correct', correct),
-            ('read_pref_valid', read_pref_valid),
-            ('secondary_eligible', secondary_eligible),
-            ('primary_last_write_date', oplog[-1]),
-            ('secondary_lag', secondary_lag),
-            ('secondary_position', secondary_position),
-            ('secondary_last_write_date', secondary_last_write_date),
-            ('primary_desc_last_update_time', primary.last_update_time),
-            ('primary_desc_last_write_date', primary.last_write_date),
-            ('secondary_desc_last_update_time', secondary.last_update_time),
-            ('secondary_desc_last_write_date', secondary.last_write_date),
-            ('heartbeat_sec', heartbeat_sec),
-            ('max_staleness_sec', max_staleness_sec)])
-
-        r['repro'] = '%s=%s\0' % (
-            ', '.join(result_record),
-            ', '.join(str(r[name]) for name in result_record))
-
-        results.append(r)
-
-    if incorrectly_eligible_case:
+    rng = np.random.default_rng(args.seed)
+    histograms = Histograms()
+    sink = ResultSink(args.OUT, args.chunk_rows, args.npz)
+    state = {'seed': args.seed, 'trials': args.TRIALS, 'batch_size': args.batch_size,
+             'done': 0, 'incorrectly_eligible_case': False}
+
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        with np.load(args.checkpoint) as saved:
+            saved_state = json.loads(str(saved['state']))
+            for key in ('seed', 'trials', 'batch_size'):
+                if saved_state[key] != state[key]:
+                    sys.exit('%s was saved with %s=%s' % (args.checkpoint, key, saved_state[key]))
+            state = saved_state
+            histograms.load(saved)
+            sink.open(state['csv_offset'])
+            sink.chunks, sink.rows = state['chunks'], state['rows']
+            sink.add(OrderedDict((name, saved['buffer_' + name]) for name in RESULT_RECORD))
+        rng.bit_generator.state = state['rng']
+        print('Resuming %s after %d of %d trials' % (args.checkpoint, state['done'], args.TRIALS))
+    else:
+        sink.open()
+
+    print(args.OUT)
+    while state['done'] < args.TRIALS:
+        n = min(args.TRIALS - state['done'], args.batch_size)
+        columns, incorrectly_eligible, trials = simulate(rng, n)
+        state['incorrectly_eligible_case'] |= incorrectly_eligible
+        state['done'] += n
+        histograms.add(trials)
+        sink.add(columns)
+        if args.checkpoint:
+            state['rng'] = rng.bit_generator.state
+            save_checkpoint(args.checkpoint, state, sink, histograms)
+
+    sink.close()
+    histograms.report()
+
+    if state['incorrectly_eligible_case']:
         print("ERROR: selected a too-stale secondary at least once!")
 
-    results.sort(key=lambda rec: (
-        rec['correct'], rec['read_pref_valid'], rec['secondary_eligible']))
-
-    if args.OUT:
-        print(args.OUT.name)
-        args.OUT.write(','.join(result_record))
-        args.OUT.write(',repro')
-        args.OUT.write('\n')
-
-        # Reversed.
-        for r in results[::-1]:
-            line = result_fmt % tuple(r.values())
-            args.OUT.write(line)
-            args.OUT.write('\n')
-
-    args.OUT.close()
-    sys.exit(1 if incorrectly_eligible_case else 0)
+    sys.exit(1 if state['incorrectly_eligible_case'] else 0)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,238 @@
+"""Test accuracy of staleness estimates for every secondary of an N-member RS."""
+
+# Like test_staleness_estimate.py, but for a replica set with a primary and
+# several secondaries, monitored on a realistic schedule:
+#
+# The primary writes in bursts, with idle writes at least every 10 seconds.
+#
+# Each secondary has its own lag, which changes at its own rate; a secondary
+# that lags now may have been further behind or closer when last checked.
+#
+# The client monitors each member every heartbeatFrequencyMS. Its monitors
+# were started one after another, so their checks are staggered, and each
+# response takes the member's round trip time to arrive. Sometimes an event,
+# such as an error or a new topology version, makes the client check every
+# member at once, restarting their schedules.
+#
+# maxStalenessSeconds is a random number between 0 (in violation of spec) and
+# 2 minutes. The spec's estimate is computed for every secondary at once and
+# compared with its actual staleness: a secondary may be wrongly admitted
+# (eligible, but too stale) or wrongly excluded (fresh enough, but not
+# eligible).
+
+import argparse
+import time
+
+import numpy as np
+
+from test_staleness_estimate import IDLE_FREQ, OPLOG_ENTRIES, Histograms
+
+MEMBERS = 7
+
+# Trials are simulated in blocks of this many replica sets at once.
+BATCH_SIZE = 20000
+
+# A write is part of a burst with this probability, following the previous
+# write after an exponentially distributed gap with this mean.
+BURST_PROBABILITY = .3
+BURST_GAP_SEC = .05
+
+# A secondary's lag changes by up to this many seconds per second.
+LAG_DRIFT = .5
+
+# Monitors are started up to this many seconds apart, and round trips take up
+# to this many seconds.
+MONITOR_STAGGER_SEC = .5
+MAX_RTT_SEC = .1
+
+# Chance that an event made the client check every member during the last
+# heartbeat interval.
+EVENT_PROBABILITY = .1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("TRIALS", help="Number of replica sets", type=int)
+    parser.add_argument("--members", help="Members per replica set",
+                        type=int, default=MEMBERS)
+    parser.add_argument("--seed", help="Random seed", type=int)
+    parser.add_argument("--batch-size", help="Replica sets simulated at once",
+                        type=int, default=BATCH_SIZE)
+    parser.add_argument("--burst-probability", help="Chance a write is part of a burst",
+                        type=float, default=BURST_PROBABILITY)
+    parser.add_argument("--event-probability", help="Chance of an immediate check of every member",
+                        type=float, default=EVENT_PROBABILITY)
+    args = parser.parse_args()
+    if args.members < 2:
+        parser.error("a replica set needs a primary and at least one secondary")
+    return args
+
+
+def make_bursty_oplogs(rng, n, burst_probability):
+    """Return an (n, OPLOG_ENTRIES) array with one primary oplog per row."""
+    def generate(rows):
+        burst = rng.random((rows, OPLOG_ENTRIES)) < burst_probability
+        gaps = np.where(burst,
+                        rng.exponential(BURST_GAP_SEC, (rows, OPLOG_ENTRIES)),
+                        rng.random((rows, OPLOG_ENTRIES)) * IDLE_FREQ)
+        return np.cumsum(gaps, axis=1)
+
+    oplogs = generate(n)
+    while True:
+        # If we generated at least 2 minutes of oplog, keep it, else try again.
+        short = oplogs[:, -1] < 120
+        if not short.any():
+            return oplogs
+        oplogs[short] = generate(short.sum())
+
+
+def search_many(oplogs, values):
+    """Index of the last entry <= value for each value, searching its row of oplogs.
+
+    values has shape (n, k); the result has the same shape, and is 0 where no
+    entry is <= the value.
+    """
+    # Shift each row past the previous one and search them all at once.
+    n, entries = oplogs.shape
+    span = oplogs[:, -1].max() + 1
+    shift = np.arange(n)[:, None] * span
+    flat = (oplogs + shift).ravel()
+    found = np.searchsorted(flat, np.clip(values, 0, span - 1) + shift, side='right') - 1
+    return np.clip(found - np.arange(n)[:, None] * entries, 0, None)
+
+
+def last_checks(rng, now, heartbeat_sec, members, event_probability):
+    """Return (check_start, last_update_time) arrays of shape (n, members).
+
+    check_start is when the client's latest completed check of each member
+    began, and last_update_time is when its response arrived.
+    """
+    n = len(now)
+    hb = heartbeat_sec[:, None]
+    rtt = rng.random((n, members)) * MAX_RTT_SEC
+
+    # Regular checks of member m begin at phase + stagger[m] + k * heartbeat.
+    phase = (now - rng.random(n) * heartbeat_sec)[:, None]
+    stagger = np.cumsum(rng.random((n, members)) * MONITOR_STAGGER_SEC, axis=1)
+    start = phase + stagger
+    scheduled = now[:, None] - rtt - np.mod(now[:, None] - rtt - start, hb)
+
+    # An event during the last heartbeat interval checks all members at once.
+    event = rng.random(n) < event_probability
+    event_start = (now - rng.random(n) * heartbeat_sec)[:, None] + stagger - stagger[:, :1]
+    use_event = (event[:, None] & (event_start + rtt <= now[:, None])
+                 & (event_start > scheduled))
+    check_start = np.where(use_event, event_start, scheduled)
+    return check_start, check_start + rtt
+
+
+def simulate(rng, n, members, burst_probability=BURST_PROBABILITY,
+             event_probability=EVENT_PROBABILITY):
+    """Simulate n replica sets.
+
+    Returns a dict of (n, members - 1) arrays, one column per secondary:
+    estimated and actual staleness, and whether the secondary was eligible
+    and fresh, plus (n,) arrays of heartbeat_sec, max_staleness_sec and
+    read_pref_valid.
+    """
+    # Heartbeat frequency from 500ms to 2 minutes.
+    heartbeat_sec = .5 + (rng.random(n) * (120 - .5))
+    oplogs = make_bursty_oplogs(rng, n, burst_probability)
+    primary_last_write_date = oplogs[:, -1]
+
+    # Latest write was up to 10 seconds ago.
+    now = primary_last_write_date + rng.random(n) * IDLE_FREQ
+
+    # Lag could be as old as the beginning of time (0), but favor small lags
+    # to improve test coverage. Each secondary's lag drifts at its own rate;
+    # its applied position never goes backwards since the rate is above -1.
+    secondaries = members - 1
+    lag_now = rng.power(a=.1, size=(n, secondaries)) * now[:, None]
+    drift = (rng.random((n, secondaries)) * 2 - 1) * LAG_DRIFT
+
+    def applied(ago):
+        """The oplog time each secondary had applied up to, ago seconds before now."""
+        return now[:, None] - ago - np.maximum(lag_now + drift * ago, 0)
+
+    secondary_position = search_many(oplogs, applied(0))
+    secondary_last_write_date = np.take_along_axis(oplogs, secondary_position, axis=1)
+
+    # Member 0 is the primary.
+    check_start, last_update_time = last_checks(
+        rng, now, heartbeat_sec, members, event_probability)
+    primary_update = last_update_time[:, :1]
+    primary_write = np.take_along_axis(
+        oplogs, search_many(oplogs, check_start[:, :1]), axis=1)
+    secondary_update = last_update_time[:, 1:]
+    secondary_write = np.take_along_axis(
+        oplogs, search_many(oplogs, applied(now[:, None] - check_start[:, 1:])), axis=1)
+    assert (secondary_update > secondary_write).all()
+
+    # maxStalenessSeconds is between 0 (in violation of spec) and 2 minutes.
+    max_staleness_sec = rng.random(n) * 120
+    read_pref_valid = max_staleness_sec >= (heartbeat_sec + IDLE_FREQ)
+
+    # Estimate each secondary's staleness, using formula from spec.
+    staleness = ((secondary_update - secondary_write) -
+                 (primary_update - primary_write) +
+                 heartbeat_sec[:, None])
+    actual = primary_last_write_date[:, None] - secondary_last_write_date
+
+    return {
+        'heartbeat_sec': heartbeat_sec,
+        'max_staleness_sec': max_staleness_sec,
+        'read_pref_valid': read_pref_valid,
+        'staleness': staleness,
+        'actual': actual,
+        'eligible': staleness <= max_staleness_sec[:, None],
+        'fresh': actual <= max_staleness_sec[:, None],
+    }
+
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    histograms = Histograms()
+    secondaries = wrongly_admitted = wrongly_excluded = 0
+    valid_sets = sets_with_wrong_choice = 0
+
+    started = time.time()
+    remaining = args.TRIALS
+    while remaining > 0:
+        n = min(remaining, args.batch_size)
+        remaining -= n
+        trials = simulate(rng, n, args.members, args.burst_probability,
+                          args.event_probability)
+
+        valid = trials['read_pref_valid']
+        admitted = (trials['eligible'] & ~trials['fresh'])[valid]
+        excluded = (~trials['eligible'] & trials['fresh'])[valid]
+        secondaries += admitted.size
+        wrongly_admitted += admitted.sum()
+        wrongly_excluded += excluded.sum()
+        valid_sets += valid.sum()
+        sets_with_wrong_choice += (admitted | excluded).any(axis=1).sum()
+
+        shape = trials['staleness'].shape
+        histograms.add({
+            'heartbeat_sec': np.broadcast_to(trials['heartbeat_sec'][:, None], shape).ravel(),
+            'max_staleness_sec': np.broadcast_to(trials['max_staleness_sec'][:, None], shape).ravel(),
+            'error': (trials['staleness'] - trials['actual']).ravel(),
+            'unexpected': (valid[:, None] & (trials['eligible'] != trials['fresh'])).ravel()})
+    elapsed = time.time() - started
+
+    print("%d replica sets of %d members in %.1f s (%.0f secondaries/s)" % (
+        args.TRIALS, args.members, elapsed, args.TRIALS * (args.members - 1) / elapsed))
+    print("With a valid maxStalenessSeconds: %d replica sets, %d secondaries" % (
+        valid_sets, secondaries))
+    print("Wrongly admitted secondaries: %d (%.3f%%)" % (
+        wrongly_admitted, 100. * wrongly_admitted / max(secondaries, 1)))
+    print("Wrongly excluded secondaries: %d (%.3f%%)" % (
+        wrongly_excluded, 100. * wrongly_excluded / max(secondaries, 1)))
+    print("Replica sets with a wrong choice: %d (%.3f%%)" % (
+        sets_with_wrong_choice, 100. * sets_with_wrong_choice / max(valid_sets, 1)))
+    print()
+    histograms.report()
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -1,6 +1,5 @@
 import itertools
 import os
-import subprocess
 import sys
 
 # Require Python 3.7+ for ordered dictionaries so that the order of the
@@ -16,6 +15,9 @@ dirname = os.path.dirname
 DIR = dirname(os.path.realpath(__file__))
 SOURCE = dirname(dirname(dirname(DIR)))
 
+sys.path.insert(0, os.path.join(dirname(SOURCE), 'scripts'))
+import yaml2json  # noqa: E402
+
 
 def template(filename):
     fullpath = os.path.join(DIR, filename)
@@ -23,12 +25,12 @@ def template(filename):
         return f.read()
 
 
-def write_test(filename, data):
+def write_test(filename, data, written):
+    """Write a test file and return its path, adding it to written if the contents changed."""
     fullpath = os.path.join(DIR, filename + '.yml')
-    with open(fullpath, 'w') as f:
-        f.write(data)
-
-    print(f"Generated {fullpath}")
+    if yaml2json.write_if_changed(fullpath, data.encode('utf-8')):
+        written.add(fullpath)
+    return fullpath
 
 
 # Maps from error_name to (error_code,)
@@ -44,13 +46,15 @@ ERR_CODES = {
 }
 
 
-def create_stale_tests():
+def create_stale_tests(written):
+    generated = set()
     tmp = template('stale-topologyVersion.yml.template')
     for error_name in ERR_CODES:
         test_name = f'stale-topologyVersion-{error_name}'
         error_code, = ERR_CODES[error_name]
         data = tmp.format(**locals())
-        write_test(test_name, data)
+        generated.add(write_test(test_name, data, written))
+    return generated
 
 TV_GREATER = '''
       topologyVersion:
@@ -84,7 +88,8 @@ NON_STALE_CASES = {
 }
 
 
-def create_non_stale_tests():
+def create_non_stale_tests(written):
+    generated = set()
     tmp = template('non-stale-topologyVersion.yml.template')
     for error_name, description in itertools.product(
             ERR_CODES, NON_STALE_CASES):
@@ -99,7 +104,8 @@ def create_non_stale_tests():
             final_pool_generation = 0
 
         data = tmp.format(**locals())
-        write_test(test_name, data)
+        generated.add(write_test(test_name, data, written))
+    return generated
 
 
 WHEN = ['beforeHandshakeCompletes', 'afterHandshakeCompletes']
@@ -118,7 +124,8 @@ STALE_GENERATION_NETWORK_ERROR = '''
     type: {network_error_type}'''
 
 
-def create_stale_generation_tests():
+def create_stale_generation_tests(written):
+    generated = set()
     tmp = template('stale-generation.yml.template')
     # Stale command errors
     for error_name, when in itertools.product(ERR_CODES, WHEN):
@@ -126,7 +133,7 @@ def create_stale_generation_tests():
         error_code, = ERR_CODES[error_name]
         stale_error = STALE_GENERATION_COMMAND_ERROR.format(**locals())
         data = tmp.format(**locals())
-        write_test(test_name, data)
+        generated.add(write_test(test_name, data, written))
     # Stale network errors
     for network_error_type, when in itertools.product(
             ['network', 'timeout'], WHEN):
@@ -134,10 +141,12 @@ def create_stale_generation_tests():
         test_name = f'stale-generation-{when}-{network_error_type}'
         stale_error = STALE_GENERATION_NETWORK_ERROR.format(**locals())
         data = tmp.format(**locals())
-        write_test(test_name, data)
+        generated.add(write_test(test_name, data, written))
+    return generated
 
 
-def create_post_42_tests():
+def create_post_42_tests(written):
+    generated = set()
     tmp = template('post-42.yml.template')
     for error_name in ERR_CODES:
         test_name = f'post-42-{error_name}'
@@ -149,13 +158,29 @@ def create_post_42_tests():
         else:
             final_pool_generation = 0
         data = tmp.format(**locals())
-        write_test(test_name, data)
-
-
-create_stale_tests()
-create_non_stale_tests()
-create_stale_generation_tests()
-create_post_42_tests()
-
-print('Running make')
-subprocess.run(f'cd {SOURCE} && make', shell=True, check=True)
+        generated.add(write_test(test_name, data, written))
+    return generated
+
+
+def generate(verbose=True):
+    """Write every test and its JSON twin, returning (paths written, conversion errors)."""
+    written = set()
+    generated = (create_stale_tests(written) | create_non_stale_tests(written) |
+                 create_stale_generation_tests(written) | create_post_42_tests(written))
+    if verbose:
+        for fullpath in sorted(written):
+            print(f"Generated {fullpath}")
+
+    # Convert every generated test rather than running make over the tree. The
+    # yaml2json manifest skips tests whose YAML and JSON are both unchanged, so a
+    # stale or deleted JSON file is regenerated even if its YAML was not rewritten.
+    converted, errors = yaml2json.convert(sorted(generated), verbose=verbose)
+    return sorted(written) + [str(p) for p in converted], errors
+
+
+if __name__ == '__main__':
+    _, errors = generate()
+    for error in errors:
+        print(error, file=sys.stderr)
+    if errors:
+        sys.exit(1)
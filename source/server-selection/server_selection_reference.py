@@ -0,0 +1,386 @@
+"""Reference implementation of server selection, with a test runner and benchmark."""
+
+# A compact model of the algorithm in server-selection.md: filtering servers by
+# topology type, operation and read preference mode, by maxStalenessSeconds
+# and by tag_sets, then slicing the latency window.
+#
+# A Topology numbers its servers from fastest to slowest and represents sets
+# of servers as int bitmasks. Everything that does not depend on the read
+# preference is computed once, when the Topology is created: a mask per
+# server type, an index from each (tag name, value) pair to the mask of
+# servers with that tag, and the secondaries in order of staleness. A
+# selection is then a few mask operations, a bisection to find the fresh
+# secondaries and another to find the end of the latency window.
+#
+# Run with no arguments, every test in tests/server_selection, tests/rtt and
+# ../max-staleness/tests is run and each difference from the expected results
+# printed. --benchmark times selections in generated replica sets of
+# --members members, and --check compares them with the vectorized evaluator
+# in ../max-staleness.
+
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import sys
+import time
+from bisect import bisect_right
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TEST_DIRECTORIES = [os.path.join(HERE, 'tests', 'server_selection'),
+                    os.path.join(HERE, '..', 'max-staleness', 'tests')]
+RTT_TESTS = os.path.join(HERE, 'tests', 'rtt')
+
+DEFAULT_HEARTBEAT_FREQUENCY_MS = 10000
+IDLE_WRITE_PERIOD_MS = 10000
+SMALLEST_MAX_STALENESS_SECONDS = 90
+LOCAL_THRESHOLD_MS = 15
+RTT_ALPHA = 0.2
+
+MODES = ('Primary', 'PrimaryPreferred', 'Secondary', 'SecondaryPreferred', 'Nearest')
+
+
+class InvalidReadPreference(ValueError):
+    """The read preference cannot be used, in general or with this topology."""
+
+
+def average_rtt(old_rtt, rtt):
+    """Return the new average RTT after a measurement; old_rtt is None for the first."""
+    if old_rtt is None:
+        return rtt
+    return RTT_ALPHA * rtt + (1 - RTT_ALPHA) * old_rtt
+
+
+class Server(object):
+    __slots__ = ('address', 'type', 'rtt', 'tags', 'last_update_time', 'last_write_date')
+
+    def __init__(self, address, type, rtt=None, tags=None, last_update_time=0, last_write_date=0):
+        self.address = address
+        self.type = type
+        self.rtt = rtt
+        self.tags = tags or {}
+        self.last_update_time = last_update_time
+        self.last_write_date = last_write_date
+
+    @classmethod
+    def from_document(cls, document):
+        last_write_date = document.get('lastWrite', {}).get('lastWriteDate', 0)
+        if isinstance(last_write_date, dict):
+            last_write_date = int(last_write_date['$numberLong'])
+        return cls(document['address'], document['type'], document.get('avg_rtt_ms'),
+                   document.get('tags'), document.get('lastUpdateTime', 0), last_write_date)
+
+
+class ReadPreference(object):
+    __slots__ = ('mode', 'tag_sets', 'max_staleness_sec')
+
+    def __init__(self, mode='Primary', tag_sets=None, max_staleness_sec=None):
+        if mode not in MODES:
+            raise InvalidReadPreference('unknown mode %r' % (mode,))
+        if max_staleness_sec == -1:
+            max_staleness_sec = None
+        if mode == 'Primary' and (max_staleness_sec is not None or any(tag_sets or [])):
+            raise InvalidReadPreference('mode Primary with tag_sets or maxStalenessSeconds')
+        self.mode = mode
+        # The default, [{}], matches every server.
+        self.tag_sets = [{}] if tag_sets is None else tag_sets
+        self.max_staleness_sec = max_staleness_sec
+
+    @classmethod
+    def from_document(cls, document):
+        return cls(document.get('mode', 'Primary'), document.get('tag_sets'),
+                   document.get('maxStalenessSeconds'))
+
+
+class Topology(object):
+    """A topology description, indexed for selecting servers."""
+
+    def __init__(self, topology_type, servers, heartbeat_ms=DEFAULT_HEARTBEAT_FREQUENCY_MS,
+                 local_threshold_ms=LOCAL_THRESHOLD_MS):
+        self.type = topology_type
+        self.heartbeat_ms = heartbeat_ms
+        self.local_threshold_ms = local_threshold_ms
+
+        # Bit i is the i-th fastest server; servers without an RTT come last.
+        self.servers = sorted(servers, key=lambda s: math.inf if s.rtt is None else s.rtt)
+        self.rtts = [math.inf if s.rtt is None else s.rtt for s in self.servers]
+        self.bits = {}
+        self.by_type = {}
+        self.tag_index = {}
+        for i, server in enumerate(self.servers):
+            bit = 1 << i
+            self.bits[server.address] = bit
+            self.by_type[server.type] = self.by_type.get(server.type, 0) | bit
+            for tag in server.tags.items():
+                self.tag_index[tag] = self.tag_index.get(tag, 0) | bit
+        self.all = (1 << len(self.servers)) - 1
+        self.primary = self.by_type.get('RSPrimary', 0)
+        self.secondaries = self.by_type.get('RSSecondary', 0)
+
+        # Secondaries in order of staleness, and the mask of the first k of them.
+        staleness = sorted((self._staleness(s), self.bits[s.address])
+                           for s in self.servers if s.type == 'RSSecondary')
+        self.staleness = [value for value, _ in staleness]
+        self.freshest = [0]
+        for _, bit in staleness:
+            self.freshest.append(self.freshest[-1] | bit)
+
+    @classmethod
+    def from_document(cls, document, heartbeat_ms=DEFAULT_HEARTBEAT_FREQUENCY_MS):
+        return cls(document['type'], [Server.from_document(s) for s in document['servers']],
+                   heartbeat_ms)
+
+    def _staleness(self, server):
+        if self.type == 'ReplicaSetWithPrimary' and self.primary:
+            p = self.servers[self.primary.bit_length() - 1]
+            return ((server.last_update_time - server.last_write_date) -
+                    (p.last_update_time - p.last_write_date) + self.heartbeat_ms)
+        smax = max(s.last_write_date for s in self.servers if s.type == 'RSSecondary')
+        return smax - server.last_write_date + self.heartbeat_ms
+
+    def addresses(self, mask):
+        """The addresses of the servers in mask, fastest first."""
+        result = []
+        while mask:
+            low = mask & -mask
+            result.append(self.servers[low.bit_length() - 1].address)
+            mask ^= low
+        return result
+
+    def mask(self, addresses):
+        return sum(self.bits.get(a, 0) for a in set(addresses))
+
+    def matching(self, tag_set):
+        """The mask of servers whose tags include tag_set."""
+        mask = self.all
+        for tag in tag_set.items():
+            mask &= self.tag_index.get(tag, 0)
+            if not mask:
+                break
+        return mask
+
+    def fresh(self, max_staleness_sec):
+        """The mask of secondaries with staleness <= max_staleness_sec."""
+        return self.freshest[bisect_right(self.staleness, max_staleness_sec * 1000)]
+
+    def latency_window(self, mask):
+        """The servers in mask within local_threshold_ms of the fastest one."""
+        if not mask:
+            return 0
+        fastest = self.rtts[(mask & -mask).bit_length() - 1]
+        return mask & ((1 << bisect_right(self.rtts, fastest + self.local_threshold_ms)) - 1)
+
+    def validate(self, read_preference):
+        max_staleness_sec = read_preference.max_staleness_sec
+        if max_staleness_sec is not None and self.type in ('ReplicaSetWithPrimary', 'ReplicaSetNoPrimary'):
+            if (max_staleness_sec * 1000 < self.heartbeat_ms + IDLE_WRITE_PERIOD_MS or
+                    max_staleness_sec < SMALLEST_MAX_STALENESS_SECONDS):
+                raise InvalidReadPreference('maxStalenessSeconds %s is too small' % max_staleness_sec)
+
+    def _eligible(self, candidates, read_preference):
+        """Filter candidates for mode Secondary or Nearest by staleness and tag sets."""
+        if read_preference.max_staleness_sec is not None:
+            # Non-secondaries have zero staleness.
+            candidates &= self.fresh(read_preference.max_staleness_sec) | ~self.secondaries
+        if not read_preference.tag_sets:
+            return candidates
+        for tag_set in read_preference.tag_sets:
+            eligible = candidates & self.matching(tag_set)
+            if eligible:
+                return eligible
+        return 0
+
+    def suitable(self, operation, read_preference, allowed=None):
+        """The mask of suitable servers among allowed, all servers by default."""
+        allowed = self.all if allowed is None else allowed
+        if self.type == 'Single':
+            return allowed & ~self.by_type.get('Unknown', 0)
+        if self.type == 'Sharded':
+            return allowed & self.by_type.get('Mongos', 0)
+        if self.type == 'LoadBalanced':
+            return allowed & self.by_type.get('LoadBalancer', 0)
+        if self.type not in ('ReplicaSetWithPrimary', 'ReplicaSetNoPrimary'):
+            return 0
+
+        primary = allowed & self.primary
+        mode = read_preference.mode
+        if operation == 'write' or mode == 'Primary':
+            return primary
+        if mode == 'PrimaryPreferred' and primary:
+            return primary
+        candidates = allowed & self.secondaries
+        if mode == 'Nearest':
+            candidates |= primary
+        eligible = self._eligible(candidates, read_preference)
+        if mode == 'SecondaryPreferred' and not eligible:
+            return primary
+        return eligible
+
+    def select(self, operation, read_preference, deprioritized=()):
+        """Return the masks of (suitable servers, servers in the latency window).
+
+        Raises InvalidReadPreference if the read preference cannot be used
+        with this topology.
+        """
+        if operation == 'read':
+            self.validate(read_preference)
+        suitable = 0
+        if deprioritized:
+            suitable = self.suitable(operation, read_preference, self.all & ~self.mask(deprioritized))
+        if not suitable:
+            suitable = self.suitable(operation, read_preference)
+        return suitable, self.latency_window(suitable)
+
+
+def run_selection_test(document):
+    """Return a description of how a selection test failed, or None if it passed."""
+    try:
+        topology = Topology.from_document(
+            document['topology_description'],
+            document.get('heartbeatFrequencyMS', DEFAULT_HEARTBEAT_FREQUENCY_MS))
+        read_preference = ReadPreference.from_document(document['read_preference'])
+        deprioritized = [s['address'] for s in document.get('deprioritized_servers', [])]
+        suitable, in_window = topology.select(document.get('operation', 'read'), read_preference,
+                                              deprioritized)
+    except InvalidReadPreference as exc:
+        return None if document.get('error') else 'unexpected error: %s' % exc
+    if document.get('error'):
+        return 'expected an error'
+    for field, mask in (('suitable_servers', suitable), ('in_latency_window', in_window)):
+        if field not in document:
+            continue
+        actual = sorted(topology.addresses(mask))
+        expected = sorted(s['address'] for s in document[field])
+        if actual != expected:
+            return '%s %s, expected %s' % (field, actual, expected)
+    return None
+
+
+def run_rtt_test(document):
+    old_rtt = None if document['avg_rtt_ms'] == 'NULL' else document['avg_rtt_ms']
+    actual = average_rtt(old_rtt, document['new_rtt_ms'])
+    if not math.isclose(actual, document['new_avg_rtt'], abs_tol=1e-9):
+        return 'average RTT %s, expected %s' % (actual, document['new_avg_rtt'])
+    return None
+
+
+def run_tests():
+    """Run every test and return the number run and the failures."""
+    tests = [(path, run_selection_test) for directory in TEST_DIRECTORIES
+             for path in sorted(glob.glob(os.path.join(directory, '*', '*.json')) +
+                                glob.glob(os.path.join(directory, '*', '*', '*.json')))]
+    tests += [(path, run_rtt_test) for path in sorted(glob.glob(os.path.join(RTT_TESTS, '*.json')))]
+    failures = []
+    for path, run in tests:
+        with open(path) as f:
+            failure = run(json.load(f))
+        if failure is not None:
+            failures.append('%s: %s' % (os.path.relpath(path, HERE), failure))
+    return len(tests), failures
+
+
+def generate_topology(rng, members, heartbeat_ms=DEFAULT_HEARTBEAT_FREQUENCY_MS):
+    """Return a random replica set topology description document.
+
+    Half are ReplicaSetWithPrimary, with the primary at a random position, and
+    half ReplicaSetNoPrimary.
+    """
+    topology_type = rng.choice(['ReplicaSetWithPrimary', 'ReplicaSetNoPrimary'])
+    primary = rng.randrange(members) if topology_type == 'ReplicaSetWithPrimary' else None
+    now = 10 ** 12
+    servers = []
+    for i in range(members):
+        last_update_time = now - rng.randrange(heartbeat_ms)
+        servers.append({
+            'address': 'host%d:27017' % i,
+            'type': 'RSPrimary' if i == primary else rng.choice(['RSSecondary'] * 8 + ['RSArbiter', 'Unknown']),
+            'avg_rtt_ms': round(rng.expovariate(1 / 20.), 3),
+            'tags': {'dc': 'dc%d' % rng.randrange(3), 'rack': 'rack%d' % rng.randrange(8)},
+            'lastUpdateTime': last_update_time,
+            'lastWrite': {'lastWriteDate': last_update_time - int(rng.expovariate(1 / 60000.))},
+        })
+    return {'type': topology_type, 'servers': servers}
+
+
+def generate_read_preference(rng):
+    """Return a random, valid, non-Primary read preference document."""
+    document = {'mode': rng.choice(MODES[1:])}
+    if rng.random() < .7:
+        document['tag_sets'] = [
+            dict(rng.sample([('dc', 'dc%d' % rng.randrange(3)), ('rack', 'rack%d' % rng.randrange(8))],
+                            rng.randrange(3)))
+            for _ in range(rng.randrange(1, 4))]
+    if rng.random() < .7:
+        document['maxStalenessSeconds'] = rng.randrange(SMALLEST_MAX_STALENESS_SECONDS, 300)
+    return document
+
+
+def benchmark(members, topologies, selections, seed=None):
+    rng = random.Random(seed)
+    documents = [generate_topology(rng, members) for _ in range(topologies)]
+    read_preferences = [ReadPreference.from_document(generate_read_preference(rng)) for _ in range(100)]
+
+    started = time.time()
+    built = [Topology.from_document(d) for d in documents]
+    build_time = (time.time() - started) / topologies
+
+    started = time.time()
+    for i in range(selections):
+        built[i % topologies].select('read', read_preferences[i % len(read_preferences)])
+    elapsed = time.time() - started
+    print("%d-member replica sets: %.1f us to index a topology, %.0f selections/s" % (
+        members, build_time * 1e6, selections / elapsed))
+
+
+def check(members, topologies, seed=None):
+    """Compare selections in generated topologies with the vectorized evaluator."""
+    sys.path.insert(0, os.path.join(HERE, '..', 'max-staleness'))
+    import evaluate_max_staleness_tests as vectorized
+
+    rng = random.Random(seed)
+    documents = [{'topology_description': generate_topology(rng, members),
+                  'read_preference': generate_read_preference(rng)} for _ in range(topologies)]
+    tests, names, _ = vectorized.from_documents(documents)
+    results = vectorized.evaluate(tests)
+    for i, document in enumerate(documents):
+        topology = Topology.from_document(document['topology_description'])
+        selected = topology.select('read', ReadPreference.from_document(document['read_preference']))
+        for field, mask in zip(('suitable_servers', 'in_latency_window'), selected):
+            actual = sorted(topology.addresses(mask))
+            expected = sorted(a for a, x in zip(names[i], results[field][i]) if x)
+            if actual != expected:
+                raise AssertionError('%s: %s %s, the vectorized evaluator %s' % (
+                    json.dumps(document), field, actual, expected))
+    print("%d random %d-member topologies agree with the vectorized evaluator" % (topologies, members))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--benchmark", help="Time selections in generated replica sets",
+                        action="store_true")
+    parser.add_argument("--check", help="Compare this many generated selections with the vectorized evaluator",
+                        type=int, metavar="N")
+    parser.add_argument("--members", help="Members per generated replica set",
+                        type=int, default=50)
+    parser.add_argument("--selections", help="Number of selections to time",
+                        type=int, default=200000)
+    parser.add_argument("--seed", help="Random seed", type=int)
+    return parser.parse_args()
+
+
+def main(args):
+    count, failures = run_tests()
+    for failure in failures:
+        print(failure)
+    print("%d tests, %d failures" % (count, len(failures)))
+    if args.check:
+        check(args.members, args.check, args.seed)
+    if args.benchmark:
+        benchmark(args.members, 100, args.selections, args.seed)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))